@@ -3,9 +3,10 @@ from django.contrib import admin, messages
 from django.contrib.admin.templatetags.admin_static import static
 from django.contrib.contenttypes.generic import GenericTabularInline
 from django.core.exceptions import PermissionDenied
+from django.core.files import File
 from django.core.files.images import get_image_dimensions
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.http import HttpResponse, HttpResponseNotFound
 from django.shortcuts import get_object_or_404, render_to_response, redirect
@@ -28,11 +29,15 @@ from cms_layouts.slot_finder import get_mock_placeholder
 
 from cms_blogger import forms, changelists
 from .models import (
-    Blog, BlogCategory, BlogEntryPage, BlogNavigationNode, HomeBlog)
+    Blog, BlogEntryPage, BlogNavigationNode, HomeBlog, PosterImageJob,
+    invalidate_rendered_content)
+from .batch import batch_updates
+from .jobs import process_poster_image_job
+from .move import move_entries
 from .admin_helper import AdminHelper, WizardForm
-from .settings import ALLOWED_THUMBNAIL_IMAGE_TYPES
+from .settings import ALLOWED_THUMBNAIL_IMAGE_TYPES, ASYNC_POSTER_IMAGES
 from .widgets import ToggleWidget
-from .utils import resize_image, get_allowed_sites, get_current_site
+from .utils import get_allowed_sites, get_current_site, check_image
 import imghdr
 import json
 import os
@@ -133,6 +138,8 @@ class AbstractBlogAdmin(AdminHelper):
     def location_in_navigation(self, obj):
         if obj.id:
             nav_node = obj.navigation_node
+            if nav_node:
+                nav_node.blog = obj
             request = getattr(obj, '_request_for_navigation_preview', None)
             info = self.model._meta.app_label, self.model._meta.module_name
             url = reverse('admin:cms_blogger-%s-%s-navigation-tool' % info,
@@ -188,6 +195,8 @@ class AbstractBlogAdmin(AdminHelper):
                 for attname, value in data.items():
                     setattr(nav_node, attname, value)
                 nav_node.save()
+            # the node blog is already known
+            nav_node.blog = blog
 
             preview = self._navigation_preview(request, nav_node)
             return HttpResponse(
@@ -201,6 +210,7 @@ class AbstractBlogAdmin(AdminHelper):
             'is_popup': "_popup" in request.REQUEST
         })
         if blog.navigation_node:
+            blog.navigation_node.blog = blog
             context.update({'initial_blog_node': blog.navigation_node, })
         return render_to_response(
             'admin/cms_blogger/blog/navigation.html', context)
@@ -448,6 +458,16 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
             context['media'] = self._upgrade_jquery(context['media'])
         return response
 
+    def save_model(self, request, obj, form, change):
+        if change:
+            # the poster image is set by the upload views and jobs while the
+            #   form is open; don't write back the one the form was loaded
+            #   with
+            obj.poster_image, obj.poster_image_renditions = (
+                BlogEntryPage.objects.filter(pk=obj.pk).values_list(
+                    'poster_image', 'poster_image_renditions').get())
+        super(BlogEntryPageAdmin, self).save_model(request, obj, form, change)
+
     def queryset(self, request):
         qs = super(BlogEntryPageAdmin, self).queryset(request)
         if request.user.is_superuser:
@@ -473,6 +493,10 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
                 self.admin_site.admin_view(self.upload_thumbnail),
                 name='cms_blogger-upload-thumbnail'),
 
+            url(r'^(?P<blog_entry_id>\d+)/upload_status/(?P<job_id>\d+)/$',
+                self.admin_site.admin_view(self.upload_status),
+                name='cms_blogger-upload-status'),
+
             url(r'^(?P<blog_entry_id>\d+)/delete_file/$',
                 self.admin_site.admin_view(self.delete_thumbnail),
                 name='cms_blogger-delete-thumbnail'),
@@ -495,14 +519,26 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
                 get_language(), request.POST.get('body') or 'Sample Content')
         return entry.render_to_response(request)
 
+    def _poster_image_job_data(self, job):
+        data = {'status': job.status}
+        if job.status == PosterImageJob.DONE:
+            poster_image = job.entry.poster_image
+            data.update({
+                'label': unicode(poster_image.name),
+                'url': poster_image.url if poster_image else '',
+            })
+        elif job.status == PosterImageJob.FAILED:
+            data['error'] = job.error
+        else:
+            data['status_url'] = reverse(
+                'admin:cms_blogger-upload-status', kwargs={
+                    'blog_entry_id': job.entry_id, 'job_id': job.pk})
+        return data
+
     @csrf_exempt
     def upload_thumbnail(self, request, blog_entry_id=None):
         try:
             blog_entry = BlogEntryPage.objects.get(id=blog_entry_id)
-            # hold the initial file name in order to delete it after the
-            #   uploaded file is saved. Deletion takes place in the model's
-            #   save method
-            blog_entry._old_poster_image = blog_entry.poster_image.name
         except BlogEntryPage.DoesNotExist:
             raise UploadException(
                 "Blog entry with id %s does not exist" % blog_entry_id)
@@ -526,16 +562,20 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
                 raise UploadException(
                     "Image width and height should be greater than 0px")
             try:
-                upload.name = ''.join((filename, os.path.extsep, extension))
-                blog_entry.poster_image = resize_image(upload)
+                check_image(upload)
             except Exception as e:
-                raise UploadException("Cannot resize image: %s" % e.message)
-            # save new image
-            blog_entry.save()
-            json_response = {
-                'label': unicode(blog_entry.poster_image.name),
-                'url': blog_entry.poster_image.url,
-            }
+                raise UploadException("Cannot resize image: %s" % e)
+            job = PosterImageJob(entry=blog_entry)
+            if ASYNC_POSTER_IMAGES:
+                # the upload is stored as it is and gets resized by a worker
+                job.upload.save(
+                    ''.join((filename, os.path.extsep, extension)),
+                    File(upload), save=True)
+            else:
+                process_poster_image_job(job, upload)
+            json_response = self._poster_image_job_data(job)
+            if 'error' in json_response:
+                raise UploadException(json_response['error'])
             return HttpResponse(
                 json.dumps(json_response), mimetype=mimetype)
         except UploadException as e:
@@ -545,6 +585,13 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
             if upload:
                 upload.close()
 
+    def upload_status(self, request, blog_entry_id=None, job_id=None):
+        job = get_object_or_404(
+            PosterImageJob.objects.select_related('entry'),
+            id=job_id, entry=blog_entry_id)
+        return HttpResponse(json.dumps(self._poster_image_job_data(job)),
+                            mimetype="application/json")
+
     @csrf_exempt
     def delete_thumbnail(self, request, blog_entry_id=None):
         try:
@@ -552,7 +599,9 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
         except BlogEntryPage.DoesNotExist:
             return HttpResponseNotFound("BlogEntry does not exist")
         if blog_entry.poster_image and blog_entry.poster_image.name:
-            blog_entry.poster_image.delete()
+            # the files get deleted once the entry save is committed
+            with batch_updates(), transaction.commit_on_success():
+                blog_entry.delete_poster_image()
             return HttpResponse("OK")
         return HttpResponseNotFound("No file to delete")
 
@@ -611,7 +660,7 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
             messages.warning(request, message)
             return response(form)
 
-        _move_entries(
+        move_entries(
             destination_blog,
             valid_entries_ids,
             'mirror_categories' in form.data)
@@ -629,19 +678,56 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
         set the parent_id in order for all plugins to be added inside the
         text plugin.
         """
+        placeholders_ids = []
         if 'parent_id' in request.POST:
             entry = get_object_or_404(
                 BlogEntryPage, pk=request.POST['parent_id'])
             post_data = request.POST.copy()
             post_data['parent_id'] = entry.get_content_plugin().pk
             request.POST = post_data
-        return super(BlogEntryPageAdmin, self).add_plugin(request)
+            placeholders_ids.append(entry.content_id)
+        response = super(BlogEntryPageAdmin, self).add_plugin(request)
+        invalidate_rendered_content(placeholders_ids)
+        return response
 
     def edit_plugin(self, request, plugin_id):
         plugin = get_object_or_404(CMSPlugin, pk=plugin_id)
         entry = BlogEntryPage.objects.get(content=plugin.placeholder)
         setattr(request, 'current_page', entry.get_layout().from_page)
-        return super(BlogEntryPageAdmin, self).edit_plugin(request, plugin_id)
+        response = super(BlogEntryPageAdmin, self).edit_plugin(
+            request, plugin_id)
+        if request.method == 'POST':
+            # nested plugins are rendered in the cached entry content
+            invalidate_rendered_content([plugin.placeholder_id])
+        return response
+
+    def remove_plugin(self, request):
+        placeholders_ids = list(CMSPlugin.objects.filter(
+            pk=request.POST.get('plugin_id')).values_list(
+            'placeholder', flat=True))
+        response = super(BlogEntryPageAdmin, self).remove_plugin(request)
+        invalidate_rendered_content(placeholders_ids)
+        return response
+
+    def move_plugin(self, request):
+        # the plugins can be moved from and to any placeholder
+        plugins_ids = request.POST.get('ids', '').split('_')
+        plugins_ids.append(request.POST.get('plugin_id'))
+        placeholders_ids = list(CMSPlugin.objects.filter(
+            pk__in=[pk for pk in plugins_ids if pk and pk.isdigit()]
+        ).values_list('placeholder', flat=True))
+        placeholders_ids.append(request.POST.get('placeholder_id'))
+        response = super(BlogEntryPageAdmin, self).move_plugin(request)
+        if request.method == 'POST':
+            invalidate_rendered_content(filter(None, placeholders_ids))
+        return response
+
+    def copy_plugins(self, request):
+        response = super(BlogEntryPageAdmin, self).copy_plugins(request)
+        if request.method == 'POST':
+            invalidate_rendered_content(
+                filter(None, [request.POST.get('placeholder')]))
+        return response
 
     ### BULK ACTIONS ###
     def make_published(self, request, queryset):
@@ -652,11 +738,13 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
                           Q(blog__isnull=True))
         queryset.exclude(draft_entries).filter(is_published=False).update(
             is_published=True, publication_date=timezone.now())
+        queryset.update_live_state()
     make_published.short_description = "Publish entries"
 
     def make_unpublished(self, request, queryset):
         queryset.filter(is_published=True).update(
             is_published=False, publication_date=timezone.now())
+        queryset.update_live_state()
     make_unpublished.short_description = "Unpublish entries"
 
     def move_entries(self, request, queryset):
@@ -713,53 +801,6 @@ class BlogEntryPageAdmin(AdminHelper, PlaceholderAdmin):
         return can_delete and self._is_allowed(request)
 
 
-def _move_entries(destination_blog, entries_ids, mirror_categories=True):
-    original_categories = list(BlogCategory.objects.filter(
-        entries__in=entries_ids).values_list('id', 'name'))
-    if original_categories:
-        original_categories_ids, original_categories_name = zip(
-            *original_categories)
-    else:
-        original_categories_ids, original_categories_name = [], []
-
-    if mirror_categories:
-        destination_categories = list(
-            destination_blog.categories.values_list('name', flat=True))
-        delta = set(original_categories_name) - set(destination_categories)
-        delta = filter(None, delta)
-        for category_name in delta:
-            BlogCategory.objects.create(
-                name=category_name,
-                blog=destination_blog)
-
-    # link entries foreign key to the new blog
-    entries = BlogEntryPage.objects.filter(id__in=entries_ids)
-    entries.update(blog=destination_blog)
-
-    # regenerate slugs for saved entries (which
-    # are not draft) to make sure they are unique
-    saved_entries_ids = list(
-        entries.filter(draft_id=None).values_list('id', flat=True))
-    BlogEntryPage.objects.filter(id__in=saved_entries_ids).update(slug="")
-    for e in BlogEntryPage.objects.filter(id__in=saved_entries_ids):
-        e.save()
-
-    # performance improvement getting previous_categories in dict
-    for blogentry in BlogEntryPage.objects.filter(id__in=entries_ids):
-        previous_categories = list(blogentry.categories.values_list(
-            'name', flat=True))
-        #performance improvement by assigning m2m queryset instead of clearing
-        # and reassigning
-        blogentry.categories.clear()
-        destination_categories = BlogCategory.objects.filter(
-            blog=destination_blog, name__in=previous_categories)
-        blogentry.categories.add(*destination_categories)
-
-    BlogCategory.objects.filter(
-        id__in=original_categories_ids, entries=None
-    ).delete()
-
-
 admin.site.register(Blog, BlogAdmin)
 admin.site.register(HomeBlog, HomeBlogAdmin)
 admin.site.register(BlogEntryPage, BlogEntryPageAdmin)
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.forms import Media, ModelForm
 from django.contrib.admin.templatetags.admin_static import static
 from collections import namedtuple
+from .batch import batch_updates
 
 _wizard_opts = namedtuple(
     'WizardForm', 'form fieldsets readonly prepopulated when show_next')
@@ -89,6 +90,25 @@ class AdminHelper(admin.ModelAdmin):
                 new_media.add_js((js, ))
         return new_media
 
+    # blogs modification dates and caches get updated once per request,
+    #   after the objects are saved/deleted and the transaction is committed
+    def add_view(self, *args, **kwargs):
+        with batch_updates():
+            return super(AdminHelper, self).add_view(*args, **kwargs)
+
+    def change_view(self, *args, **kwargs):
+        with batch_updates():
+            return super(AdminHelper, self).change_view(*args, **kwargs)
+
+    def delete_view(self, *args, **kwargs):
+        with batch_updates():
+            return super(AdminHelper, self).delete_view(*args, **kwargs)
+
+    def changelist_view(self, *args, **kwargs):
+        # admin actions run in the changelist view
+        with batch_updates():
+            return super(AdminHelper, self).changelist_view(*args, **kwargs)
+
     def get_changelist(self, request, **kwargs):
         return getattr(
             self, 'custom_changelist_class',
@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+from collections import OrderedDict
+import threading
+
+_state = threading.local()
+
+
+def _get_state():
+    if not hasattr(_state, 'depth'):
+        _state.depth = 0
+        _state.pending = OrderedDict()
+    return _state
+
+
+@contextmanager
+def batch_updates():
+    """
+    Coalesces the calls made with batched(func, items) inside the block:
+        each func gets called only once, with all the items it was called
+        with, when the outermost block exits. Pending calls are dropped if
+        the block or one of the pending calls raises an exception.
+    Wrap it around a transaction block in order to have the pending calls
+        made after the transaction gets committed.
+    """
+    state = _get_state()
+    state.depth += 1
+    try:
+        yield
+    except:
+        state.depth -= 1
+        if not state.depth:
+            state.pending.clear()
+        raise
+    state.depth -= 1
+    if not state.depth:
+        try:
+            while state.pending:
+                func, items = state.pending.popitem(last=False)
+                func(items)
+        finally:
+            # the thread might serve unrelated requests afterwards
+            state.pending.clear()
+
+
+def batched(func, items):
+    """
+    Calls func(items) right away or, inside a batch_updates block, once the
+        outermost block exits.
+    """
+    state = _get_state()
+    if not state.depth:
+        func(items)
+        return
+    state.pending.setdefault(func, set()).update(items)
+
+
+def is_batching():
+    # True inside a batch_updates block
+    return bool(_get_state().depth)
@@ -0,0 +1,393 @@
+"""
+Synthetic large blogs and a benchmark of the blogger pages, feeds,
+    sitemaps, plugin, menu and entries moves on top of them. Used by the
+    blogger_generate_dataset and blogger_benchmark commands; the results
+    are plain dicts so runs can be dumped as json and compared.
+"""
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.db.models import Max
+from django.template.context import RequestContext
+from django.template.loader import render_to_string
+from django.test.client import Client, RequestFactory
+from django.utils import timezone
+from cms.api import create_page
+from cms_layouts.models import Layout
+from .batch import batch_updates
+from .models import (
+    Blog, BlogEntryPage, BlogCategory, Author, BlogNavigationNode,
+    RiverPlugin, update_authors_display, update_published_entries_count,
+    update_search_index, invalidate_blogs_caches)
+from .move import move_entries
+from .settings import POSTS_ON_LANDING_PAGE
+from .slug import urlify
+from collections import OrderedDict
+import datetime
+import django
+import math
+import platform
+import random
+import time
+
+
+WORDS = (
+    'python', 'django', 'release', 'performance', 'database', 'cache',
+    'template', 'design', 'weekend', 'travel', 'music', 'review', 'garden',
+    'science', 'history', 'recipe', 'election', 'market', 'football',
+    'weather', 'library', 'museum', 'festival', 'interview', 'opinion')
+
+# rows inserted with one bulk insert; sqlite allows up to 999 query
+#   parameters
+INSERT_BATCH_SIZE = 50
+
+PERCENTILES = (50, 90, 95, 99)
+
+# publication dates of the generated entries are computed from this date and
+#   the seed
+DATASET_EPOCH = datetime.datetime(2014, 1, 1)
+
+
+def _words(rnd, count):
+    return ' '.join(rnd.choice(WORDS) for _ in range(count))
+
+
+def _bulk_create(model, objects):
+    model.objects.bulk_create(objects, batch_size=INSERT_BATCH_SIZE)
+
+
+# suffixes of the slugs of the blogs used by the move_entries scenario
+MOVE_SOURCE = 'move-source'
+MOVE_DESTINATION = 'move-destination'
+MOVE_CATEGORIES = 3
+
+
+def _create_entries(rnd, blog, titles, base_date, categories_ids,
+                    authors_ids, categories_per_entry=3):
+    # published entries, with random categories and authors, 37 minutes apart;
+    #   returns their ids
+    last_id = blog.blogentrypage_set.aggregate(Max('id'))['id__max'] or 0
+    _bulk_create(BlogEntryPage, [
+        BlogEntryPage(
+            title=title, slug=urlify(title), blog=blog,
+            short_description=_words(rnd, 30),
+            publication_date=base_date - datetime.timedelta(
+                minutes=37 * (len(titles) - i)),
+            is_published=True, is_live=True)
+        for i, title in enumerate(titles)])
+    entries_ids = list(blog.blogentrypage_set.filter(
+        id__gt=last_id).values_list('id', flat=True))
+
+    EntryCategories = BlogCategory.entries.through
+    EntryAuthors = BlogEntryPage.authors.through
+    entry_categories, entry_authors = [], []
+    for entry_id in entries_ids:
+        if categories_ids:
+            for category_id in rnd.sample(categories_ids, min(
+                    categories_per_entry, len(categories_ids))):
+                entry_categories.append(EntryCategories(
+                    blogentrypage_id=entry_id, blogcategory_id=category_id))
+        if authors_ids:
+            for author_id in rnd.sample(authors_ids, min(2, len(authors_ids))):
+                entry_authors.append(EntryAuthors(
+                    blogentrypage_id=entry_id, author_id=author_id))
+    _bulk_create(EntryCategories, entry_categories)
+    _bulk_create(EntryAuthors, entry_authors)
+
+    # the entries were bulk inserted; update everything their saves would
+    #   have
+    update_authors_display(entries_ids)
+    update_published_entries_count([blog.pk])
+    update_search_index(entries_ids)
+    invalidate_blogs_caches([blog.pk])
+    return entries_ids
+
+
+def _create_blog(site, page, title, slug, layout_types, categories,
+                 navigation_node=None):
+    blog = Blog.objects.create(
+        title=title, slug=slug, site=site, navigation_node=navigation_node,
+        in_navigation=navigation_node is not None)
+    for layout_type in layout_types:
+        Layout.objects.create(
+            from_page=page, content_object=blog, layout_type=layout_type)
+    _bulk_create(BlogCategory, [
+        BlogCategory(name='category %s' % i, slug='category-%s' % i,
+                     blog=blog)
+        for i in range(categories)])
+    return blog, list(blog.categories.values_list('id', flat=True))
+
+
+def generate_dataset(blogs=10, entries=1000, categories=10, authors=50,
+                     navigation_nodes=5, layouts=1, moved_entries=100,
+                     seed=0, prefix=None, base_date=None, language='en',
+                     progress=None):
+    """
+    Creates blogs on the current site, each with the given number of
+        published entries and categories, their layouts(1 to 3 layout types)
+        and navigation nodes for the first navigation_nodes blogs. Entries
+        get random titles, categories and authors(shared by all blogs) and
+        are created with bulk inserts; the newest entry of each blog also
+        gets its content plugin.
+    Two more blogs are created for the move_entries scenario: one with
+        moved_entries entries and one to move them to. Both have the same
+        categories and an entry, which is not moved, in all of them so
+        moving the entries back and forth doesn't change any slugs or
+        categories.
+    The slugs start with prefix and the publication dates end at base_date;
+        both are derived from the seed by default so the same seed generates
+        the same data. A prefix can be used only once on a site.
+    progress(message) is called after each blog.
+    Returns the number of created objects of each type.
+    """
+    rnd = random.Random(seed)
+    site = Site.objects.get_current()
+    prefix = 'benchmark-%s' % (prefix or 'seed-%s' % seed)
+    if Blog.objects.filter(site=site, slug__startswith=prefix + '-').exists():
+        raise ValueError(
+            "A dataset was already generated with the %s prefix; use "
+            "another seed or prefix." % prefix)
+    if base_date is None:
+        base_date = DATASET_EPOCH + datetime.timedelta(days=seed % 1000)
+    if settings.USE_TZ and timezone.is_naive(base_date):
+        base_date = timezone.make_aware(base_date, timezone.utc)
+    layout_types = [Blog.ALL, Blog.LANDING_PAGE, Blog.ENTRY_PAGE][:layouts]
+    created = dict.fromkeys(
+        ('blogs', 'entries', 'categories', 'authors', 'navigation_nodes',
+         'layouts'), 0)
+
+    with batch_updates(), transaction.commit_on_success():
+        page = create_page(
+            prefix, settings.CMS_TEMPLATES[0][0], language, site=site,
+            published=True)
+        _bulk_create(Author, [
+            Author(name='%s %s' % (_words(rnd, 1).title(), i),
+                   slug='%s-author-%s' % (prefix, i))
+            for i in range(authors)])
+        authors_ids = list(Author.objects.filter(
+            slug__startswith=prefix + '-').order_by('id').values_list(
+            'id', flat=True))
+        created['authors'] = len(authors_ids)
+
+    def blog_created(blog_entries, blog_categories):
+        created['blogs'] += 1
+        created['entries'] += len(blog_entries)
+        created['categories'] += len(blog_categories)
+        created['layouts'] += len(layout_types)
+        if progress:
+            progress('Generated blog %s/%s.' % (created['blogs'], blogs + 2))
+
+    for blog_index in range(blogs):
+        with batch_updates(), transaction.commit_on_success():
+            node = None
+            if blog_index < navigation_nodes:
+                node = BlogNavigationNode.objects.create(
+                    text='Blog %s' % blog_index, position=blog_index,
+                    parent_node_id=page.pk)
+                created['navigation_nodes'] += 1
+            blog, categories_ids = _create_blog(
+                site, page, 'Benchmark %s' % blog_index,
+                '%s-%s' % (prefix, blog_index), layout_types, categories,
+                navigation_node=node)
+            entries_ids = _create_entries(
+                rnd, blog, ['%s %s' % (_words(rnd, 5).capitalize(), i)
+                            for i in range(entries)],
+                base_date, categories_ids, authors_ids)
+            for entry in blog.get_entries()[:1]:
+                entry.content_body = '<p>%s</p>' % _words(rnd, 200)
+                entry.save()
+        blog_created(entries_ids, categories_ids)
+
+    for suffix, titles in (
+            (MOVE_SOURCE, ['Moved entry %s' % i
+                           for i in range(moved_entries)]),
+            (MOVE_DESTINATION, [])):
+        with batch_updates(), transaction.commit_on_success():
+            blog, categories_ids = _create_blog(
+                site, page, 'Benchmark %s' % suffix.replace('-', ' '),
+                '%s-%s' % (prefix, suffix), layout_types, MOVE_CATEGORIES)
+            # the anchor entry keeps the categories from being deleted when
+            #   all the other entries are moved
+            entries_ids = _create_entries(
+                rnd, blog, ['Anchor entry'], base_date, categories_ids,
+                authors_ids, categories_per_entry=MOVE_CATEGORIES)
+            entries_ids += _create_entries(
+                rnd, blog, titles, base_date, categories_ids, authors_ids,
+                categories_per_entry=1)
+        blog_created(entries_ids, categories_ids)
+    return created
+
+
+def _percentile(values, percentile):
+    # nearest rank
+    values = sorted(values)
+    rank = int(math.ceil(percentile / 100.0 * len(values)))
+    return values[max(rank - 1, 0)]
+
+
+def measure(func, iterations=20, warmup=2, cold=False):
+    """
+    Calls func warmup times and then measures iterations calls. Returns the
+        latency percentiles(in milliseconds), the query counts and the
+        statuses returned by func. With cold=True the cache is cleared
+        before each measured call.
+    """
+    for _ in range(warmup):
+        func()
+    timings, queries, statuses = [], [], {}
+    debug_cursor = connection.use_debug_cursor
+    connection.use_debug_cursor = True
+    try:
+        for _ in range(iterations):
+            if cold:
+                cache.clear()
+            queries_start = len(connection.queries)
+            start = time.time()
+            status = func()
+            timings.append((time.time() - start) * 1000)
+            queries.append(len(connection.queries) - queries_start)
+            # keeps the memory bounded on long runs
+            del connection.queries[queries_start:]
+            if status is not None:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+    finally:
+        connection.use_debug_cursor = debug_cursor
+    result = OrderedDict()
+    result['iterations'] = iterations
+    result['mean_ms'] = round(sum(timings) / len(timings), 3)
+    result['min_ms'] = round(min(timings), 3)
+    for percentile in PERCENTILES:
+        result['p%s_ms' % percentile] = round(
+            _percentile(timings, percentile), 3)
+    result['max_ms'] = round(max(timings), 3)
+    result['queries_mean'] = round(float(sum(queries)) / len(queries), 2)
+    result['queries_max'] = max(queries)
+    result['statuses'] = statuses
+    return result
+
+
+def _get(client, url, **params):
+    def view():
+        return client.get(url, params).status_code
+    return view
+
+
+def get_scenarios(move_size=100):
+    """
+    Returns the benchmarked scenarios of the current site as an ordered
+        dict of name: callable. Pages are benchmarked on the blog with the
+        most published entries; move_entries, which comes last, moves
+        move_size entries between the blogs generate_dataset created for
+        it and back.
+    """
+    site = Site.objects.get_current()
+    move_sources = Blog.objects.filter(
+        site=site, slug__startswith='benchmark-',
+        slug__endswith='-%s' % MOVE_SOURCE).order_by('-id')[:1]
+    move_destinations = Blog.objects.filter(site=site, slug__in=[
+        source.slug[:-len(MOVE_SOURCE)] + MOVE_DESTINATION
+        for source in move_sources])
+    blogs = Blog.objects.filter(site=site).exclude(
+        pk__in=[move_blog.pk for move_blog in list(move_sources) + list(
+            move_destinations)]
+    ).order_by('-published_entries_count', 'id')
+    blog = blogs[0]
+    entry = blog.get_entries()[0]
+    category = blog.categories.order_by('-published_entries_count')[0]
+    client = Client()
+    request = RequestFactory().get(blog.get_absolute_url())
+    request.user = AnonymousUser()
+    last_page = max(int(math.ceil(
+        blog.published_entries_count / float(POSTS_ON_LANDING_PAGE))), 1)
+
+    scenarios = OrderedDict()
+    scenarios['landing_page'] = _get(client, blog.get_absolute_url())
+    scenarios['deep_pagination'] = _get(
+        client, blog.get_absolute_url(), page=last_page)
+    scenarios['search'] = _get(
+        client, blog.get_absolute_url(), q=entry.title.split()[0])
+    scenarios['category_page'] = _get(client, category.get_absolute_url())
+    scenarios['entry_page'] = _get(client, entry.get_absolute_url())
+    scenarios['feed'] = _get(client, reverse(
+        'blog_feed', kwargs={'blog_slug': blog.slug}))
+
+    def sitemap():
+        from .sitemaps import BloggerSitemap
+        BloggerSitemap().get_urls(page=1, site=site)
+
+    def sitemap_section():
+        from .sitemaps.views import get_sitemap
+        get_sitemap(site, 'entries-%s' % blog.pk).get_urls(
+            page=1, site=site)
+
+    def river_plugin():
+        from .cms_plugins import BlogRiverPlugin
+        plugin = BlogRiverPlugin()
+        instance = RiverPlugin(
+            title='benchmark', number_of_entries=10,
+            categories=','.join(blog.categories.values_list(
+                'name', flat=True)[:5]))
+        context = plugin.render(
+            RequestContext(request), instance, None)
+        render_to_string(plugin.render_template, context)
+
+    def menu():
+        from .menu import BlogNavigationExtender
+        BlogNavigationExtender().modify(
+            request, [], None, None, False, False)
+
+    scenarios['sitemap'] = sitemap
+    scenarios['sitemap_section'] = sitemap_section
+    scenarios['river_plugin'] = river_plugin
+    scenarios['menu'] = menu
+    if not move_sources or not move_destinations:
+        return scenarios
+    source, destination = move_sources[0], move_destinations[0]
+    # the first entry is the anchor entry that stays in the blog
+    moving = list(source.blogentrypage_set.order_by('id').values_list(
+        'id', flat=True)[1:move_size + 1])
+
+    def move():
+        # the entries keep their slugs and categories(see
+        #   generate_dataset) so each call moves the same data
+        move_entries(destination, moving)
+        move_entries(source, moving)
+    if moving:
+        scenarios['move_entries'] = move
+    return scenarios
+
+
+def run_benchmarks(iterations=20, warmup=2, cold=False, only=None,
+                   move_size=100, progress=None):
+    """
+    Measures the scenarios(all of them or the ones named in only) and
+        returns the results along with the environment and the size of the
+        dataset.
+    """
+    site = Site.objects.get_current()
+    results = OrderedDict()
+    for name, func in get_scenarios(move_size).items():
+        if only and name not in only:
+            continue
+        results[name] = measure(func, iterations, warmup, cold)
+        if progress:
+            progress('Measured %s.' % name)
+    report = OrderedDict()
+    report['created_at'] = timezone.now().isoformat()
+    report['python'] = platform.python_version()
+    report['django'] = django.get_version()
+    report['database'] = connection.vendor
+    report['cache'] = cache.__class__.__name__
+    report['cold_cache'] = cold
+    report['dataset'] = OrderedDict((
+        ('blogs', Blog.objects.filter(site=site).count()),
+        ('entries', BlogEntryPage.objects.filter(blog__site=site).count()),
+        ('categories', BlogCategory.objects.filter(
+            blog__site=site).count()),
+        ('authors', Author.objects.count()),
+    ))
+    report['results'] = results
+    return report
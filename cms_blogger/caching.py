@@ -0,0 +1,192 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.encoding import smart_str
+from collections import OrderedDict
+from functools import wraps
+from .settings import PAGE_CACHE_TIMEOUT, PAGE_CACHE_STALE_TIMEOUT
+import hashlib
+import threading
+import time
+
+# versions should outlive anything that's cached with them
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _version_key(namespace, key):
+    return 'cms_blogger_%s_version_%s' % (namespace, key)
+
+
+def _new_version():
+    # time based so an evicted version never restarts from a value that
+    #   was already used
+    return int(time.time() * 1000)
+
+
+def get_version(namespace, key):
+    """
+    Returns the current version of the cached data identified by the
+        namespace and the key(e.g. 'blog', blog.pk). Cache keys that contain
+        the version are invalidated all at once by bump_version.
+    """
+    version_key = _version_key(namespace, key)
+    version = cache.get(version_key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(version_key, version, VERSION_TIMEOUT):
+            version = cache.get(version_key, version)
+    return version
+
+
+def blog_id_cache_key(site_id, slug):
+    return 'cms_blogger_blog_id_%s_%s' % (site_id, slug)
+
+
+def bump_version(namespace, *keys):
+    for key in set(keys):
+        version_key = _version_key(namespace, key)
+        try:
+            cache.incr(version_key)
+        except ValueError:
+            # not cached yet(or evicted)
+            cache.set(version_key, _new_version(), VERSION_TIMEOUT)
+
+
+class LRUCache(object):
+    """
+    Process level mapping that keeps only the max_size most recently used
+        items. Keys should contain a version(see get_version) since items
+        are never invalidated; they just get evicted.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                return default
+            self._items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# query string parameters that make a different page
+PAGE_CACHE_PARAMS = ('page', 'q', 'blog_promo_page')
+# maximum number of seconds a request can take to refresh a stale page
+PAGE_CACHE_LOCK_TIMEOUT = 30
+# maximum number of seconds a request waits for a page that's not cached
+#   while another request renders it
+PAGE_CACHE_LOCK_WAIT = 5
+
+
+def _page_cache_key(request):
+    params = [(name, request.GET.get(name, ''))
+              for name in PAGE_CACHE_PARAMS]
+    # urls are rewritten for requests that come through a proxy
+    original_url = request.META.get('HTTP_X_ORIGINAL_URL', '')
+    key = hashlib.md5(smart_str(u'%s|%s|%s|%s' % (
+        request.get_host(), request.path, params, original_url))).hexdigest()
+    return 'cms_blogger_page_%s' % key
+
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # logged in users may see previews, the cms toolbar, draft content or
+    #   their own csrf tokens
+    user = getattr(request, 'user', None)
+    return user is None or not user.is_authenticated()
+
+
+def _is_cacheable_response(response):
+    return response.status_code == 200 and not response.cookies
+
+
+def _cached_response(cached):
+    response = HttpResponse(cached['content'], status=cached['status'])
+    for header, value in cached['headers']:
+        response[header] = value
+    return response
+
+
+def _wait_for_page(key):
+    # polls the cache until the request that holds the lock stores the page
+    deadline = time.time() + PAGE_CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    return None
+
+
+def versioned_cache_page(version_for, timeout=None):
+    """
+    Caches the responses of the decorated view for timeout seconds(defaults
+        to PAGE_CACHE_TIMEOUT). version_for(request, *args, **kwargs) should
+        return the (namespace, key) pairs of the versions the page depends
+        on or None if the page should not be cached.
+    Cached pages are never deleted; a page is stale once it expires or once
+        any of its versions gets bumped. A stale page is served to all
+        requests but one(that holds a lock) while its fresh version is
+        rendered. Requests for a page that's not cached wait for the one
+        that holds the lock, up to PAGE_CACHE_LOCK_WAIT seconds.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            cache_timeout = PAGE_CACHE_TIMEOUT if timeout is None else timeout
+            if not cache_timeout or not is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+            versions_keys = version_for(request, *args, **kwargs)
+            if versions_keys is None:
+                return view(request, *args, **kwargs)
+            version = [get_version(*version_key)
+                       for version_key in versions_keys]
+            key = _page_cache_key(request)
+            lock_key = '%s_lock' % key
+            cached = cache.get(key)
+            if cached is not None and (cached['version'] == version and
+                                       cached['expires'] > time.time()):
+                return _cached_response(cached)
+            locked = cache.add(lock_key, 1, PAGE_CACHE_LOCK_TIMEOUT)
+            if not locked:
+                if cached is None:
+                    cached = _wait_for_page(key)
+                if cached is not None:
+                    return _cached_response(cached)
+            try:
+                response = view(request, *args, **kwargs)
+                if not _is_cacheable_response(response):
+                    if cached is not None:
+                        cache.delete(key)
+                else:
+                    if hasattr(response, 'render'):
+                        response.render()
+                    cache.set(key, {
+                        'version': version,
+                        'expires': time.time() + cache_timeout,
+                        'content': response.content,
+                        'status': response.status_code,
+                        'headers': response.items()
+                    }, cache_timeout + PAGE_CACHE_STALE_TIMEOUT)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
@@ -26,4 +26,8 @@ class BlogChangeList(ChangeList):
 
 
 class BlogEntryChangeList(BlogChangeList):
-    pass
+
+    def get_query_set(self, request):
+        # authors are displayed for each entry of the page
+        qs = super(BlogEntryChangeList, self).get_query_set(request)
+        return qs.with_authors()
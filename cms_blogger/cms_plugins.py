@@ -7,6 +7,8 @@ from .models import RiverPlugin
 from .widgets import ToggleWidget
 from .forms import BlogRiverForm
 from .admin_helper import AdminHelper
+from .instrumentation import instrument
+from .settings import RIVER_POSTER_IMAGE_SIZES
 from .utils import paginate_queryset
 
 
@@ -20,10 +22,12 @@ class BlogRiverPlugin(AdminHelper, CMSPluginBase):
         models.BooleanField: {'widget': ToggleWidget}
     }
 
+    @instrument('BlogRiverPlugin.render')
     def render(self, context, instance, placeholder):
         request = context['request']
         entries = paginate_queryset(
-            instance.get_entries(), request.GET.get('blog_promo_page'),
+            instance.get_entries().with_authors(),
+            request.GET.get('blog_promo_page'),
             instance.number_of_entries)
         context.update({
             'plugin': instance,
@@ -31,7 +35,8 @@ class BlogRiverPlugin(AdminHelper, CMSPluginBase):
             'hide_entry_description': not instance.display_abstract,
             'hide_entry_image': not instance.display_thumbnails,
             'paginate_entries': instance.paginate_entries,
-            'page_param_name': 'blog_promo_page'
+            'page_param_name': 'blog_promo_page',
+            'poster_image_sizes': RIVER_POSTER_IMAGE_SIZES
         })
         return context
 
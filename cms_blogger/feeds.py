@@ -1,16 +1,33 @@
 from django.contrib.syndication.views import Feed
 from django.template.context import RequestContext
-from .views import get_blog_or_404
-from .settings import POSTS_ON_RSS
+from .views import get_blog_or_404, blog_condition, blog_page_version
+from .caching import versioned_cache_page
+from .instrumentation import instrument
+from .settings import POSTS_ON_RSS, FEED_CACHE_TIMEOUT
 import urlparse
 
 
+def blog_feed_versions(request, *args, **kwargs):
+    # feeds don't display the menu
+    version_key = blog_page_version(request, *args, **kwargs)
+    return [version_key] if version_key else None
+
+
 class BlogFeed(Feed):
 
     def __init__(self, *args, **kwargs):
         super(BlogFeed, self).__init__(*args, **kwargs)
         self.original_url = ''
 
+    @instrument('BlogFeed')
+    def __call__(self, request, *args, **kwargs):
+        # feed readers get a 304 if the blog didn't change since their
+        #   last visit; the rendered feed is cached until the blog changes
+        feed_view = versioned_cache_page(
+            blog_feed_versions, timeout=FEED_CACHE_TIMEOUT)(
+            super(BlogFeed, self).__call__)
+        return blog_condition(feed_view)(request, *args, **kwargs)
+
     def _set_original_url(self, request):
         self.original_url = ''
         scheme, netloc = urlparse.urlparse(
@@ -39,7 +56,10 @@ class BlogFeed(Feed):
         return obj.tagline
 
     def items(self, obj):
-        return obj.get_entries()[:POSTS_ON_RSS]
+        # everything the items need is fetched with a fixed number of queries
+        entries = obj.get_entries().select_related('blog').prefetch_related(
+            'authors__user', 'categories')
+        return entries[:POSTS_ON_RSS]
 
     def item_title(self, item):
         return item.title
@@ -57,11 +77,11 @@ class BlogFeed(Feed):
         return item.authors_display_name
 
     def item_author_email(self, item):
-        authors_users = item.authors.filter(user__isnull=False)
-        return ", ".join((author.user.email for author in authors_users))
+        return ", ".join((author.user.email for author in item.authors.all()
+                          if author.user))
 
     def item_categories(self, item):
-        return item.categories.values_list('name', flat=True)
+        return [category.name for category in item.categories.all()]
 
     def item_enclosure_url(self, item):
         return item.poster_image.url if item.poster_image else ''
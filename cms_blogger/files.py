@@ -0,0 +1,101 @@
+"""
+Poster image files deletion. Files are recorded as OrphanFile rows, in the
+    transaction that removed them from their entries, and deleted from the
+    storage in batches once the batch_updates block they were deleted in
+    exits: with one request for many files where the storage supports it
+    (a delete_many method), one by one otherwise. Files deleted outside
+    batch_updates blocks, which can't tell when their transaction gets
+    committed, and files that couldn't be deleted stay recorded; the
+    blogger_sweep_files command deletes them.
+"""
+from django.db.models import F
+from .batch import batched, is_batching
+
+
+# S3 multi-object deletes take up to 1000 keys; sqlite allows up to 999
+#   query parameters
+DELETE_BATCH_SIZE = 500
+
+
+def get_storage():
+    from .models import BlogEntryPage
+    return BlogEntryPage._meta.get_field('poster_image').storage
+
+
+def _delete(storage, name):
+    try:
+        storage.delete(name)
+    except Exception as e:
+        return unicode(e) or e.__class__.__name__
+    return None
+
+
+def delete_many(storage, names):
+    """
+    Deletes the files with the storage's delete_many(names), if it has
+        one, or one by one with its delete(name); the storages handle their
+        own names normalization. Returns a dict with the errors of the files
+        that couldn't be deleted.
+    The files are not deleted from multiple threads since the storages
+        connections(e.g. boto's) are not thread safe.
+    """
+    if hasattr(storage, 'delete_many'):
+        return storage.delete_many(names) or {}
+    errors = dict((name, _delete(storage, name)) for name in names)
+    return dict((name, error) for name, error in errors.items() if error)
+
+
+def sweep_files(names=None):
+    """
+    Deletes the recorded orphan files(only the given ones if names are
+        passed) from the storage; returns the number of deleted files.
+    """
+    from .models import OrphanFile
+    storage = get_storage()
+    if names is None:
+        orphans = list(OrphanFile.objects.order_by('id').values_list(
+            'id', 'name'))
+    else:
+        names, orphans = sorted(set(names)), []
+        for start in range(0, len(names), DELETE_BATCH_SIZE):
+            orphans.extend(OrphanFile.objects.filter(
+                name__in=names[start:start + DELETE_BATCH_SIZE]
+            ).values_list('id', 'name'))
+    deleted = 0
+    for start in range(0, len(orphans), DELETE_BATCH_SIZE):
+        batch = orphans[start:start + DELETE_BATCH_SIZE]
+        errors = delete_many(
+            storage, sorted(set(name for _, name in batch)))
+        done = [pk for pk, name in batch if name not in errors]
+        failed = [pk for pk, name in batch if name in errors]
+        OrphanFile.objects.filter(id__in=done).delete()
+        OrphanFile.objects.filter(id__in=failed).update(
+            attempts=F('attempts') + 1)
+        deleted += len(done)
+    return deleted
+
+
+def delete_files(names):
+    """
+    Records the files as orphan files. Inside a batch_updates block(wrapped
+        around the transaction) they also get deleted from the storage when
+        the block exits, once the transaction is committed; a rolled back
+        transaction drops the records and keeps the files.
+    """
+    from .models import OrphanFile
+    names = sorted(set(filter(None, names)))
+    if not names:
+        return
+    OrphanFile.objects.bulk_create([OrphanFile(name=name) for name in names])
+    if is_batching():
+        batched(sweep_files, names)
+
+
+def delete_uploads(names):
+    """
+    Deletes the uploads of the poster image jobs, which are kept in their
+        own storage. Failures are ignored; nothing refers to them anymore.
+    """
+    from .models import PosterImageJob
+    storage = PosterImageJob._meta.get_field('upload').storage
+    delete_many(storage, sorted(set(filter(None, names))))
@@ -29,11 +29,12 @@ from django_select2.fields import (
 
 from .models import (
     Blog, BlogEntryPage, BlogCategory, Author, RiverPlugin, HomeBlog,
-    MAX_CATEGORIES_IN_PLUGIN)
+    MAX_CATEGORIES_IN_PLUGIN, invalidate_blogs_layouts)
 from .widgets import (
     TagItWidget, ButtonWidget, DateTimeWidget, PosterImage, SpinnerWidget,
     JQueryUIMultiselect)
 from .slug import get_unique_slug
+from .batch import batch_updates, batched
 from .utils import (
     user_display_name, get_allowed_sites, set_cms_site, get_current_site)
 from .settings import DISALLOWED_ENTRIES_SLUGS
@@ -84,6 +85,12 @@ class BlogLayoutInlineFormSet(BaseGenericInlineFormSet):
                         ', '.join(pretty_specific_layout_types)))
         return self.cleaned_data
 
+    def save(self, *args, **kwargs):
+        saved = super(BlogLayoutInlineFormSet, self).save(*args, **kwargs)
+        # the blog layouts get resolved again on the next page render
+        batched(invalidate_blogs_layouts, [self.instance.pk])
+        return saved
+
 
 class HomeBlogLayoutInlineFormSet(BaseGenericInlineFormSet):
 
@@ -340,12 +347,13 @@ class BlogForm(AbstractBlogForm):
         removed_categories = existing_names - names
         new_category_names = names - existing_names
 
-        for name in new_category_names:
-            BlogCategory.objects.create(name=name, blog=saved_blog)
+        with batch_updates():
+            for name in new_category_names:
+                BlogCategory.objects.create(name=name, blog=saved_blog)
 
-        for category in BlogCategory.objects.filter(
-                name__in=removed_categories, blog=saved_blog):
-            category.delete()
+            for category in BlogCategory.objects.filter(
+                    name__in=removed_categories, blog=saved_blog):
+                category.delete()
 
     def save(self, commit=True):
         saved_instance = super(BlogForm, self).save(commit=commit)
@@ -0,0 +1,224 @@
+"""
+Query count, database time, template render time and cache hit ratio of
+    the blogger views and plugins, enabled by BLOGGER_INSTRUMENTATION.
+Each call of an instrumented function sends the instrumented signal and
+    adds its metrics to the totals kept in the cache, which are reported
+    by the blogger_stats command. In DEBUG the metrics of the views are
+    also sent as response headers.
+When disabled an instrumented call costs one global lookup and one
+    function call.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.template.base import Template
+from functools import wraps
+from .caching import VERSION_TIMEOUT, get_version, bump_version
+from .settings import INSTRUMENTATION
+from .signals import instrumented
+import os
+import threading
+import time
+import uuid
+
+
+# totals kept for each instrumented name; times are in milliseconds
+METRICS = ('calls', 'queries', 'db_time', 'render_time', 'cache_hits',
+           'cache_misses', 'time')
+TIME_METRICS = ('db_time', 'render_time', 'time')
+
+_local = threading.local()
+_missing = object()
+_hooks_lock = threading.Lock()
+_hooks_installed = False
+# totals of this process since the stats were last reset
+_process = {'pid': None}
+_process_lock = threading.Lock()
+
+
+def _active_stats():
+    return getattr(_local, 'stack', None) or ()
+
+
+def _counting_get(get):
+    @wraps(get)
+    def wrapper(key, default=None, *args, **kwargs):
+        value = get(key, _missing, *args, **kwargs)
+        for stats in _active_stats():
+            stats['cache_misses' if value is _missing else 'cache_hits'] += 1
+        return default if value is _missing else value
+    return wrapper
+
+
+def _counting_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(keys, *args, **kwargs):
+        keys = list(keys)
+        values = get_many(keys, *args, **kwargs)
+        for stats in _active_stats():
+            stats['cache_hits'] += len(values)
+            stats['cache_misses'] += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        active = _active_stats()
+        # included templates are part of the outermost render
+        if not active or getattr(_local, 'rendering', False):
+            return render(self, context)
+        _local.rendering = True
+        start = time.time()
+        try:
+            return render(self, context)
+        finally:
+            _local.rendering = False
+            elapsed = time.time() - start
+            for stats in active:
+                stats['render_time'] += elapsed
+    return wrapper
+
+
+def _install_hooks():
+    # the cache and templates are hooked once, the first time an
+    #   instrumented function is called with the instrumentation enabled
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        cache.get = _counting_get(cache.get)
+        cache.get_many = _counting_get_many(cache.get_many)
+        Template.render = _timed_render(Template.render)
+        _hooks_installed = True
+
+
+def _slots_key(generation):
+    return 'cms_blogger_stats_%s_slots' % generation
+
+
+def _slot_key(generation, slot):
+    return 'cms_blogger_stats_%s_slot_%s' % (generation, slot)
+
+
+def _reset_process(pid, generation):
+    _process.update({
+        'pid': pid, 'generation': generation, 'totals': {},
+        'id': '%s_%s' % (pid, uuid.uuid4().hex[:8])})
+
+
+def record(name, stats):
+    """
+    Adds the metrics of one call to the totals of the name. Each process
+        keeps its own totals, in memory and in one cache key for each name,
+        so no updates are lost and a call costs two cache round trips; the
+        keys are registered in slots that are allocated atomically the
+        first time a process records a name.
+    """
+    generation = get_version('stats', 'all')
+    with _process_lock:
+        pid = os.getpid()
+        # forked processes don't keep the totals of their parent
+        if _process['pid'] != pid or _process['generation'] != generation:
+            _reset_process(pid, generation)
+        totals = _process['totals'].get(name)
+        key = 'cms_blogger_stats_%s_%s_%s' % (
+            generation, name, _process['id'])
+        if totals is None:
+            totals = _process['totals'][name] = dict.fromkeys(METRICS, 0)
+            cache.add(_slots_key(generation), 0, VERSION_TIMEOUT)
+            slot = cache.incr(_slots_key(generation))
+            cache.set(_slot_key(generation, slot), (name, key),
+                      VERSION_TIMEOUT)
+        for metric in METRICS:
+            value = stats[metric]
+            if metric in TIME_METRICS:
+                value = int(round(value * 1000))
+            totals[metric] += value
+        cache.set(key, totals, VERSION_TIMEOUT)
+
+
+def get_stats():
+    """
+    Returns the totals of all the instrumented names, from all the
+        processes, as (name, totals) pairs.
+    """
+    generation = get_version('stats', 'all')
+    slots = cache.get(_slots_key(generation)) or 0
+    names_keys = cache.get_many([
+        _slot_key(generation, slot) for slot in range(1, slots + 1)]).values()
+    processes_totals = cache.get_many([key for _, key in names_keys])
+    totals = {}
+    for name, key in names_keys:
+        name_totals = totals.setdefault(name, dict.fromkeys(METRICS, 0))
+        for metric, value in processes_totals.get(key, {}).items():
+            name_totals[metric] += value
+    return sorted(totals.items())
+
+
+def reset_stats():
+    # the totals recorded so far expire with their generation
+    bump_version('stats', 'all')
+
+
+def _add_headers(response, stats):
+    response['X-Blogger-Queries'] = stats['queries']
+    response['X-Blogger-DB-Time'] = '%.1fms' % (stats['db_time'] * 1000)
+    response['X-Blogger-Render-Time'] = '%.1fms' % (
+        stats['render_time'] * 1000)
+    response['X-Blogger-Cache'] = '%s hits, %s misses' % (
+        stats['cache_hits'], stats['cache_misses'])
+
+
+def instrument(name):
+    """
+    Decorator that measures each call of a view, plugin or menu method
+        under the given name.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not INSTRUMENTATION:
+                return func(*args, **kwargs)
+            _install_hooks()
+            stack = _local.__dict__.setdefault('stack', [])
+            if not stack:
+                # queries are recorded by the debug cursor only
+                _local.debug_cursor = connection.use_debug_cursor
+                connection.use_debug_cursor = True
+            stats = dict.fromkeys(METRICS, 0)
+            queries_start = len(connection.queries)
+            start = time.time()
+            stack.append(stats)
+            try:
+                result = func(*args, **kwargs)
+                # template responses are rendered after the view returns
+                if hasattr(result, 'render') and \
+                        not getattr(result, 'is_rendered', True):
+                    result.render()
+            finally:
+                stack.pop()
+                stats['time'] = time.time() - start
+                stats['calls'] = 1
+                queries = connection.queries[queries_start:]
+                stats['queries'] = len(queries)
+                stats['db_time'] = sum(
+                    float(query['time']) for query in queries)
+                if not stack:
+                    connection.use_debug_cursor = _local.debug_cursor
+                    if not (_local.debug_cursor or settings.DEBUG):
+                        del connection.queries[queries_start:]
+            # the stats are not counted as cache lookups of the outer calls
+            _local.stack = []
+            try:
+                record(name, stats)
+            finally:
+                _local.stack = stack
+            instrumented.send(sender=func, name=name, stats=stats)
+            if settings.DEBUG and isinstance(result, HttpResponse):
+                _add_headers(result, stats)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+"""
+Poster images uploaded from the admin are stored as PosterImageJob rows and
+    resized outside the upload request by the blogger_process_images
+    command(when BLOGGER_ASYNC_POSTER_IMAGES is on) so no message broker is
+    needed. The admin polls the job status until it's done.
+"""
+from django.db import transaction
+from django.utils import timezone
+from .batch import batch_updates, batched
+from .files import delete_files
+from .models import (
+    BlogEntryPage, PosterImageJob, touch_blogs, invalidate_blogs_caches)
+from .utils import resize_image, make_renditions
+import datetime
+
+
+# jobs left processing for longer are considered abandoned by a worker
+#   that died and get processed again
+STALE_JOB_TIMEOUT = datetime.timedelta(hours=1)
+# finished jobs are kept for the admin status polling
+FINISHED_JOB_TTL = datetime.timedelta(days=1)
+
+
+def claim_job(job):
+    """
+    Marks the pending job as processing; returns False if another worker
+        claimed it first.
+    """
+    claimed = PosterImageJob.objects.filter(
+        pk=job.pk, status=PosterImageJob.PENDING
+    ).update(status=PosterImageJob.PROCESSING, modified_at=timezone.now())
+    job.status = PosterImageJob.PROCESSING
+    return bool(claimed)
+
+
+def set_entry_poster_image(entry_id, poster_image, renditions):
+    """
+    Sets the poster image of the entry without saving the whole entry, so
+        the changes made to the entry while the image was resized are kept.
+        The files are saved before the entry gets locked and are deleted if
+        the entry can't be updated(e.g. it was deleted meanwhile). Returns
+        the entry, with the new poster image.
+    """
+    entry = BlogEntryPage.objects.get(pk=entry_id)
+    entry.set_poster_image(poster_image, renditions)
+    # upload_to is only called by the field's pre_save
+    name = entry._meta.get_field('poster_image').pre_save(entry, True).name
+    # the replaced files are the ones of the locked entry
+    del entry._old_poster_image_files
+    try:
+        with batch_updates(), transaction.commit_on_success():
+            locked = BlogEntryPage.objects.select_for_update().get(
+                pk=entry_id)
+            BlogEntryPage.objects.filter(pk=entry_id).update(
+                poster_image=name,
+                poster_image_renditions=entry.poster_image_renditions,
+                modified_at=timezone.now())
+            # what the entry save would have done; the poster image doesn't
+            #   change the published entries counts or the search index
+            delete_files(locked.get_poster_image_files())
+            batched(touch_blogs, [locked.blog_id])
+            batched(invalidate_blogs_caches, [locked.blog_id])
+    except Exception:
+        with batch_updates(), transaction.commit_on_success():
+            delete_files(entry.get_poster_image_files())
+        raise
+    return entry
+
+
+def process_poster_image_job(job, upload=None):
+    """
+    Resizes the uploaded image of a claimed job and sets it as the poster
+        image of the job's entry. The stored upload is deleted afterwards.
+    Jobs processed right away(see BLOGGER_ASYNC_POSTER_IMAGES) are given
+        the uploaded file instead; they are neither stored nor saved.
+    """
+    stored = upload is None
+    if stored:
+        upload = job.upload
+        upload.open('rb')
+    try:
+        try:
+            renditions = make_renditions(upload)
+            poster_image = resize_image(upload)
+        except Exception as e:
+            raise Exception("Cannot resize image: %s" % e)
+        job.entry = set_entry_poster_image(
+            job.entry_id, poster_image, renditions)
+        job.status = PosterImageJob.DONE
+    except Exception as e:
+        job.status, job.error = PosterImageJob.FAILED, unicode(e)
+    finally:
+        if stored:
+            upload.close()
+    if stored:
+        job.upload.delete(save=False)
+        job.save()
+    return job
+
+
+def process_poster_image_jobs(limit=None):
+    """
+    Processes the pending jobs in the order they were created; returns
+        the number of processed jobs. Multiple workers can run at once.
+    """
+    now = timezone.now()
+    PosterImageJob.objects.filter(
+        status=PosterImageJob.PROCESSING,
+        modified_at__lt=now - STALE_JOB_TIMEOUT
+    ).update(status=PosterImageJob.PENDING)
+    # their uploads were deleted when they finished
+    PosterImageJob.objects.filter(
+        status__in=(PosterImageJob.DONE, PosterImageJob.FAILED),
+        modified_at__lt=now - FINISHED_JOB_TTL).delete()
+
+    processed = 0
+    pending = PosterImageJob.objects.filter(
+        status=PosterImageJob.PENDING).order_by('id')
+    for job in pending.select_related('entry')[:limit]:
+        if claim_job(job):
+            process_poster_image_job(job)
+            processed += 1
+    return processed
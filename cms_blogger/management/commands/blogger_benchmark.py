@@ -0,0 +1,57 @@
+from django.core.management.base import NoArgsCommand, CommandError
+from cms_blogger.benchmark import run_benchmarks, get_scenarios
+from cms_blogger.models import Blog
+from optparse import make_option
+import json
+
+
+class Command(NoArgsCommand):
+    help = ("Measures the latency percentiles and query counts of the blogger "
+            "pages, feeds, sitemaps, plugin, menu and entries moves of the "
+            "current site and prints them as json. Use it on a dataset from "
+            "blogger_generate_dataset.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--iterations', type='int', dest='iterations',
+                    default=20, help='Measured calls of each scenario.'),
+        make_option('--warmup', type='int', dest='warmup', default=2,
+                    help='Calls made before measuring each scenario.'),
+        make_option('--cold', action='store_true', dest='cold',
+                    default=False,
+                    help='Clear the cache before each measured call.'),
+        make_option('--only', dest='only', default='',
+                    help='Comma separated names of the scenarios to run.'),
+        make_option('--move-size', type='int', dest='move_size',
+                    default=100,
+                    help='Number of entries moved by the move_entries '
+                         'scenario.'),
+        make_option('--output', dest='output', default=None,
+                    help='Write the json results to this file.'),
+    )
+
+    def handle_noargs(self, **options):
+        if Blog.objects.count() < 2:
+            raise CommandError(
+                "There is nothing to benchmark; run "
+                "blogger_generate_dataset first.")
+        only = filter(None, options['only'].split(','))
+        unknown = set(only) - set(get_scenarios(options['move_size']))
+        if unknown:
+            raise CommandError(
+                "Unknown scenarios: %s" % ', '.join(sorted(unknown)))
+        verbosity = int(options.get('verbosity', 1))
+
+        def progress(message):
+            if verbosity > 1:
+                self.stderr.write("%s\n" % message)
+
+        report = run_benchmarks(
+            iterations=max(options['iterations'], 1),
+            warmup=options['warmup'], cold=options['cold'], only=only,
+            move_size=options['move_size'], progress=progress)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write("%s\n" % output)
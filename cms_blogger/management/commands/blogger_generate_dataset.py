@@ -0,0 +1,73 @@
+from django.core.management.base import NoArgsCommand, CommandError
+from cms_blogger.benchmark import generate_dataset
+from optparse import make_option
+import datetime
+
+
+class Command(NoArgsCommand):
+    help = ("Generates synthetic blogs with entries, categories, authors, "
+            "navigation nodes and layouts on the current site for "
+            "benchmarking. Don't run it on a production database.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--blogs', type='int', dest='blogs', default=10,
+                    help='Number of blogs.'),
+        make_option('--entries', type='int', dest='entries', default=1000,
+                    help='Number of published entries of each blog.'),
+        make_option('--categories', type='int', dest='categories',
+                    default=10, help='Number of categories of each blog.'),
+        make_option('--authors', type='int', dest='authors', default=50,
+                    help='Number of authors shared by all the blogs.'),
+        make_option('--navigation-nodes', type='int',
+                    dest='navigation_nodes', default=5,
+                    help='Number of blogs with a navigation node.'),
+        make_option('--layouts', type='int', dest='layouts', default=1,
+                    help='Number of layouts of each blog(1 to 3).'),
+        make_option('--moved-entries', type='int', dest='moved_entries',
+                    default=100,
+                    help='Number of entries of the blog used by the '
+                         'move_entries benchmark.'),
+        make_option('--seed', type='int', dest='seed', default=0,
+                    help='Random seed; the same seed generates the same '
+                         'data.'),
+        make_option('--prefix', dest='prefix', default=None,
+                    help='Prefix of the generated slugs; derived from the '
+                         'seed by default. A prefix can be used only once.'),
+        make_option('--base-date', dest='base_date', default=None,
+                    help='Publication date(YYYY-MM-DD) of the newest '
+                         'entries; derived from the seed by default.'),
+        make_option('--language', dest='language', default='en',
+                    help='Language of the layouts page.'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+
+        def progress(message):
+            if verbosity > 0:
+                self.stdout.write("%s\n" % message)
+
+        base_date = None
+        if options['base_date']:
+            try:
+                base_date = datetime.datetime.strptime(
+                    options['base_date'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError(
+                    "Invalid base date: %s" % options['base_date'])
+        try:
+            created = generate_dataset(
+                blogs=options['blogs'], entries=options['entries'],
+                categories=options['categories'], authors=options['authors'],
+                navigation_nodes=options['navigation_nodes'],
+                layouts=max(1, min(options['layouts'], 3)),
+                moved_entries=options['moved_entries'],
+                seed=options['seed'], prefix=options['prefix'],
+                base_date=base_date, language=options['language'],
+                progress=progress)
+        except ValueError as e:
+            raise CommandError(unicode(e))
+        if verbosity > 0:
+            self.stdout.write("Created %s.\n" % ', '.join(
+                '%s %s' % (count, name.replace('_', ' '))
+                for name, count in sorted(created.items())))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from cms_blogger.models import Blog, BlogEntryPage
+from cms_blogger.move import move_entries
+from optparse import make_option
+
+
+class Command(BaseCommand):
+    args = '<destination_blog_id> [entry_id entry_id ...]'
+    help = ("Moves blog entries to another blog in chunks. Use it instead of "
+            "the admin action for large blog consolidations.")
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--from-blog', type='int', dest='from_blog', default=None,
+            help='Move all the entries of this blog.'),
+        make_option(
+            '--no-mirror-categories', action='store_false',
+            dest='mirror_categories', default=True,
+            help="Don't create the entries categories in the destination "
+                 "blog."),
+        make_option(
+            '--chunk-size', type='int', dest='chunk_size', default=None,
+            help='Number of entries moved in one transaction.'),
+    )
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError("The destination blog id is required.")
+        try:
+            destination_blog = Blog.objects.get(pk=args[0])
+        except (Blog.DoesNotExist, ValueError):
+            raise CommandError("Blog %s does not exist." % args[0])
+
+        to_move = Q(id__in=args[1:])
+        if options.get('from_blog'):
+            to_move |= Q(blog=options['from_blog'])
+        entries = BlogEntryPage.objects.filter(to_move).exclude(
+            blog=destination_blog)
+        entries_ids = list(entries.values_list('id', flat=True))
+        if not entries_ids:
+            raise CommandError("There are no entries to move.")
+
+        verbosity = int(options.get('verbosity', 1))
+
+        def progress(moved, total):
+            if verbosity > 0:
+                self.stdout.write("Moved %d/%d blog entries.\n" % (
+                    moved, total))
+
+        move_entries(
+            destination_blog, entries_ids,
+            mirror_categories=options.get('mirror_categories'),
+            chunk_size=options.get('chunk_size'), progress=progress)
@@ -0,0 +1,30 @@
+from django.core.management.base import NoArgsCommand
+from cms_blogger.jobs import process_poster_image_jobs
+from optparse import make_option
+import time
+
+
+class Command(NoArgsCommand):
+    help = ("Resizes the uploaded poster images that are waiting to be "
+            "processed. Run it with --loop as a worker when "
+            "BLOGGER_ASYNC_POSTER_IMAGES is on.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--loop', action='store_true', dest='loop', default=False,
+            help='Keep checking for new uploads.'),
+        make_option(
+            '--interval', type='float', dest='interval', default=1.0,
+            help='Seconds to wait between checks when looping.'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+        while True:
+            processed = process_poster_image_jobs()
+            if processed and verbosity > 0:
+                self.stdout.write("Processed %d poster images.\n" % processed)
+            if not options.get('loop'):
+                break
+            if not processed:
+                time.sleep(options.get('interval'))
@@ -0,0 +1,33 @@
+from django.core.management.base import NoArgsCommand
+from cms_blogger.models import BlogEntryPage
+from optparse import make_option
+import time
+
+
+class Command(NoArgsCommand):
+    help = ("Publishes/unpublishes blog entries that reached their scheduled "
+            "start/end publication date. Run it periodically(cron) or as a "
+            "worker with --loop.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--loop', action='store_true', dest='loop', default=False,
+            help='Keep running and check for scheduled entries every '
+                 '--interval seconds.'),
+        make_option(
+            '--interval', type='int', dest='interval', default=60,
+            help='Number of seconds between checks when running with '
+                 '--loop. Default is 60.'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+        while True:
+            changed = BlogEntryPage.objects.update_live_state()
+            if verbosity > 1 or (changed and verbosity > 0):
+                self.stdout.write(
+                    "%d blog entries changed their publication state.\n" % (
+                        len(changed), ))
+            if not options.get('loop'):
+                break
+            time.sleep(options.get('interval'))
@@ -0,0 +1,15 @@
+from django.core.management.base import NoArgsCommand
+from cms_blogger.batch import batch_updates
+from cms_blogger.models import BlogEntryPage, update_authors_display
+
+
+class Command(NoArgsCommand):
+    help = ("Recomputes the denormalized authors names of all blog entries. "
+            "Run it after turning BLOGGER_DENORMALIZED_AUTHORS_DISPLAY on.")
+
+    def handle_noargs(self, **options):
+        with batch_updates():
+            update_authors_display(
+                BlogEntryPage.objects.values_list('id', flat=True))
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write("Entries authors names rebuilt.\n")
@@ -0,0 +1,12 @@
+from django.core.management.base import NoArgsCommand
+from cms_blogger.models import update_published_entries_count
+
+
+class Command(NoArgsCommand):
+    help = ("Recomputes the published entries counters of all blogs, home "
+            "blogs and blog categories.")
+
+    def handle_noargs(self, **options):
+        update_published_entries_count()
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write("Published entries counters rebuilt.\n")
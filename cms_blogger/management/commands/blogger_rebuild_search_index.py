@@ -0,0 +1,12 @@
+from django.core.management.base import NoArgsCommand
+from cms_blogger.models import update_search_index
+
+
+class Command(NoArgsCommand):
+    help = ("Rebuilds the search index of the published blog entries for the "
+            "configured search backend.")
+
+    def handle_noargs(self, **options):
+        update_search_index()
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write("Search index rebuilt.\n")
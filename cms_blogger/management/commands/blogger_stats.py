@@ -0,0 +1,34 @@
+from django.core.management.base import NoArgsCommand
+from cms_blogger.instrumentation import get_stats, reset_stats
+from optparse import make_option
+
+
+class Command(NoArgsCommand):
+    help = ("Shows the average queries, database time, template render time "
+            "and cache hit ratio of each instrumented blogger view and "
+            "plugin. Requires BLOGGER_INSTRUMENTATION.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            '--reset', action='store_true', dest='reset', default=False,
+            help='Clear the recorded metrics after showing them.'),
+    )
+
+    def handle_noargs(self, **options):
+        row = "%-32s %8s %8s %10s %10s %10s %6s\n"
+        self.stdout.write(row % (
+            'name', 'calls', 'queries', 'db ms', 'render ms', 'total ms',
+            'hits'))
+        for name, totals in get_stats():
+            calls = totals['calls'] or 1
+            lookups = totals['cache_hits'] + totals['cache_misses']
+            self.stdout.write(row % (
+                name, totals['calls'],
+                '%.1f' % (float(totals['queries']) / calls),
+                '%.1f' % (float(totals['db_time']) / calls),
+                '%.1f' % (float(totals['render_time']) / calls),
+                '%.1f' % (float(totals['time']) / calls),
+                '%d%%' % (100 * totals['cache_hits'] / lookups)
+                if lookups else '-'))
+        if options.get('reset'):
+            reset_stats()
@@ -0,0 +1,12 @@
+from django.core.management.base import NoArgsCommand
+from cms_blogger.files import sweep_files
+
+
+class Command(NoArgsCommand):
+    help = ("Deletes the poster image files that were left in the storage "
+            "by failed deletions.")
+
+    def handle_noargs(self, **options):
+        deleted = sweep_files()
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write("Deleted %d orphan files.\n" % deleted)
@@ -2,6 +2,31 @@ from django.contrib.sites.models import Site
 from django.db import models
 from django.db.models import Q
 from django.utils import timezone
+from .settings import DENORMALIZED_AUTHORS_DISPLAY
+from .signals import publication_changed
+
+
+def live_conditions(now=None):
+    # entries that should be visible on the site at the given moment
+    now = now or timezone.now()
+    return Q(
+        Q(is_published=True) &
+        Q(Q(start_publication__lt=now) |
+          Q(start_publication__isnull=True)) &
+        Q(Q(end_publication__gte=now) |
+          Q(end_publication__isnull=True))
+    )
+
+
+def not_live_conditions(now=None):
+    # the negation of live_conditions; written explicitly since null
+    #   publication dates don't play well with exclude
+    now = now or timezone.now()
+    return Q(
+        Q(is_published=False) |
+        Q(start_publication__gte=now) |
+        Q(end_publication__lt=now)
+    )
 
 
 class EntriesQuerysetMixin(object):
@@ -15,35 +40,54 @@ class EntriesQuerysetMixin(object):
         return self.filter(blog__site=site)
 
     def published(self):
-        now = timezone.now()
-        pub_conditions = Q(
-            Q(is_published=True) &
-            Q(Q(start_publication__lt=now) |
-              Q(start_publication__isnull=True)) &
-            Q(Q(end_publication__gte=now) |
-              Q(end_publication__isnull=True))
-        )
-        return self.filter(pub_conditions)
+        # is_live is kept up to date by the entry save and by
+        #   update_live_state for scheduled publications
+        return self.filter(is_live=True)
 
     def unpublished(self):
         return self.filter(is_published=False)
 
+    def with_authors(self):
+        # loads the authors and their users of the fetched entries with two
+        #   more queries, needed by the authors_display_name of each entry
+        if DENORMALIZED_AUTHORS_DISPLAY:
+            return self
+        return self.prefetch_related('authors__user')
+
+    def update_live_state(self, now=None):
+        """
+        Flips the is_live flag for entries whose publication state changed
+            (published/unpublished in bulk or reached a scheduled start or
+            end publication date).
+        Sends the publication_changed signal and returns the ids of the
+            entries that changed.
+        """
+        now = now or timezone.now()
+        went_live = dict(self.filter(live_conditions(now)).filter(
+            is_live=False).values_list('id', 'blog'))
+        went_offline = dict(self.filter(not_live_conditions(now)).filter(
+            is_live=True).values_list('id', 'blog'))
+        model_qs = self.model.objects.all()
+        if went_live:
+            model_qs.filter(id__in=went_live.keys()).update(is_live=True)
+        if went_offline:
+            model_qs.filter(id__in=went_offline.keys()).update(is_live=False)
+
+        changed = dict(went_live)
+        changed.update(went_offline)
+        if changed:
+            publication_changed.send(
+                sender=self.model, entries_ids=changed.keys(),
+                blogs_ids=set(changed.values()))
+        return changed.keys()
+
 
 class EmptyEntriesQueryset(models.query.EmptyQuerySet, EntriesQuerysetMixin):
     pass
 
 
 class EntriesQueryset(models.query.QuerySet, EntriesQuerysetMixin):
-
-    def delete(self):
-        # deletes all poster images from the storage
-        files_to_delete = list(self.values_list('poster_image', flat=True))
-        super(EntriesQueryset, self).delete()
-        storage = self.model._meta.get_field('poster_image').storage
-        for file_name in filter(lambda x: x, files_to_delete):
-            storage.delete(file_name)
-
-    delete.alters_data = True
+    pass
 
 
 class EntriesManager(models.Manager):
@@ -66,3 +110,9 @@ class EntriesManager(models.Manager):
 
     def unpublished(self):
         return self.get_query_set().unpublished()
+
+    def with_authors(self):
+        return self.get_query_set().with_authors()
+
+    def update_live_state(self, now=None):
+        return self.get_query_set().update_live_state(now=now)
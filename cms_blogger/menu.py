@@ -3,21 +3,59 @@ from django.template.context import RequestContext
 from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
 from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
 from menus.base import NavigationNode, Modifier
 from menus.menu_pool import menu_pool
 from .models import BlogNavigationNode
+from .caching import get_version, VERSION_TIMEOUT
+from .instrumentation import instrument
 from collections import OrderedDict
-from itertools import ifilter
+
+
+def _blog_nodes_cache_key(site_id):
+    return 'cms_blogger_menu_nodes_%s_%s' % (
+        site_id, get_version('menu', site_id))
+
+
+def _blog_node_record(node):
+    return {
+        'id': node.id,
+        'menu_id': node.menu_id,
+        'text': node.text,
+        'url': node.get_absolute_url(),
+        'position': node.position,
+        'parent_node_id': node.parent_node_id,
+        'in_navigation': node.is_visible(),
+    }
+
+
+def get_blog_nodes(site):
+    """
+    Returns the navigation nodes of all the site blogs as dicts ordered by
+        their modification date. The nodes are cached until a blog or a
+        navigation node from the site changes.
+    """
+    key = _blog_nodes_cache_key(site.pk)
+    records = cache.get(key)
+    if records is None:
+        nodes = BlogNavigationNode.objects.filter(
+            Q(blog__site=site) | Q(homeblog__site=site)
+        ).distinct().order_by('modified_at')
+        records = [_blog_node_record(node)
+                   for node in BlogNavigationNode.prefetch_blogs(nodes)
+                   if node.blog]
+        cache.set(key, records, VERSION_TIMEOUT)
+    return records
 
 
 def _make_navigation_node(blog_node, parent, proxy_prefix, visible=None):
     nav_node = NavigationNode(
-        blog_node.text,
-        "%s%s" % (proxy_prefix, blog_node.get_absolute_url()),
-        blog_node.menu_id,
+        blog_node['text'],
+        "%s%s" % (proxy_prefix, blog_node['url']),
+        blog_node['menu_id'],
         attr={'blogNode': True},
-        visible=visible or blog_node.is_visible())
+        visible=visible or blog_node['in_navigation'])
     if parent:
         nav_node.parent_id = parent.id
         nav_node.parent = parent
@@ -34,6 +72,7 @@ class BlogNavigationExtender(Modifier):
             return True
         return False
 
+    @instrument('BlogNavigationExtender.modify')
     def modify(self, request, nodes, namespace, root_id, post_cut, breadcrumb):
         if post_cut:
             return nodes
@@ -51,13 +90,11 @@ class BlogNavigationExtender(Modifier):
         #   will get inserted in the menu in the order of their modification
         #   date(from the oldest node to the newest node)
         current_site = Site.objects.get_current()
-        blog_nodes = BlogNavigationNode.objects.filter(
-            Q(blog__site=current_site) | Q(homeblog__site=current_site)
-        ).order_by('modified_at')
+        blog_nodes = get_blog_nodes(current_site)
 
         if not node_visible:
-            blog_nodes = blog_nodes.filter(
-                Q(blog__in_navigation=True) | Q(homeblog__in_navigation=True))
+            blog_nodes = [blog_node for blog_node in blog_nodes
+                          if blog_node['in_navigation']]
 
         # save all new added nodes in order to mark the selected one
         new_nodes = []
@@ -65,7 +102,7 @@ class BlogNavigationExtender(Modifier):
         #   modification date
         parents_with_children = OrderedDict()
         for blog_node in blog_nodes:
-            parent_id = blog_node.parent_node_id
+            parent_id = blog_node['parent_node_id']
             child = blog_node
             if parent_id not in parents_with_children:
                 parents_with_children[parent_id] = []
@@ -76,15 +113,19 @@ class BlogNavigationExtender(Modifier):
         root_blog_nodes = parents_with_children.pop(None, [])
 
         # add all nodes that have a page parent
+        nodes_by_id = {}
+        for node in nodes:
+            nodes_by_id.setdefault(node.id, node)
         for b_id in parents_with_children.keys():
-            page_node = next(ifilter(lambda n: n.id == b_id, nodes), None)
+            page_node = nodes_by_id.get(b_id)
             if not page_node:
                 continue
 
             for blog_node in parents_with_children.pop(page_node.id):
                 blog_nav_node = _make_navigation_node(
                     blog_node, page_node, proxy_prefix, node_visible)
-                page_node.children.insert(blog_node.position, blog_nav_node)
+                page_node.children.insert(
+                    blog_node['position'], blog_nav_node)
                 new_nodes.append(blog_nav_node)
 
         # add all nodes that are on the root level
@@ -105,9 +146,9 @@ class BlogNavigationExtender(Modifier):
                 blog_nav_node = _make_navigation_node(
                     root_blog_node, None, proxy_prefix, node_visible)
                 # set default position
-                position_in_nodes = root_blog_node.position
+                position_in_nodes = root_blog_node['position']
                 # try to find the 'real' position in navigation node list
-                root_page = visible_roots.get(root_blog_node.position)
+                root_page = visible_roots.get(root_blog_node['position'])
                 if root_page:
                     # insert at exact position
                     position_in_nodes = nodes_with_position[root_page]
@@ -119,9 +160,11 @@ class BlogNavigationExtender(Modifier):
                 new_nodes.append(blog_nav_node)
 
         # add all blog nodes that are children of other blog nodes
+        new_nodes_by_id = {}
+        for node in new_nodes:
+            new_nodes_by_id.setdefault(node.id, node)
         for b_id in parents_with_children.keys():
-            parent_blog_node = next(
-                ifilter(lambda n: n.id == b_id, new_nodes), None)
+            parent_blog_node = new_nodes_by_id.get(b_id)
             if not parent_blog_node:
                 continue
 
@@ -129,8 +172,9 @@ class BlogNavigationExtender(Modifier):
                 blog_nav_node = _make_navigation_node(
                     blog_node, parent_blog_node, proxy_prefix, node_visible)
                 parent_blog_node.children.insert(
-                    blog_node.position, blog_nav_node)
+                    blog_node['position'], blog_nav_node)
                 new_nodes.append(blog_nav_node)
+                new_nodes_by_id.setdefault(blog_nav_node.id, blog_nav_node)
 
         menu_pool._mark_selected(request, new_nodes)
         return nodes
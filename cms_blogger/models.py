@@ -1,19 +1,22 @@
 from django.db import models
-from django.db.models import Q
+from django.db.models import Q, F, Count
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 from django.contrib.contenttypes.generic import GenericRelation
+from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import get_language
 from django.template.defaultfilters import slugify
 from django.template.loader import get_template
 from django.db.models import signals
 from django.dispatch import receiver
 from django.http import HttpResponseNotFound
+from django.core.cache import cache
+from django.utils.datastructures import SortedDict
 
 from cms.models.fields import PlaceholderField
-from cms.models import Placeholder, CMSPlugin
+from cms.models import Placeholder, CMSPlugin, Page
 
 from cms_layouts.models import LayoutTitle, Layout
 from cms_layouts.layout_response import LayoutResponse
@@ -21,39 +24,58 @@ from cms_layouts.layout_response import LayoutResponse
 from filer.fields.image import FilerImageField
 import filer
 
-from .settings import POSTER_IMAGE_STORAGE, UPLOAD_TO_PREFIX, BLOGS_URL_PREFIX
-from .utils import user_display_name
-from .slug import get_unique_slug
+from .settings import (
+    POSTER_IMAGE_STORAGE, UPLOAD_TO_PREFIX, BLOGS_URL_PREFIX,
+    NEIGHBOURS_CACHE_TIMEOUT, DENORMALIZED_AUTHORS_DISPLAY,
+    POSTER_IMAGE_SIZES, LAYOUTS_CACHE_SIZE, RENDERED_CONTENT_CACHE_TIMEOUT)
+from .utils import user_display_name, poster_image_files
+from .slug import get_unique_slug, save_with_unique_slug
 from .managers import EntriesManager
-
+from .signals import publication_changed
+from .caching import (
+    get_version, bump_version, blog_id_cache_key, LRUCache, VERSION_TIMEOUT,
+    is_cacheable_request)
+from .batch import batched, is_batching
+from .files import delete_files, delete_uploads
+
+from functools import partial
+from collections import Counter
 import os
+import cPickle as pickle
 import datetime
+import json
 
 
 FILENAME_LENGTH = 100
 CATEGORY_NAME_LENGTH = 30
 MAX_CATEGORIES_IN_PLUGIN = 20
 
+# see Blog.get_layout_for
+_layouts_cache = LRUCache(LAYOUTS_CACHE_SIZE)
+
+
+def invalidate_rendered_content(placeholders_ids):
+    # drops the cached rendered plugins of the given content placeholders(see
+    #   load_rendered_content of the models with cms content)
+    bump_version('content', *filter(None, placeholders_ids))
+
 
 def getCMSContentModel(**kwargs):
     content_attr = kwargs.get('content_attr', 'content')
     body_attr = '%s_body' % content_attr
+    cached_body_attr = '_%s' % body_attr
     plugin_getter = 'get_%s_plugin' % content_attr
+    default_body = 'Sample content'
 
     class ModelWithCMSContent(models.Model):
 
-        def __init__(self, *args, **kwargs):
-            super(ModelWithCMSContent, self).__init__(*args, **kwargs)
-            # initialize text plugin body
-            setattr(self, body_attr, 'Sample content')
-            plugin = getattr(self, plugin_getter)()
-            if self.pk and plugin:
-                setattr(self, body_attr, getattr(plugin, 'body'))
-
         def save(self, *args, **kwargs):
             super(ModelWithCMSContent, self).save(*args, **kwargs)
+            # if the body was never read or assigned there is nothing to
+            #   write in the plugin; it only needs to exist
+            body_loaded = cached_body_attr in self.__dict__
             plugin = getattr(self, plugin_getter)()
-            if plugin is None:
+            if plugin is None or not body_loaded:
                 return
             # get_attached_plugin always fetches the plugin from the db;
             #   the html cleaning cannot be done in the clean method since the
@@ -62,6 +84,44 @@ def getCMSContentModel(**kwargs):
             plugin.clean()
             plugin.clean_plugins()
             plugin.save()
+            invalidate_rendered_content([plugin.placeholder_id])
+
+        def load_rendered_content(self, request, context):
+            """
+            Makes the content placeholder render its cached plugins: the text
+                plugins are cached with the nested plugins from their bodies
+                already rendered, so rendering the content needs no queries.
+                Cached until the plugins are saved or changed from the admin.
+            """
+            from cms.plugins.utils import get_plugins
+            from cms.plugins.text.models import Text
+            from cms.plugins.text.utils import plugin_tags_to_user_html
+            from cms.utils import get_language_from_request
+            placeholder_id = getattr(self, '%s_id' % content_attr)
+            if not RENDERED_CONTENT_CACHE_TIMEOUT or not placeholder_id:
+                return
+            language = get_language_from_request(request)
+            key = 'cms_blogger_rendered_content_%s_%s_%s' % (
+                placeholder_id, language,
+                get_version('content', placeholder_id))
+            cached = cache.get(key)
+            if cached is None:
+                placeholder = getattr(self, content_attr)
+                # copies, so the loaded plugins keep their original bodies
+                plugins = pickle.loads(pickle.dumps(
+                    get_plugins(request, placeholder, language),
+                    pickle.HIGHEST_PROTOCOL))
+                for plugin in plugins:
+                    if isinstance(plugin, Text):
+                        plugin.body = plugin_tags_to_user_html(
+                            plugin.body, context, placeholder)
+                cached = pickle.dumps(
+                    (placeholder, plugins), pickle.HIGHEST_PROTOCOL)
+                cache.set(key, cached, RENDERED_CONTENT_CACHE_TIMEOUT)
+            placeholder, plugins = pickle.loads(cached)
+            setattr(placeholder, '_%s_plugins_cache' % language, plugins)
+            setattr(self, self._meta.get_field(
+                content_attr).get_cache_name(), placeholder)
 
         def delete(self, *args, **kwargs):
             try:
@@ -89,23 +149,71 @@ def getCMSContentModel(**kwargs):
             return None
         if not placeholder.get_plugins():
             from cms.api import add_plugin
+            # read the raw attribute; going through the body property would
+            #   fetch the plugin again
             new_plugin = add_plugin(
                 placeholder, 'TextPlugin', get_language(),
-                body=getattr(instance, body_attr))
+                body=instance.__dict__.get(cached_body_attr, default_body))
             return new_plugin
         first_plugin = placeholder.get_plugins()[0]
         plg_instance, plg_cls = first_plugin.get_plugin_instance()
         return plg_instance
 
+    def get_body(instance):
+        # the text plugin body is fetched only when it's needed
+        if cached_body_attr not in instance.__dict__:
+            instance.__dict__[cached_body_attr] = default_body
+            plugin = None
+            if instance.pk:
+                plugin = getattr(instance, plugin_getter)()
+            if plugin:
+                instance.__dict__[cached_body_attr] = getattr(plugin, 'body')
+        return instance.__dict__[cached_body_attr]
+
+    def set_body(instance, value):
+        instance.__dict__[cached_body_attr] = value
+
+    def prefetch_bodies(cls, instances):
+        """
+        Loads the text plugin body for all instances with two queries.
+        Instances that don't have a text plugin yet get the default body;
+            the plugin gets created when they are saved.
+        Returns the instances as a list.
+        """
+        from cms.plugins.text.models import Text
+        instances = list(instances)
+        placeholder_field = '%s_id' % content_attr
+        to_load = [obj for obj in instances
+                   if cached_body_attr not in obj.__dict__]
+        placeholders_ids = filter(None, (getattr(obj, placeholder_field)
+                                         for obj in to_load))
+        first_plugins = {}
+        if placeholders_ids:
+            # the first plugin of a placeholder is the root plugin with the
+            #   lowest tree id(see Placeholder.get_plugins)
+            root_plugins = CMSPlugin.objects.filter(
+                placeholder__in=placeholders_ids, parent__isnull=True
+            ).order_by('tree_id').values_list('placeholder', 'id')
+            for placeholder_id, plugin_id in root_plugins:
+                first_plugins.setdefault(placeholder_id, plugin_id)
+        bodies = {}
+        if first_plugins:
+            bodies = dict(Text.objects.filter(
+                pk__in=first_plugins.values()).values_list('pk', 'body'))
+        for obj in to_load:
+            plugin_id = first_plugins.get(getattr(obj, placeholder_field))
+            obj.__dict__[cached_body_attr] = bodies.get(
+                plugin_id, default_body)
+        return instances
+
     # set content placeholder field
     ModelWithCMSContent.add_to_class(
         content_attr, PlaceholderField(content_attr))
-    # set body property
-    ModelWithCMSContent.add_to_class(
-        body_attr,
-        property(lambda x: getattr(x, "_%s" % body_attr),
-                 lambda x, v: setattr(x, "_%s" % body_attr, v)))
+    # set body property; the plugin body is lazy loaded
+    ModelWithCMSContent.add_to_class(body_attr, property(get_body, set_body))
     ModelWithCMSContent.add_to_class(plugin_getter, get_attached_plugin)
+    ModelWithCMSContent.add_to_class(
+        'prefetch_%s' % body_attr, classmethod(prefetch_bodies))
     return ModelWithCMSContent
 
 
@@ -148,13 +256,41 @@ class BlogNavigationNode(models.Model):
     parent_node_id = models.IntegerField(blank=True, null=True, db_index=True)
     modified_at = models.DateTimeField(auto_now=True, db_index=True)
 
-    @property
-    def blog(self):
-        attached_blog = self.blog_set.all()[:1]
-        if attached_blog:
-            return attached_blog[0]
-        attached_home_blog = self.homeblog_set.all()[:1]
-        return attached_home_blog[0] if attached_home_blog else None
+    def _get_blog(self):
+        # the blog is resolved only once per instance
+        if '_attached_blog' not in self.__dict__:
+            attached_blog = self.blog_set.all()[:1]
+            if not attached_blog:
+                attached_blog = self.homeblog_set.all()[:1]
+            self._attached_blog = attached_blog[0] if attached_blog else None
+        return self._attached_blog
+
+    def _set_blog(self, blog):
+        self._attached_blog = blog
+
+    blog = property(_get_blog, _set_blog)
+
+    @classmethod
+    def prefetch_blogs(cls, nodes):
+        """
+        Resolves the blog(or the home blog) of all nodes with two queries.
+        Returns the nodes as a list.
+        """
+        nodes = list(nodes)
+        to_load = dict((node.pk, node) for node in nodes
+                       if '_attached_blog' not in node.__dict__)
+        for node in to_load.values():
+            node.blog = None
+        for model in (Blog, HomeBlog):
+            if not to_load:
+                break
+            blogs = model.objects.filter(navigation_node__in=to_load.keys())
+            for blog in blogs:
+                node = to_load.pop(blog.navigation_node_id, None)
+                if node is not None:
+                    node.blog = blog
+                    blog.navigation_node = node
+        return nodes
 
     def get_absolute_url(self):
         return self.blog.get_absolute_url() if self.blog else ''
@@ -171,6 +307,17 @@ class BlogNavigationNode(models.Model):
         return self.id * -1
 
 
+def _reload_published_entries_count(instance):
+    # the counters are maintained with queryset updates; reload them before
+    #   saving so they don't get overwritten with the value this instance
+    #   was loaded with
+    if instance.pk:
+        counts = instance.__class__.objects.filter(
+            pk=instance.pk).values_list('published_entries_count', flat=True)
+        if counts:
+            instance.published_entries_count = counts[0]
+
+
 @contribute_with_title
 class AbstractBlog(models.Model):
     site_lookup = 'site__exact'
@@ -199,6 +346,10 @@ class AbstractBlog(models.Model):
         help_text=_('Blog navigation'))
     navigation_node = models.ForeignKey(
         BlogNavigationNode, null=True, blank=True, on_delete=models.SET_NULL)
+    # number of entries returned by get_entries; used by the landing page
+    #   paginator instead of counting the entries on each request
+    published_entries_count = models.PositiveIntegerField(
+        default=0, editable=False)
 
     class Meta:
         abstract = True
@@ -245,6 +396,7 @@ class AbstractBlog(models.Model):
         except Site.DoesNotExist:
             site = None
         self.site = site or Site.objects.get_current()
+        _reload_published_entries_count(self)
         super(AbstractBlog, self).save(*args, **kwargs)
 
     def __unicode__(self):
@@ -326,11 +478,24 @@ class Blog(AbstractBlog):
     def get_layout_for(self, layout_type):
         if layout_type not in Blog.LAYOUTS_CHOICES.keys():
             raise NotImplementedError
-        try:
-            return self.layouts.filter(layout_type__in=[
-                layout_type, Blog.ALL]).order_by('-layout_type')[0]
-        except IndexError:
-            return None
+        # resolved layouts(with their from_page) are cached pickled, in the
+        #   process and in the shared cache, until the blog layouts or their
+        #   pages change; each call returns its own unpickled instances
+        key = 'cms_blogger_layout_%s_%s_%s' % (
+            self.pk, layout_type, get_version('layouts', self.pk))
+        pickled = _layouts_cache.get(key)
+        if pickled is None:
+            pickled = cache.get(key)
+            if pickled is None:
+                layouts = self.layouts.select_related('from_page').filter(
+                    layout_type__in=[layout_type, Blog.ALL]
+                ).order_by('-layout_type')[:1]
+                pickled = pickle.dumps(
+                    list(layouts), pickle.HIGHEST_PROTOCOL)
+                cache.set(key, pickled, VERSION_TIMEOUT)
+            _layouts_cache.set(key, pickled)
+        layouts = pickle.loads(pickled)
+        return layouts[0] if layouts else None
 
     def get_entries(self):
         ordering = ('-publication_date', 'slug')
@@ -385,10 +550,12 @@ class Author(models.Model):
         help_text=_("Used to build the author's URL."))
 
     def save(self, *args, **kwargs):
+        save = super(Author, self).save
         if not self.slug and self.display_name:
-            unique_qs = Author.objects.all()
-            self.slug = get_unique_slug(self, self.display_name, unique_qs)
-        super(Author, self).save(*args, **kwargs)
+            # there's no constraint or row to lock for the authors slugs
+            self.slug = get_unique_slug(
+                self, self.display_name, Author.objects.all())
+        save(*args, **kwargs)
 
     @property
     def display_name(self):
@@ -398,6 +565,10 @@ class Author(models.Model):
         return self.display_name
 
 
+def join_authors(authors):
+    return ", ".join(('%s' % author for author in authors))
+
+
 @blog_page
 class BioPage(models.Model, BlogRelatedPage):
 
@@ -454,6 +625,9 @@ class BlogEntryPage(getCMSContentModel(content_attr='content'),
     poster_image = models.ImageField(
         _("Thumbnail Image"), upload_to=upload_entry_image, blank=True,
         storage=POSTER_IMAGE_STORAGE)
+    # json list of the poster image renditions: name, width, height and
+    #   format of each(see set_poster_image)
+    poster_image_renditions = models.TextField(blank=True, editable=False)
     caption = models.CharField(
         _('caption'), max_length=70, blank=True, null=True)
     credit = models.CharField(
@@ -462,6 +636,9 @@ class BlogEntryPage(getCMSContentModel(content_attr='content'),
     authors = models.ManyToManyField(
         Author, verbose_name=_('Blog Entry Authors'),
         related_name='blog_entries')
+    # authors names as displayed by authors_display_name; kept in sync with
+    #   the authors by update_authors_display
+    authors_display = models.TextField(blank=True, null=True, editable=False)
 
     short_description = models.TextField(
         _('Short Description'), help_text=_("400 characters or fewer"),
@@ -476,6 +653,11 @@ class BlogEntryPage(getCMSContentModel(content_attr='content'),
         db_index=True, blank=True, null=True,
         help_text=_('End date of publication.'))
     is_published = models.BooleanField(_('is published'), blank=True)
+    # materialized publication state: is_published and the current time is
+    #   within the publication interval. Kept up to date on save and by the
+    #   blogger_publish_scheduled command for scheduled publications
+    is_live = models.BooleanField(
+        _('is live'), default=False, editable=False)
 
     seo_title = models.CharField(
         _('SEO Title'), blank=True, max_length=120)
@@ -505,10 +687,20 @@ class BlogEntryPage(getCMSContentModel(content_attr='content'),
             return False
         return True
 
+    def is_live_at(self, moment):
+        if not self.is_published:
+            return False
+        if self.start_publication and not self.start_publication < moment:
+            return False
+        if self.end_publication and self.end_publication < moment:
+            return False
+        return True
+
     @property
     def authors_display_name(self):
-        return ", ".join(('%s' % author
-                          for author in self.authors.all()))
+        if DENORMALIZED_AUTHORS_DISPLAY and self.authors_display is not None:
+            return self.authors_display
+        return join_authors(self.authors.all())
 
     def extra_html_before_content(self, request, context):
         if not self.blog:
@@ -558,50 +750,139 @@ class BlogEntryPage(getCMSContentModel(content_attr='content'),
         from django.template.context import RequestContext
         context = RequestContext(request)
         context.update({'entry': self, 'blog': self.blog, })
+        # staff users may edit the plugins from the page
+        if is_cacheable_request(request):
+            self.load_rendered_content(request, context)
         return LayoutResponse(
             self, layout, request, context=context).make_response()
 
-    def previous_post(self):
-        if not self.blog:
-            return None
-        query_for_prev = Q(
-            Q(Q(publication_date=self.publication_date) &
-              Q(slug__lt=self.slug)) |
-            Q(publication_date__lt=self.publication_date))
-        ordering = ('-publication_date', '-slug')
+    def _fetch_neighbours(self):
+        # both neighbours are fetched in one round trip
         siblings = self.blog.get_entries().exclude(id=self.id)
-        prev_post = siblings.filter(query_for_prev).order_by(*ordering)[:1]
-        return prev_post[0] if prev_post else None
+        same_date = Q(publication_date=self.publication_date)
+        previous_qs = siblings.filter(
+            Q(same_date & Q(slug__lt=self.slug)) |
+            Q(publication_date__lt=self.publication_date)
+        ).order_by('-publication_date', '-slug')[:1]
+        next_qs = siblings.filter(
+            Q(same_date & Q(slug__gt=self.slug)) |
+            Q(publication_date__gt=self.publication_date)
+        ).order_by('publication_date', 'slug')[:1]
+        previous_sql, previous_params = previous_qs.query.sql_with_params()
+        next_sql, next_params = next_qs.query.sql_with_params()
+        sql = ("SELECT previous_entry.*, 0 AS is_next "
+               "FROM (%s) previous_entry "
+               "UNION ALL "
+               "SELECT next_entry.*, 1 AS is_next "
+               "FROM (%s) next_entry" % (previous_sql, next_sql))
+        neighbours = [None, None]
+        for entry in BlogEntryPage.objects.raw(
+                sql, tuple(previous_params) + tuple(next_params)):
+            neighbours[entry.is_next] = entry
+        return neighbours
+
+    def _get_neighbours(self):
+        """
+        Returns the previous and the next published entries from the blog of
+            this entry. They are memoized on the instance and, if
+            NEIGHBOURS_CACHE_TIMEOUT is set, their ids are cached until
+            the entries of the blog change.
+        """
+        if '_neighbours' in self.__dict__:
+            return self._neighbours
+        if not self.blog:
+            return (None, None)
+
+        cache_key, neighbours = None, None
+        if NEIGHBOURS_CACHE_TIMEOUT:
+            cache_key = 'cms_blogger_neighbours_%s_%s' % (
+                self.pk, get_version('blog', self.blog_id))
+            neighbours_ids = cache.get(cache_key)
+            if neighbours_ids is not None:
+                entries = BlogEntryPage.objects.in_bulk(
+                    filter(None, neighbours_ids))
+                neighbours = [entries.get(pk) for pk in neighbours_ids]
+                if map(bool, neighbours) != map(bool, neighbours_ids):
+                    neighbours = None
+        if neighbours is None:
+            neighbours = self._fetch_neighbours()
+            if cache_key:
+                cache.set(cache_key, [entry.pk if entry else None
+                                      for entry in neighbours],
+                          NEIGHBOURS_CACHE_TIMEOUT)
+        for entry in filter(None, neighbours):
+            entry._blog_cache = self.blog
+        self._neighbours = tuple(neighbours)
+        return self._neighbours
+
+    def previous_post(self):
+        return self._get_neighbours()[0]
 
     def next_post(self):
-        if not self.blog:
-            return None
-        query_for_next = Q(
-            Q(Q(publication_date=self.publication_date) &
-              Q(slug__gt=self.slug)) |
-            Q(publication_date__gt=self.publication_date))
-        ordering = ('publication_date', 'slug')
-        siblings = self.blog.get_entries().exclude(id=self.id)
-        next_post = siblings.filter(query_for_next).order_by(*ordering)[:1]
-        return next_post[0] if next_post else None
+        return self._get_neighbours()[1]
+
+    def get_poster_image_files(self):
+        return poster_image_files(
+            self.poster_image.name, self.poster_image_renditions)
+
+    def get_poster_image_renditions(self):
+        return json.loads(self.poster_image_renditions or '[]')
+
+    def set_poster_image(self, poster_image, renditions=()):
+        """
+        Replaces the poster image and its renditions(see
+            utils.make_renditions). The renditions are saved right away;
+            the replaced files are deleted when the entry gets saved.
+        """
+        self._old_poster_image_files = self.get_poster_image_files()
+        storage = self.poster_image.storage
+        records = []
+        for width, height, image_format, content in renditions:
+            name = storage.save(
+                upload_entry_image(self, content.name), content)
+            records.append({'name': name, 'width': width, 'height': height,
+                            'format': image_format})
+        self.poster_image = poster_image
+        self.poster_image_renditions = json.dumps(records) if records else ''
+
+    def delete_poster_image(self):
+        self.set_poster_image(None)
+        self.save()
 
-    def delete(self, *args, **kwargs):
-        path = self.poster_image.name
-        super(BlogEntryPage, self).delete(*args, **kwargs)
-        if path:
-            self.poster_image.storage.delete(path)
+    @property
+    def poster_image_sources(self):
+        # (mime type, srcset) for each renditions format, preferred first
+        sources = SortedDict()
+        storage = self.poster_image.storage
+        for rendition in self.get_poster_image_renditions():
+            sources.setdefault(rendition['format'], []).append('%s %sw' % (
+                storage.url(rendition['name']), rendition['width']))
+        return [('image/%s' % image_format, ', '.join(srcset))
+                for image_format, srcset in sources.items()]
+
+    @property
+    def poster_image_sizes(self):
+        return POSTER_IMAGE_SIZES
 
     def save(self, *args, **kwargs):
+        self.is_live = self.is_live_at(timezone.now())
+        self.__dict__.pop('_neighbours', None)
+        save = super(BlogEntryPage, self).save
         if not self.slug and self.title:
             unique_qs = BlogEntryPage.objects.filter(
                 blog=self.blog_id, draft_id=None)
-            self.slug = get_unique_slug(self, self.title, unique_qs)
-        super(BlogEntryPage, self).save(*args, **kwargs)
-        # _old_poster_image attribute is available only when a new image
-        #   was uploaded for the poster image field. This attribute holds the
-        #   full file name for the file that's going to be replaced.
-        if getattr(self, '_old_poster_image', ''):
-            self.poster_image.storage.delete(self._old_poster_image)
+            make_slug = partial(get_unique_slug, self, self.title, unique_qs)
+            # the slug, blog and draft_id unique constraint doesn't apply to
+            #   saved entries(their draft_id is null); the blog gets locked
+            save_with_unique_slug(
+                self, partial(save, *args, **kwargs), make_slug,
+                lock=Blog.objects.filter(pk=self.blog_id))
+        else:
+            save(*args, **kwargs)
+        # _old_poster_image_files attribute is available only when the poster
+        #   image was replaced(see set_poster_image). It holds the names of
+        #   the replaced image and renditions files.
+        delete_files(self.__dict__.pop('_old_poster_image_files', []))
 
     class Meta:
         verbose_name = "blog entry"
@@ -612,6 +893,65 @@ class BlogEntryPage(getCMSContentModel(content_attr='content'),
         return "<Draft Empty Blog Entry>" if self.is_draft else self.title
 
 
+def upload_poster_image_job(instance, filename):
+    # raw uploads are kept apart from the resized poster images
+    return os.path.join(UPLOAD_TO_PREFIX, 'uploads', os.path.basename(
+        upload_entry_image(instance, filename)))
+
+
+class PosterImageJob(models.Model):
+    """
+    Uploaded poster image waiting to be resized and set on its entry by
+        cms_blogger.jobs.process_poster_image_job.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    entry = models.ForeignKey(BlogEntryPage, related_name='poster_image_jobs')
+    upload = models.FileField(
+        upload_to=upload_poster_image_job, max_length=255)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING,
+        db_index=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    modified_at = models.DateTimeField(auto_now=True)
+
+
+class OrphanFile(models.Model):
+    """
+    Poster image storage file waiting to be deleted(see
+        cms_blogger.files.delete_files).
+    """
+    name = models.CharField(max_length=255, db_index=True)
+    # failed deletions; the blogger_sweep_files command retries them
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class SearchTerm(models.Model):
+    """
+    Inverted index of the published entries used by the
+        cms_blogger.search.IndexSearchBackend: one row for each distinct
+        term from an entry's title and short description.
+    """
+    term = models.CharField(max_length=40)
+    entry = models.ForeignKey(BlogEntryPage, related_name='search_terms')
+    # title terms weigh more than the short description terms
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = (("term", "entry"),)
+
+
 @blog_page
 class BlogCategory(models.Model, BlogRelatedPage):
     blog_related_name = 'categories'
@@ -620,6 +960,8 @@ class BlogCategory(models.Model, BlogRelatedPage):
     slug = models.SlugField(_('slug'), max_length=30)
     entries = models.ManyToManyField(
         BlogEntryPage, related_name='categories')
+    published_entries_count = models.PositiveIntegerField(
+        default=0, editable=False)
 
     @models.permalink
     def get_absolute_url(self):
@@ -641,11 +983,18 @@ class BlogCategory(models.Model, BlogRelatedPage):
         return self.blog.get_layout_for(Blog.LANDING_PAGE)
 
     def save(self, *args, **kwargs):
+        _reload_published_entries_count(self)
+        save = super(BlogCategory, self).save
         if not self.slug and self.name and self.blog:
             unique_qs = BlogCategory.objects.filter(blog=self.blog)
-            self.slug = get_unique_slug(
-                self, self.name, unique_qs, keep_connection_words=False)
-        super(BlogCategory, self).save(*args, **kwargs)
+            make_slug = partial(
+                get_unique_slug, self, self.name, unique_qs,
+                keep_connection_words=False)
+            save_with_unique_slug(
+                self, partial(save, *args, **kwargs), make_slug,
+                lock=Blog.objects.filter(pk=self.blog_id))
+        else:
+            save(*args, **kwargs)
 
     def __unicode__(self):
         return self.name
@@ -680,6 +1029,54 @@ class RiverPlugin(CMSPlugin):
         return self.title
 
 
+def _update_counts(queryset, counts, field='published_entries_count'):
+    # one UPDATE for each distinct count value
+    ids_by_count = {}
+    for pk in queryset.values_list('pk', flat=True):
+        ids_by_count.setdefault(counts.get(pk, 0), []).append(pk)
+    for count, ids in ids_by_count.items():
+        queryset.model.objects.filter(pk__in=ids).update(**{field: count})
+
+
+def update_published_entries_count(blogs_ids=None):
+    """
+    Recomputes the published entries counters of the given blogs, of their
+        categories and of the home blogs from their sites. Recomputes all
+        counters if no blogs are given.
+    Counters are computed with aggregate queries so they can never drift
+        from what get_entries returns. It's used for batches(see
+        batch_updates), moves, scheduled publications and repairs; single
+        entry changes add or subtract one from the counters they affect.
+    """
+    blogs = Blog.objects.all()
+    if blogs_ids is not None:
+        blogs_ids = set(filter(None, blogs_ids))
+        if not blogs_ids:
+            return
+        blogs = blogs.filter(pk__in=blogs_ids)
+    home_blogs = HomeBlog.objects.filter(
+        site__in=blogs.values_list('site', flat=True).distinct())
+    if blogs_ids is None:
+        home_blogs = HomeBlog.objects.all()
+    categories = BlogCategory.objects.filter(blog__in=blogs)
+
+    live_entries = BlogEntryPage.objects.published().order_by()
+    _update_counts(blogs, dict(live_entries.filter(
+        blog__in=blogs).values_list('blog').annotate(Count('id'))))
+    # home blogs display the entries of all the blogs from their site
+    home_blogs_sites = dict(home_blogs.values_list('pk', 'site'))
+    sites_counts = dict(live_entries.filter(
+        blog__site__in=set(home_blogs_sites.values())
+    ).values_list('blog__site').annotate(Count('id')))
+    _update_counts(home_blogs, dict(
+        (pk, sites_counts.get(site_id, 0))
+        for pk, site_id in home_blogs_sites.items()))
+    # category entries from other blogs are not displayed on the category page
+    _update_counts(categories, dict(categories.filter(
+        entries__is_live=True, entries__blog=F('blog')
+    ).order_by().values_list('pk').annotate(Count('entries'))))
+
+
 @receiver(signals.post_save, sender=BlogEntryPage)
 def mark_draft(instance, **kwargs):
     is_new_entry = kwargs.get('created')
@@ -729,29 +1126,389 @@ def update_author_name(instance, **kwargs):
             pass
 
 
-@receiver(signals.pre_save, sender=BlogCategory)
-def category_update(instance, **kwargs):
-    current_time = timezone.now()
-    instance.blog.modified_at = current_time
-    instance.blog.save()
+# entries ids are sent in IN clauses; sqlite allows up to 999 parameters
+AUTHORS_DISPLAY_BATCH_SIZE = 500
+
+
+def update_authors_display(entries_ids):
+    """
+    Updates the authors_display column of the given entries with one UPDATE
+        for each distinct value; the authors and their users are loaded
+        with two queries for each batch of entries.
+    """
+    entries_ids = sorted(set(filter(None, entries_ids)))
+    blogs_ids = set()
+    for start in range(0, len(entries_ids), AUTHORS_DISPLAY_BATCH_SIZE):
+        batch = entries_ids[start:start + AUTHORS_DISPLAY_BATCH_SIZE]
+        entries = BlogEntryPage.objects.filter(id__in=batch).only(
+            'id', 'blog').prefetch_related('authors__user')
+        ids_by_display = {}
+        for entry in entries:
+            blogs_ids.add(entry.blog_id)
+            ids_by_display.setdefault(
+                join_authors(entry.authors.all()), []).append(entry.pk)
+        for display, ids in ids_by_display.items():
+            BlogEntryPage.objects.filter(id__in=ids).update(
+                authors_display=display)
+    # the authors names are displayed on the blogs pages and on the entries
+    #   summaries, which are cached by their modified_at
+    batched(invalidate_blogs_caches, blogs_ids)
+    batched(invalidate_entries_summaries, blogs_ids)
+
+
+def invalidate_entries_summaries(blogs_ids):
+    # drops the cached entries summaries of the given blogs(see the
+    #   entries_summaries template tag)
+    bump_version('summaries', *filter(None, blogs_ids))
+
+
+@receiver(signals.m2m_changed, sender=BlogEntryPage.authors.through)
+def entry_authors_display_update(instance, action, reverse, pk_set,
+                                 **kwargs):
+    if reverse and action == 'pre_clear':
+        # the ids of the entries that lose the author are not sent on clear
+        instance._cleared_entries_ids = list(
+            instance.blog_entries.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        entries_ids = [instance.pk]
+    elif action == 'post_clear':
+        entries_ids = getattr(instance, '_cleared_entries_ids', [])
+    else:
+        entries_ids = pk_set
+    batched(update_authors_display, entries_ids)
+
+
+@receiver(signals.post_save, sender=Author)
+def author_display_update(instance, created, **kwargs):
+    if not created:
+        batched(update_authors_display, instance.blog_entries.values_list(
+            'id', flat=True))
+
+
+@receiver(signals.pre_delete, sender=Author)
+def fetch_author_entries(instance, **kwargs):
+    instance._entries_ids = list(
+        instance.blog_entries.values_list('id', flat=True))
+
+
+@receiver(signals.post_delete, sender=Author)
+def deleted_author_display_update(instance, **kwargs):
+    batched(update_authors_display, getattr(instance, '_entries_ids', []))
+
+
+@receiver(signals.pre_save, sender=User)
+def fetch_user_display_name(instance, **kwargs):
+    # users get saved on each login; only the saves that change the name
+    #   they're displayed with need to update the entries
+    if not DENORMALIZED_AUTHORS_DISPLAY or not instance.pk:
+        return
+    for user in User.objects.filter(pk=instance.pk).only(
+            'first_name', 'last_name', 'email', 'username'):
+        instance._old_display_name = user_display_name(user)
+
+
+@receiver(signals.post_save, sender=User)
+def user_authors_display_update(instance, created, **kwargs):
+    # authors without a name are displayed with their user's name
+    old_display_name = instance.__dict__.pop('_old_display_name', None)
+    if created or old_display_name in (None, user_display_name(instance)):
+        return
+    batched(update_authors_display, BlogEntryPage.objects.filter(
+        authors__user=instance, authors__name='').values_list(
+        'id', flat=True))
+
+
+def update_search_index(entries_ids=None):
+    # the search backend is imported here since it depends on the models
+    from .search import get_search_backend
+    get_search_backend().update(entries_ids)
+
+
+@receiver(signals.post_save, sender=BlogEntryPage)
+def entry_search_index_update(instance, **kwargs):
+    batched(update_search_index, [instance.pk])
+
+
+@receiver(publication_changed)
+def publication_search_index_update(entries_ids, **kwargs):
+    # only published entries are searchable
+    batched(update_search_index, entries_ids)
+
+
+def touch_blogs(blogs_ids):
+    """
+    Updates modified_at of the given blogs and of the super landing pages
+        of their sites. Used for changes that don't go through the models
+        save(queryset updates, m2m changes).
+    """
+    blogs_ids = set(filter(None, blogs_ids))
+    if not blogs_ids:
+        return
+    now = timezone.now()
+    blogs = Blog.objects.filter(pk__in=blogs_ids)
+    HomeBlog.objects.filter(
+        site__in=blogs.values_list('site', flat=True).distinct()
+    ).update(modified_at=now)
+    blogs.update(modified_at=now)
+
+
+def invalidate_sites_menus(sites_ids):
+    """
+    Drops the cached menus of the given sites(see menu.py). All the blog
+        pages from those sites display the menu so all their blogs and
+        super landing pages get touched.
+    """
+    sites_ids = set(filter(None, sites_ids))
+    if not sites_ids:
+        return
+    now = timezone.now()
+    for model in (Blog, HomeBlog):
+        model.objects.filter(site__in=sites_ids).update(modified_at=now)
+    bump_version('menu', *sites_ids)
+
+
+@receiver(signals.post_save, sender=BlogEntryPage)
+@receiver(signals.post_delete, sender=BlogEntryPage)
+@receiver(signals.post_save, sender=BlogCategory)
+@receiver(signals.post_delete, sender=BlogCategory)
+def blog_content_touch(instance, **kwargs):
+    # blogs get touched once per batch_updates block instead of being saved
+    #   for each entry/category change
+    batched(touch_blogs, [instance.blog_id])
+
+
+@receiver(signals.post_delete, sender=BlogEntryPage)
+def entry_files_delete(instance, **kwargs):
+    # queryset deletes and blog cascades send it for each entry; the files
+    #   of all the entries get deleted together, after the batch_updates block
+    delete_files(instance.get_poster_image_files())
+
+
+@receiver(signals.pre_delete, sender=PosterImageJob)
+def job_upload_delete(instance, **kwargs):
+    # jobs of deleted entries; the uploads of the finished jobs are already
+    #   deleted
+    if instance.upload:
+        batched(delete_uploads, [instance.upload.name])
+
+
+def _change_counts(queryset, delta):
+    if delta:
+        queryset.update(
+            published_entries_count=F('published_entries_count') + delta)
+
+
+def _change_categories_counts(categories_ids, delta):
+    # categories_ids has a category id for each counted entry; one UPDATE
+    #   for each distinct number of entries
+    ids_by_count = {}
+    for category_id, count in Counter(categories_ids).items():
+        ids_by_count.setdefault(count, []).append(category_id)
+    for count, ids in ids_by_count.items():
+        _change_counts(BlogCategory.objects.filter(pk__in=ids), delta * count)
+
+
+def _change_entry_counts(entry_id, blog_id, delta, categories_ids=None):
+    # adds delta to the counters the entry is counted by: its blog's, its
+    #   site's home blogs' and its categories' from the same blog
+    blog = Blog.objects.filter(pk=blog_id)
+    _change_counts(blog, delta)
+    _change_counts(HomeBlog.objects.filter(
+        site__in=list(blog.values_list('site', flat=True))), delta)
+    if categories_ids is None:
+        categories_ids = BlogCategory.objects.filter(
+            blog=blog_id, entries=entry_id).values_list('id', flat=True)
+    _change_categories_counts(categories_ids, delta)
+
+
+def _counted_blog_id(entry_id):
+    # the blog that counts the entry, if it's published
+    for blog_id, is_live in BlogEntryPage.objects.filter(
+            pk=entry_id).values_list('blog', 'is_live'):
+        return blog_id if is_live else None
 
 
 @receiver(signals.pre_save, sender=BlogEntryPage)
-def entry_update(instance, **kwargs):
-    current_time = timezone.now()
-    instance.blog.modified_at = current_time
-    instance.blog.save()
+def fetch_entry_counted_blog(instance, **kwargs):
+    if instance.pk:
+        instance._counted_blog_id = _counted_blog_id(instance.pk)
 
 
-@receiver(signals.pre_delete, sender=BlogCategory)
-def category_update(instance, **kwargs):
-    current_time = timezone.now()
-    instance.blog.modified_at = current_time
-    instance.blog.save()
+@receiver(signals.post_save, sender=BlogEntryPage)
+def entry_count_update(instance, **kwargs):
+    old_blog_id = instance.__dict__.pop('_counted_blog_id', None)
+    new_blog_id = instance.blog_id if instance.is_live else None
+    if old_blog_id == new_blog_id:
+        return
+    if is_batching():
+        batched(update_published_entries_count, [old_blog_id, new_blog_id])
+        return
+    if old_blog_id:
+        _change_entry_counts(instance.pk, old_blog_id, -1)
+    if new_blog_id:
+        _change_entry_counts(instance.pk, new_blog_id, 1)
 
 
 @receiver(signals.pre_delete, sender=BlogEntryPage)
-def entry_update(instance, **kwargs):
-    current_time = timezone.now()
-    instance.blog.modified_at = current_time
-    instance.blog.save()
+def fetch_entry_counted_categories(instance, **kwargs):
+    # the entry categories are removed before the post_delete
+    blog_id = _counted_blog_id(instance.pk)
+    if blog_id and not is_batching():
+        instance._counted_categories = (blog_id, list(
+            BlogCategory.objects.filter(
+                blog=blog_id, entries=instance.pk).values_list(
+                'id', flat=True)))
+
+
+@receiver(signals.post_delete, sender=BlogEntryPage)
+def deleted_entry_count_update(instance, **kwargs):
+    if is_batching():
+        batched(update_published_entries_count, [instance.blog_id])
+        return
+    counted = instance.__dict__.pop('_counted_categories', None)
+    if counted:
+        blog_id, categories_ids = counted
+        _change_entry_counts(instance.pk, blog_id, -1, categories_ids)
+
+
+def _counted_categories_ids(instance, reverse, pk_set):
+    # a category id for each of the category-entry links that are counted
+    #   (published entries from the same blog as the category)
+    links = BlogCategory.entries.through.objects.filter(
+        blogentrypage__is_live=True,
+        blogentrypage__blog=F('blogcategory__blog'))
+    if reverse:
+        links = links.filter(blogentrypage=instance.pk)
+        if pk_set is not None:
+            links = links.filter(blogcategory__in=pk_set)
+    else:
+        links = links.filter(blogcategory=instance.pk)
+        if pk_set is not None:
+            links = links.filter(blogentrypage__in=pk_set)
+    return list(links.values_list('blogcategory', flat=True))
+
+
+@receiver(signals.m2m_changed, sender=BlogCategory.entries.through)
+def category_entries_count_update(instance, action, reverse, pk_set,
+                                  **kwargs):
+    if is_batching():
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            # both the entries and the categories hold a reference to the
+            #   blog
+            batched(update_published_entries_count, [instance.blog_id])
+        return
+    if action in ('pre_remove', 'pre_clear'):
+        # the removed ids might not be linked
+        instance._counted_categories_ids = _counted_categories_ids(
+            instance, reverse, pk_set)
+    elif action == 'post_add':
+        # only the newly linked ids are sent
+        _change_categories_counts(
+            _counted_categories_ids(instance, reverse, pk_set), 1)
+    elif action in ('post_remove', 'post_clear'):
+        _change_categories_counts(instance.__dict__.pop(
+            '_counted_categories_ids', []), -1)
+
+
+@receiver(publication_changed)
+def publication_count_update(blogs_ids, **kwargs):
+    update_published_entries_count(blogs_ids)
+
+
+def invalidate_blogs_caches(blogs_ids):
+    """
+    Bumps the cache versions of the given blogs and of their sites which
+        invalidates their cached pages and entries neighbours.
+    """
+    blogs_ids = set(filter(None, blogs_ids))
+    if not blogs_ids:
+        return
+    sites_ids = Blog.objects.filter(
+        pk__in=blogs_ids).values_list('site', flat=True).distinct()
+    bump_version('blog', *blogs_ids)
+    bump_version('site', *sites_ids)
+
+
+@receiver(signals.post_save, sender=BlogEntryPage)
+@receiver(signals.post_delete, sender=BlogEntryPage)
+@receiver(signals.post_save, sender=BlogCategory)
+@receiver(signals.post_delete, sender=BlogCategory)
+def blog_content_caches_update(instance, **kwargs):
+    batched(invalidate_blogs_caches, [instance.blog_id])
+
+
+@receiver(signals.m2m_changed, sender=BlogCategory.entries.through)
+def category_entries_caches_update(instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        batched(touch_blogs, [instance.blog_id])
+        batched(invalidate_blogs_caches, [instance.blog_id])
+
+
+def invalidate_blogs_layouts(blogs_ids):
+    """
+    Drops the cached resolved layouts of the given blogs(see
+        Blog.get_layout_for) and their cached pages.
+    """
+    blogs_ids = set(filter(None, blogs_ids))
+    if not blogs_ids:
+        return
+    bump_version('layouts', *blogs_ids)
+    # layouts are displayed by all the blog pages
+    touch_blogs(blogs_ids)
+    invalidate_blogs_caches(blogs_ids)
+
+
+@receiver(signals.post_save, sender=Layout)
+@receiver(signals.post_delete, sender=Layout)
+def blog_layouts_update(instance, **kwargs):
+    blog_type = ContentType.objects.get_for_model(Blog)
+    if instance.content_type_id == blog_type.pk:
+        batched(invalidate_blogs_layouts, [instance.object_id])
+
+
+@receiver(signals.post_save, sender=Page)
+def layout_page_update(instance, **kwargs):
+    # cached layouts hold their from_page
+    batched(invalidate_blogs_layouts, Layout.objects.filter(
+        from_page=instance,
+        content_type=ContentType.objects.get_for_model(Blog),
+    ).values_list('object_id', flat=True))
+
+
+@receiver(publication_changed)
+def publication_caches_update(blogs_ids, **kwargs):
+    touch_blogs(blogs_ids)
+    invalidate_blogs_caches(blogs_ids)
+
+
+@receiver(signals.post_save, sender=Blog)
+@receiver(signals.post_delete, sender=Blog)
+def blog_caches_update(instance, **kwargs):
+    # Blog.modified_at changed; the blog might be displayed by the menus of
+    #   the other blogs
+    invalidate_sites_menus([instance.site_id])
+    bump_version('blog', instance.pk)
+    bump_version('site', instance.site_id)
+    # the blog settings and slug are used by its entries summaries
+    bump_version('summaries', instance.pk)
+    cache.delete(blog_id_cache_key(instance.site_id, instance.slug))
+
+
+@receiver(signals.post_save, sender=HomeBlog)
+@receiver(signals.post_delete, sender=HomeBlog)
+def home_blog_caches_update(instance, **kwargs):
+    bump_version('site', instance.site_id)
+    invalidate_sites_menus([instance.site_id])
+
+
+@receiver(signals.post_save, sender=BlogNavigationNode)
+@receiver(signals.pre_delete, sender=BlogNavigationNode)
+def navigation_node_caches_update(instance, **kwargs):
+    # pre_delete since the blogs get detached from the node when it's deleted
+    sites_ids = set()
+    for model in (Blog, HomeBlog):
+        sites_ids.update(model.objects.filter(
+            navigation_node=instance).values_list('site', flat=True))
+    invalidate_sites_menus(sites_ids)
@@ -0,0 +1,138 @@
+from django.db import connection, transaction
+from .batch import batch_updates
+from .models import BlogCategory, BlogEntryPage
+from .settings import MOVE_ENTRIES_CHUNK_SIZE
+from .signals import publication_changed
+from .slug import allocate_unique_slugs
+from collections import defaultdict
+
+
+EntryCategories = BlogCategory.entries.through
+
+
+# each slug update takes 3 query parameters; sqlite allows up to 999
+SLUGS_UPDATE_BATCH_SIZE = 300
+
+
+def _update_slugs(slugs):
+    # one UPDATE for each batch of entries; CASE is used since django 1.4
+    #   has no support for conditional updates
+    qn = connection.ops.quote_name
+    entries_ids = sorted(slugs.keys())
+    for start in range(0, len(entries_ids), SLUGS_UPDATE_BATCH_SIZE):
+        batch = entries_ids[start:start + SLUGS_UPDATE_BATCH_SIZE]
+        params = []
+        for entry_id in batch:
+            params.extend([entry_id, slugs[entry_id]])
+        sql = 'UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)' % (
+            qn(BlogEntryPage._meta.db_table), qn('slug'), qn('id'),
+            ' '.join(['WHEN %s THEN %s'] * len(batch)), qn('id'),
+            ', '.join(['%s'] * len(batch)))
+        connection.cursor().execute(sql, params + batch)
+        transaction.set_dirty()
+
+
+def _mirror_categories(destination_blog, names):
+    existing = destination_blog.categories.values_list('name', 'slug')
+    missing = sorted(set(filter(None, names)) - set(
+        name for name, slug in existing))
+    if not missing:
+        return
+    slugs = allocate_unique_slugs(
+        missing, BlogCategory._meta.get_field('slug').max_length,
+        (slug for name, slug in existing), keep_connection_words=False)
+    BlogCategory.objects.bulk_create([
+        BlogCategory(name=name, slug=slug, blog=destination_blog)
+        for name, slug in zip(missing, slugs)])
+
+
+def _move_chunk(destination_blog, entries_ids, used_slugs,
+                mirror_categories):
+    entries = BlogEntryPage.objects.filter(id__in=entries_ids)
+    source_blogs_ids = set(entries.values_list('blog', flat=True))
+    entries_categories = list(EntryCategories.objects.filter(
+        blogentrypage__in=entries_ids).values_list(
+        'blogentrypage', 'blogcategory', 'blogcategory__name'))
+    if mirror_categories:
+        _mirror_categories(
+            destination_blog, (name for _, _, name in entries_categories))
+
+    entries.update(blog=destination_blog)
+
+    # saved entries(which are not drafts) get new slugs generated from
+    #   their titles to make sure they are unique in the destination blog
+    saved_entries = [
+        (entry_id, title, slug)
+        for entry_id, title, slug in entries.filter(draft_id=None).order_by(
+            'id').values_list('id', 'title', 'slug')
+        if title]
+    if saved_entries:
+        ids, titles, old_slugs = zip(*saved_entries)
+        new_slugs = allocate_unique_slugs(
+            titles, BlogEntryPage._meta.get_field('slug').max_length,
+            used_slugs)
+        used_slugs.update(new_slugs)
+        _update_slugs(dict(
+            (entry_id, slug)
+            for entry_id, slug, old_slug in zip(ids, new_slugs, old_slugs)
+            if slug != old_slug))
+
+    # entries keep the categories from the destination blog that have the
+    #   same names as their previous categories
+    destination_categories = defaultdict(list)
+    for category_id, name in destination_blog.categories.filter(
+            name__in=set(name for _, _, name in entries_categories)
+    ).values_list('id', 'name'):
+        destination_categories[name].append(category_id)
+    EntryCategories.objects.filter(blogentrypage__in=entries_ids).delete()
+    links = set()
+    for entry_id, _, name in entries_categories:
+        for category_id in destination_categories[name]:
+            links.add((entry_id, category_id))
+    EntryCategories.objects.bulk_create([
+        EntryCategories(blogentrypage_id=entry_id, blogcategory_id=category_id)
+        for entry_id, category_id in sorted(links)])
+
+    BlogCategory.objects.filter(
+        id__in=set(category_id for _, category_id, _ in entries_categories),
+        entries=None
+    ).delete()
+    return source_blogs_ids
+
+
+def move_entries(destination_blog, entries_ids, mirror_categories=True,
+                 chunk_size=None, progress=None):
+    """
+    Moves the entries to the destination blog with a fixed number of queries
+        for each chunk of chunk_size(defaults to MOVE_ENTRIES_CHUNK_SIZE)
+        entries. Each chunk is moved in its own transaction.
+    Entries are not saved one by one: slugs are generated in memory,
+        categories are mapped with one bulk insert and the blogs counters,
+        modification dates and caches get updated once, at the end.
+    progress(moved_count, total_count) is called after each chunk.
+    """
+    entries_ids = sorted(set(map(int, entries_ids)))
+    chunk_size = chunk_size or MOVE_ENTRIES_CHUNK_SIZE
+    moving = set(entries_ids)
+    used_slugs = set(
+        slug for entry_id, slug in destination_blog.blogentrypage_set.filter(
+            draft_id=None).values_list('id', 'slug')
+        if entry_id not in moving)
+    moved_ids, blogs_ids = [], set([destination_blog.pk])
+    try:
+        for start in range(0, len(entries_ids), chunk_size):
+            chunk = entries_ids[start:start + chunk_size]
+            with batch_updates(), transaction.commit_on_success():
+                blogs_ids.update(_move_chunk(
+                    destination_blog, chunk, used_slugs, mirror_categories))
+            moved_ids.extend(chunk)
+            if progress:
+                progress(len(moved_ids), len(entries_ids))
+    finally:
+        # the entries were moved with queryset updates; let the blogs
+        #   counters and caches know that they changed
+        if moved_ids:
+            publication_changed.send(
+                sender=BlogEntryPage, entries_ids=moved_ids,
+                blogs_ids=blogs_ids)
+    return moved_ids
@@ -0,0 +1,182 @@
+"""
+Blog entries search backends. The backend used by the blog pages is set
+    with the BLOGGER_SEARCH_BACKEND setting:
+
+    * ContainsSearchBackend(default) matches the query terms anywhere in
+        the title or the short description; no index is needed but it
+        scans all entries.
+    * IndexSearchBackend looks up the query terms in the SearchTerm
+        inverted index and ranks the entries by the weight of the matched
+        terms. Only whole words of at least TERM_MIN_LENGTH characters
+        are matched.
+    * PostgresSearchBackend uses the postgresql full text search.
+
+After switching to a backend that uses an index run the
+    blogger_rebuild_search_index command.
+"""
+from django.db import connection
+from django.db.models import Q, Count, Sum
+from django.utils.importlib import import_module
+from .models import BlogEntryPage, SearchTerm
+from .settings import SEARCH_BACKEND, SEARCH_MAX_RESULTS, SEARCH_TEXT_CONFIG
+import re
+
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+TERM_MIN_LENGTH = 2
+TITLE_WEIGHT = 3
+# entries ids are sent in IN clauses; sqlite allows up to 999 parameters
+INDEX_BATCH_SIZE = 500
+
+
+def get_terms(query_string):
+    query_string = query_string.strip()
+    # remove quotes
+    query_string = re.sub('\'|\"', '', query_string)
+    # strip multiple spaces
+    query_string = re.sub('\s{2,}', ' ', query_string)
+    return query_string.split()
+
+
+def get_query(query_string, search_fields):
+    terms = get_terms(query_string)
+    query = Q()
+    for term in terms:
+        term_query = Q()
+        for field_name in search_fields:
+            term_query |= Q(**{"%s__icontains" % field_name: term})
+        query &= term_query
+    return query
+
+
+def tokenize(text):
+    max_length = SearchTerm._meta.get_field('term').max_length
+    return [term[:max_length]
+            for term in TERM_RE.findall((text or u'').lower())
+            if len(term) >= TERM_MIN_LENGTH]
+
+
+def index_terms(title, short_description):
+    """
+    Returns the weight of each term of an entry: the number of
+        occurrences, title occurrences counted TITLE_WEIGHT times.
+    """
+    weights = {}
+    for text, weight in ((title, TITLE_WEIGHT), (short_description, 1)):
+        for term in tokenize(text):
+            weights[term] = weights.get(term, 0) + weight
+    return weights
+
+
+class SearchBackend(object):
+
+    def search(self, entries, query_string):
+        """
+        Returns the ids of the entries from the given queryset that match
+            the query string, best matches first.
+        """
+        raise NotImplementedError
+
+    def update(self, entries_ids=None):
+        """
+        Called with the ids of the entries that were saved or had their
+            publication state changed; with None for all entries.
+        """
+        pass
+
+
+class ContainsSearchBackend(SearchBackend):
+    # each query term must be found in one of the search fields; results
+    #   come in the entries queryset ordering
+    search_fields = ('title', 'short_description')
+
+    def search(self, entries, query_string):
+        if not get_terms(query_string):
+            return []
+        matches = entries.filter(get_query(query_string, self.search_fields))
+        return list(matches.values_list('id', flat=True)[:SEARCH_MAX_RESULTS])
+
+
+class IndexSearchBackend(SearchBackend):
+    """
+    Entries must contain all query terms; they are ranked by the sum of
+        the matched terms weights. Terms are whole words so the lookups use
+        the (term, entry) index of the SearchTerm table.
+    """
+
+    def search(self, entries, query_string):
+        terms = set(tokenize(query_string))
+        if not terms:
+            return []
+        matches = SearchTerm.objects.filter(
+            term__in=terms, entry__in=entries.order_by().values('pk')
+        ).values('entry').annotate(
+            rank=Sum('weight'), matched=Count('id')
+        ).filter(matched=len(terms)).order_by('-rank', '-entry')
+        return [row['entry'] for row in matches[:SEARCH_MAX_RESULTS]]
+
+    def _index(self, entries_ids):
+        rows = []
+        entries = BlogEntryPage.objects.published().filter(id__in=entries_ids)
+        for entry_id, title, short_description in entries.values_list(
+                'id', 'title', 'short_description'):
+            weights = index_terms(title, short_description)
+            rows.extend(
+                SearchTerm(entry_id=entry_id, term=term, weight=weight)
+                for term, weight in sorted(weights.items()))
+        SearchTerm.objects.bulk_create(rows)
+
+    def update(self, entries_ids=None):
+        rebuild = entries_ids is None
+        if rebuild:
+            SearchTerm.objects.all().delete()
+            entries_ids = BlogEntryPage.objects.published().values_list(
+                'id', flat=True)
+        entries_ids = sorted(set(filter(None, entries_ids)))
+        for start in range(0, len(entries_ids), INDEX_BATCH_SIZE):
+            batch = entries_ids[start:start + INDEX_BATCH_SIZE]
+            if not rebuild:
+                SearchTerm.objects.filter(entry__in=batch).delete()
+            self._index(batch)
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Ranked postgresql full text search. The cms_blogger migrations create
+        the gin index on the document expression for the
+        BLOGGER_SEARCH_TEXT_CONFIG configuration.
+    """
+
+    def _document(self):
+        table = connection.ops.quote_name(BlogEntryPage._meta.db_table)
+        # the configuration is not a query parameter in order to match the
+        #   indexed expression
+        return ("to_tsvector('%s', %s.%s || ' ' || %s.%s)" % (
+            SEARCH_TEXT_CONFIG, table, connection.ops.quote_name('title'),
+            table, connection.ops.quote_name('short_description')))
+
+    def search(self, entries, query_string):
+        query_string = ' '.join(get_terms(query_string))
+        if not query_string:
+            return []
+        document = self._document()
+        tsquery = "plainto_tsquery('%s', %%s)" % SEARCH_TEXT_CONFIG
+        matches = entries.extra(
+            select={'rank': 'ts_rank(%s, %s)' % (document, tsquery)},
+            select_params=[query_string],
+            where=['%s @@ %s' % (document, tsquery)],
+            params=[query_string],
+        ).order_by('-rank', '-publication_date')
+        return [entry_id for entry_id, rank in matches.values_list(
+            'id', 'rank')[:SEARCH_MAX_RESULTS]]
+
+
+_backends = {}
+
+
+def get_search_backend(path=None):
+    path = path or SEARCH_BACKEND
+    if path not in _backends:
+        module_name, class_name = path.rsplit('.', 1)
+        _backends[path] = getattr(import_module(module_name), class_name)()
+    return _backends[path]
@@ -40,6 +40,36 @@ POSTER_IMAGE_WIDTH = getattr(
 POSTER_IMAGE_ASPECT_RATIO = getattr(
     settings, 'BLOGGER_POSTER_IMAGE_ASPECT_RATIO', 16.0 / 9.0)
 
+# uploaded images with more pixels are refused before being decoded
+POSTER_IMAGE_MAX_PIXELS = getattr(
+    settings, 'BLOGGER_POSTER_IMAGE_MAX_PIXELS', 50 * 1000 * 1000)
+
+# maximum number of bytes resizing an uploaded image may take(see
+#   utils.image_memory_usage); large jpegs are decoded at a reduced scale
+#   so they don't need much more than their thumbnails. The default fits
+#   any image under POSTER_IMAGE_MAX_PIXELS.
+POSTER_IMAGE_MEMORY_BUDGET = getattr(
+    settings, 'BLOGGER_POSTER_IMAGE_MEMORY_BUDGET', 256 * 1024 * 1024)
+
+# widths of the poster image renditions offered to the browsers in srcset;
+#   images are never upscaled
+POSTER_IMAGE_RENDITION_WIDTHS = getattr(
+    settings, 'BLOGGER_POSTER_IMAGE_RENDITION_WIDTHS', (320, 640, 1280))
+
+# formats of the poster image renditions, preferred ones first. Formats
+#   not supported by PIL are skipped; jpeg is replaced by png for images
+#   with transparency
+POSTER_IMAGE_RENDITION_FORMATS = getattr(
+    settings, 'BLOGGER_POSTER_IMAGE_RENDITION_FORMATS', ('webp', 'jpeg'))
+
+# sizes attribute of the poster images; the river plugin displays smaller
+#   thumbnails(see RIVER_POSTER_IMAGE_SIZES)
+POSTER_IMAGE_SIZES = getattr(
+    settings, 'BLOGGER_POSTER_IMAGE_SIZES', '(max-width: 640px) 100vw, 640px')
+
+RIVER_POSTER_IMAGE_SIZES = getattr(
+    settings, 'BLOGGER_RIVER_POSTER_IMAGE_SIZES', '300px')
+
 POSTS_ON_LANDING_PAGE = getattr(
     settings, 'BLOGGER_POSTS_ON_LANDING_PAGE', 15)
 
@@ -53,3 +83,86 @@ ALLOWED_SITES_FOR_USER = getattr(
 
 BLOGS_URL_PREFIX = getattr(
     settings, 'BLOGGER_BLOGS_URL_PREFIX', 'blogs')
+
+# paginate blog entries with a seek(cursor) based paginator instead of the
+#   OFFSET based django paginator
+KEYSET_PAGINATION = getattr(
+    settings, 'BLOGGER_KEYSET_PAGINATION', True)
+
+# number of seconds the approximate count used for page numbers is cached
+PAGINATION_COUNT_CACHE_TIMEOUT = getattr(
+    settings, 'BLOGGER_PAGINATION_COUNT_CACHE_TIMEOUT', 5 * 60)
+
+# number of seconds the ids of an entry's previous/next entries are cached;
+#   0 disables the cache
+NEIGHBOURS_CACHE_TIMEOUT = getattr(
+    settings, 'BLOGGER_NEIGHBOURS_CACHE_TIMEOUT', 0)
+
+# number of seconds blog pages are cached for anonymous users; 0 disables
+#   the page cache
+PAGE_CACHE_TIMEOUT = getattr(
+    settings, 'BLOGGER_PAGE_CACHE_TIMEOUT', 0)
+
+# number of seconds an expired/invalidated page can still be served while
+#   another request renders its fresh version
+PAGE_CACHE_STALE_TIMEOUT = getattr(
+    settings, 'BLOGGER_PAGE_CACHE_STALE_TIMEOUT', 60)
+
+# number of seconds rss feeds are cached; feeds get invalidated along with
+#   the blog pages
+FEED_CACHE_TIMEOUT = getattr(
+    settings, 'BLOGGER_FEED_CACHE_TIMEOUT', PAGE_CACHE_TIMEOUT)
+
+# number of entries moved to another blog in one transaction
+MOVE_ENTRIES_CHUNK_SIZE = getattr(
+    settings, 'BLOGGER_MOVE_ENTRIES_CHUNK_SIZE', 500)
+
+# use the denormalized BlogEntryPage.authors_display column for the entries
+#   authors names instead of loading the authors and their users. Users
+#   names changes are not tracked while it's off; run the
+#   blogger_rebuild_authors_display command after turning it on.
+DENORMALIZED_AUTHORS_DISPLAY = getattr(
+    settings, 'BLOGGER_DENORMALIZED_AUTHORS_DISPLAY', False)
+
+# dotted path to the search backend class used by the blogs search; see
+#   cms_blogger.search for the available backends. The default matches the
+#   query terms anywhere in the entries; the indexed backends match whole
+#   words only.
+SEARCH_BACKEND = getattr(
+    settings, 'BLOGGER_SEARCH_BACKEND',
+    'cms_blogger.search.ContainsSearchBackend')
+
+# maximum number of entries returned by a blog search
+SEARCH_MAX_RESULTS = getattr(
+    settings, 'BLOGGER_SEARCH_MAX_RESULTS', 1000)
+
+# postgresql text search configuration used by the PostgresSearchBackend;
+#   the migrations index the entries for the 'english' configuration
+SEARCH_TEXT_CONFIG = getattr(
+    settings, 'BLOGGER_SEARCH_TEXT_CONFIG', 'english')
+
+# resize the uploaded poster images in the blogger_process_images worker
+#   instead of the upload request; uploads are stored in the default
+#   storage until they get processed
+ASYNC_POSTER_IMAGES = getattr(
+    settings, 'BLOGGER_ASYNC_POSTER_IMAGES', False)
+
+# number of resolved blog layouts kept in the memory of each process; they
+#   are cached in the shared cache as well
+LAYOUTS_CACHE_SIZE = getattr(
+    settings, 'BLOGGER_LAYOUTS_CACHE_SIZE', 1000)
+
+# number of seconds the rendered entries summaries of the blogs listings are
+#   cached; 0 disables the cache
+ENTRY_SUMMARY_CACHE_TIMEOUT = getattr(
+    settings, 'BLOGGER_ENTRY_SUMMARY_CACHE_TIMEOUT', 0)
+
+# number of seconds the entries content placeholders are cached with their
+#   nested plugins already rendered; 0 disables the cache
+RENDERED_CONTENT_CACHE_TIMEOUT = getattr(
+    settings, 'BLOGGER_RENDERED_CONTENT_CACHE_TIMEOUT', 0)
+
+# record the queries, database time, template render time and cache hits of
+#   the blogger views and plugins; see cms_blogger.instrumentation
+INSTRUMENTATION = getattr(
+    settings, 'BLOGGER_INSTRUMENTATION', False)
@@ -0,0 +1,11 @@
+from django.dispatch import Signal
+
+
+# sent whenever entries become visible or hidden on the site without going
+#   through the model save(scheduled publication, admin bulk actions, moving
+#   entries to another blog)
+publication_changed = Signal(providing_args=["entries_ids", "blogs_ids"])
+
+# sent after each call of an instrumented view or plugin(see
+#   cms_blogger.instrumentation) with the name of the view and its metrics
+instrumented = Signal(providing_args=["name", "stats"])
@@ -1,41 +1,186 @@
 # -*- coding: utf-8 -*-
 from django.contrib.sitemaps import Sitemap
 from django.contrib.sites.models import Site
-from django.core import paginator
-from django.db.models import Q
+from django.core.urlresolvers import reverse
 from cms_blogger.models import (
     BlogEntryPage,
     BlogCategory,
-    BioPage,
     Blog,
     HomeBlog,
 )
-import itertools
-import datetime
+from cms_blogger.instrumentation import instrument
 
 
-class BloggerSitemap(Sitemap):
+def home_blog_url(row):
+    return reverse('cms_blogger.views.landing_page')
+
+
+def blog_url(row):
+    return reverse('cms_blogger.views.landing_page', kwargs={
+        'blog_slug': row['slug']})
+
+
+def entry_url(row, blog_slug=None, with_date=None):
+    # same as BlogEntryPage.get_absolute_url without loading the blog
+    blog_slug = blog_slug or row['blog__slug']
+    if with_date is None:
+        with_date = row['blog__entries_slugs_with_date']
+    if with_date:
+        return reverse('cms_blogger.views.entry_page', kwargs={
+            'blog_slug': blog_slug,
+            'year': row['publication_date'].year,
+            'month': row['publication_date'].strftime('%m'),
+            'day': row['publication_date'].strftime('%d'),
+            'entry_slug': row['slug']})
+    return reverse('cms_blogger.views.entry_or_bio_page', kwargs={
+        'blog_slug': blog_slug, 'slug': row['slug']})
+
+
+def category_url(row, blog_slug=None):
+    return reverse('cms_blogger.views.category_page', kwargs={
+        'blog_slug': blog_slug or row['blog__slug'], 'slug': row['slug']})
+
+
+class RowsChain(object):
+    """
+    Sequence over the rows of a few values querysets. Sitemaps paginate
+        their items so only the rows from the requested slice are fetched
+        and each row is turned into a (location, lastmod) pair without
+        instantiating any model.
+    Takes (queryset, to_location, count) tuples; count can be None if it's
+        not known beforehand.
+    """
+
+    def __init__(self, *sources):
+        self.sources = [list(source) for source in sources]
+
+    def _count(self, source):
+        if source[2] is None:
+            source[2] = source[0].count()
+        return source[2]
+
+    def __len__(self):
+        return sum(self._count(source) for source in self.sources)
+
+    def _rows(self, queryset, to_location):
+        for row in queryset.iterator():
+            yield (to_location(row), row['modified_at'])
+
+    def __iter__(self):
+        for queryset, to_location, _ in self.sources:
+            for item in self._rows(queryset, to_location):
+                yield item
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            items = self[index:index + 1]
+            if not items:
+                raise IndexError(index)
+            return items[0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            stop = len(self)
+        items, offset = [], 0
+        for source in self.sources:
+            if offset >= stop:
+                break
+            count = self._count(source)
+            if start < offset + count:
+                queryset, to_location, _ = source
+                queryset = queryset[max(start - offset, 0):stop - offset]
+                items.extend(self._rows(queryset, to_location))
+            offset += count
+        return items
+
+
+class RowsSitemap(Sitemap):
     changefreq = "monthly"
     priority = 0.5
 
+    def location(self, item):
+        return item[0]
+
+    def lastmod(self, item):
+        return item[1]
+
+
+class BloggerSitemap(RowsSitemap):
+    """
+    All blogger pages of the current site in one sitemap. Large sites
+        should use the sitemap index from cms_blogger.sitemaps.views.
+    """
+
+    @instrument('BloggerSitemap')
+    def get_urls(self, *args, **kwargs):
+        return super(BloggerSitemap, self).get_urls(*args, **kwargs)
+
     def items(self):
         # Blogs, BlogRelatedPages, BlogEntryPages
         current_site = Site.objects.get_current()
-        home_blog = HomeBlog.objects.filter(site=current_site)[:1]
-        blog_current_site = Q(blog__site=current_site)
+        home_blog = HomeBlog.objects.filter(
+            site=current_site).values('modified_at')[:1]
         blogs = Blog.objects.filter(site=current_site)
-        # bio_pages = BioPage.objects.filter(blog_current_site)
-        entry_pages = BlogEntryPage.objects.published().filter(blog_current_site)
-        blog_categories = BlogCategory.objects.filter(blog_current_site)
-        chained = itertools.chain(
-            home_blog,
-            blogs,
-            # bio_pages.select_related('blog'),
-            entry_pages.select_related('blog'),
-            blog_categories.select_related('blog'),
+        entry_pages = BlogEntryPage.objects.published().filter(
+            blog__site=current_site)
+        blog_categories = BlogCategory.objects.filter(
+            blog__site=current_site)
+        return RowsChain(
+            (home_blog, home_blog_url, None),
+            (blogs.order_by('id').values('slug', 'modified_at'),
+             blog_url, None),
+            (entry_pages.order_by('id').values(
+                'slug', 'publication_date', 'modified_at', 'blog__slug',
+                'blog__entries_slugs_with_date'), entry_url, None),
+            (blog_categories.order_by('id').values(
+                'slug', 'modified_at', 'blog__slug'), category_url, None),
         )
-        return list(chained)
 
-    def lastmod(self, blog_related_object):
-        latest = blog_related_object.modified_at
-        return latest
+
+class BlogsSitemap(RowsSitemap):
+    # landing pages of the current site blogs
+    changefreq = "daily"
+
+    def items(self):
+        current_site = Site.objects.get_current()
+        home_blog = HomeBlog.objects.filter(
+            site=current_site).values('modified_at')[:1]
+        blogs = Blog.objects.filter(site=current_site).order_by('id')
+        return RowsChain(
+            (home_blog, home_blog_url, None),
+            (blogs.values('slug', 'modified_at'), blog_url, None))
+
+
+class BlogEntriesSitemap(RowsSitemap):
+    # published entries of one blog
+    def __init__(self, blog):
+        # blog is a values row with id, slug, entries_slugs_with_date and
+        #   published_entries_count
+        self.blog = blog
+
+    def _entry_url(self, row):
+        return entry_url(
+            row, self.blog['slug'], self.blog['entries_slugs_with_date'])
+
+    def items(self):
+        entries = BlogEntryPage.objects.published().filter(
+            blog=self.blog['id']).order_by('id')
+        return RowsChain((
+            entries.values('slug', 'publication_date', 'modified_at'),
+            self._entry_url, self.blog['published_entries_count']))
+
+
+class BlogCategoriesSitemap(RowsSitemap):
+    # categories of one blog
+    def __init__(self, blog, count=None):
+        self.blog = blog
+        self.count = count
+
+    def _category_url(self, row):
+        return category_url(row, self.blog['slug'])
+
+    def items(self):
+        categories = BlogCategory.objects.filter(
+            blog=self.blog['id']).order_by('id')
+        return RowsChain((
+            categories.values('slug', 'modified_at'),
+            self._category_url, self.count))
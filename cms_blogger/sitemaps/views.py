@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from django.contrib.sitemaps.views import sitemap as sitemap_view
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db.models import Count, Max
+from django.http import Http404
+from django.template.response import TemplateResponse
+from cms_blogger.caching import get_version, VERSION_TIMEOUT
+from cms_blogger.instrumentation import instrument
+from cms_blogger.models import Blog, BlogCategory, HomeBlog
+from . import BlogsSitemap, BlogEntriesSitemap, BlogCategoriesSitemap
+import math
+
+
+BLOG_FIELDS = ('id', 'slug', 'entries_slugs_with_date',
+               'published_entries_count', 'modified_at')
+
+
+def _blogs_rows(site, **filters):
+    return Blog.objects.filter(site=site, **filters).order_by('id').values(
+        *BLOG_FIELDS)
+
+
+def _categories_counts(site, **filters):
+    return dict(BlogCategory.objects.filter(
+        blog__site=site, **filters).values_list('blog').annotate(
+        Count('id')).order_by())
+
+
+def _sections(site):
+    """
+    Returns (section, items count, lastmod) for each section sitemap of
+        the site. Blog.modified_at changes whenever anything from the blog
+        changes so it's the lastmod of both the entries and the categories
+        sections of the blog.
+    Sections are cached until anything from the site changes.
+    """
+    key = 'cms_blogger_sitemap_sections_%s_%s' % (
+        site.pk, get_version('site', site.pk))
+    sections = cache.get(key)
+    if sections is not None:
+        return sections
+    blogs = list(_blogs_rows(site))
+    categories_counts = _categories_counts(site)
+    home_blog = list(HomeBlog.objects.filter(site=site).values_list(
+        'modified_at', flat=True)[:1])
+    blogs_lastmod = Blog.objects.filter(site=site).aggregate(
+        lastmod=Max('modified_at'))['lastmod']
+    blogs_lastmod = max([blogs_lastmod] + home_blog)
+    sections = []
+    if blogs or home_blog:
+        sections.append(('blogs', len(blogs) + len(home_blog), blogs_lastmod))
+    for blog in blogs:
+        if blog['published_entries_count']:
+            sections.append((
+                'entries-%s' % blog['id'], blog['published_entries_count'],
+                blog['modified_at']))
+        if categories_counts.get(blog['id']):
+            sections.append((
+                'categories-%s' % blog['id'], categories_counts[blog['id']],
+                blog['modified_at']))
+    cache.set(key, sections, VERSION_TIMEOUT)
+    return sections
+
+
+@instrument('sitemaps.index')
+def index(request, sitemap_url_name='blogger-sitemap-section',
+          template_name='cms_blogger/sitemap_index.xml',
+          mimetype='application/xml'):
+    """
+    Sitemap index with a sitemap for the blogs landing pages and, for each
+        blog, one for its entries and one for its categories.
+    """
+    site = Site.objects.get_current()
+    protocol = 'https' if request.is_secure() else 'http'
+    limit = BlogsSitemap.limit
+    sitemaps = []
+    for section, count, lastmod in _sections(site):
+        location = '%s://%s%s' % (protocol, site.domain, reverse(
+            sitemap_url_name, kwargs={'section': section}))
+        sitemaps.append((location, lastmod))
+        pages = int(math.ceil(count / float(limit)))
+        for page in range(2, pages + 1):
+            sitemaps.append(('%s?p=%s' % (location, page), lastmod))
+    return TemplateResponse(request, template_name, {'sitemaps': sitemaps},
+                            content_type=mimetype)
+
+
+def get_sitemap(site, section):
+    if section == 'blogs':
+        return BlogsSitemap()
+    sitemap_type, _, blog_id = section.partition('-')
+    if sitemap_type not in ('entries', 'categories') or not blog_id.isdigit():
+        return None
+    blog = _blogs_rows(site, id=blog_id)[:1]
+    if not blog:
+        return None
+    if sitemap_type == 'entries':
+        return BlogEntriesSitemap(blog[0])
+    return BlogCategoriesSitemap(
+        blog[0], _categories_counts(site, blog=blog_id).get(int(blog_id), 0))
+
+
+@instrument('sitemaps.sitemap')
+def sitemap(request, section, **kwargs):
+    """
+    One section of the sitemap index; items are fetched only for the
+        requested page of the section.
+    """
+    section_sitemap = get_sitemap(Site.objects.get_current(), section)
+    if section_sitemap is None:
+        raise Http404("No sitemap available for section: %r" % section)
+    return sitemap_view(
+        request, {section: section_sitemap}, section=section, **kwargs)
@@ -1,4 +1,6 @@
 from django.template.defaultfilters import slugify
+from django.db import transaction, IntegrityError
+from django.db.models import Q
 import re
 
 # from urlify.js
@@ -9,6 +11,11 @@ _connection_words = [
 
 CONNECTION_WORDS_PATTERN = '\\b(' + '|'.join(_connection_words) + ')\\b'
 
+# '-' followed by up to 6 digits
+SUFFIX_MAX_LENGTH = 7
+# number of times a save is retried when its generated slug got taken
+SLUG_SAVE_ATTEMPTS = 3
+
 
 def urlify(value, keep_connection_words=True):
     title = value[:].strip()
@@ -17,6 +24,15 @@ def urlify(value, keep_connection_words=True):
     return slugify(title).strip('-')
 
 
+def _slug_candidates(original, max_length):
+    yield original
+    index = 1
+    while True:
+        suffix = "-%s" % index
+        yield "%s%s" % (original[:max_length - len(suffix)], suffix)
+        index += 1
+
+
 def get_unique_slug(instance, title, queryset, keep_connection_words=True):
     max_length = instance._meta.get_field('slug').max_length
 
@@ -24,14 +40,66 @@ def get_unique_slug(instance, title, queryset, keep_connection_words=True):
         queryset = queryset.exclude(pk=instance.pk)
 
     original = urlify(title, keep_connection_words)[:max_length]
-    index = 1
-    slug_candidate = original
-    while queryset.filter(slug=slug_candidate).exists():
-        suffix = "-%s" % index
-        slug_candidate = original
-        if len(suffix) + len(slug_candidate) > max_length:
-            slug_candidate = slug_candidate[:max_length - len(suffix)]
-        slug_candidate = "%s%s" % (slug_candidate, suffix)
-        index += 1
+    # all the slugs that could clash with the candidates are fetched with
+    #   one query; candidates with suffixes longer than SUFFIX_MAX_LENGTH
+    #   might not start with the prefix so they are checked one by one
+    if len(original) + SUFFIX_MAX_LENGTH <= max_length:
+        prefix = "%s-" % original
+    else:
+        prefix = original[:max_length - SUFFIX_MAX_LENGTH]
+    used_slugs = set(queryset.filter(
+        Q(slug=original) | Q(slug__startswith=prefix)
+    ).values_list('slug', flat=True))
+
+    for slug_candidate in _slug_candidates(original, max_length):
+        if slug_candidate == original or slug_candidate.startswith(prefix):
+            if slug_candidate not in used_slugs:
+                return slug_candidate
+        elif not queryset.filter(slug=slug_candidate).exists():
+            return slug_candidate
+
+
+def save_with_unique_slug(instance, save, make_slug, lock=None):
+    """
+    Saves the instance with save() and the slug returned by make_slug().
+    lock is the queryset of the rows the slug is unique for(e.g. the blog of
+        an entry); they're locked before the slug gets generated, until the
+        transaction ends, so concurrent saves don't generate the same slug.
+    Databases without row locks fall back on the unique constraint, when
+        there's one: the slug is generated again and the save retried if
+        the constraint fails.
+    """
+    for attempt in range(SLUG_SAVE_ATTEMPTS):
+        sid = transaction.savepoint()
+        try:
+            if lock is not None:
+                list(lock.select_for_update().values_list('pk', flat=True))
+            instance.slug = make_slug()
+            save()
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+            if attempt == SLUG_SAVE_ATTEMPTS - 1:
+                raise
+        else:
+            transaction.savepoint_commit(sid)
+            return
+
 
-    return slug_candidate
+def allocate_unique_slugs(titles, max_length, used_slugs,
+                          keep_connection_words=True):
+    """
+    Generates a slug for each title without querying the database.
+        used_slugs should contain all the slugs that are already taken; each
+        slug is unique among the used ones and the ones generated for the
+        previous titles.
+    """
+    used_slugs = set(used_slugs)
+    slugs = []
+    for title in titles:
+        original = urlify(title, keep_connection_words)[:max_length]
+        for slug_candidate in _slug_candidates(original, max_length):
+            if slug_candidate not in used_slugs:
+                break
+        used_slugs.add(slug_candidate)
+        slugs.append(slug_candidate)
+    return slugs
@@ -1,8 +1,14 @@
+from django.core.cache import cache
 from django.core.serializers import serialize
 from django.db.models.query import QuerySet
+from django.utils.encoding import smart_str
 from django.utils.safestring import mark_safe
 from django.template import Library
+from django.template.loader import get_template
 from dateutil import tz, relativedelta
+from cms_blogger.caching import get_version
+from cms_blogger.settings import ENTRY_SUMMARY_CACHE_TIMEOUT
+import hashlib
 import json
 import calendar
 import datetime
@@ -21,10 +27,7 @@ def jsonify(obj_to_jsonify):
 jsonify.is_safe = True
 
 
-@register.inclusion_tag('cms_blogger/entry_pub_date.html')
-def publish_date_box(entry):
-    if not hasattr(entry, 'publication_date'):
-        return {}
+def _publication_utc(entry):
     datetime_obj = entry.publication_date
     is_aware = (datetime_obj.tzinfo is not None and
                 datetime_obj.tzinfo.utcoffset(datetime_obj) is not None)
@@ -32,12 +35,71 @@ def publish_date_box(entry):
         as_utc = datetime_obj.astimezone(tz.tzutc())
     else:
         as_utc = datetime_obj
-    as_utc = as_utc.replace(tzinfo=None)
+    return as_utc.replace(tzinfo=None)
+
+
+def _is_older(as_utc):
     # entry is published for more than 3 months
-    is_older = as_utc < (datetime.datetime.utcnow() +
-                         relativedelta.relativedelta(months=-3))
+    return as_utc < (datetime.datetime.utcnow() +
+                     relativedelta.relativedelta(months=-3))
+
+
+@register.inclusion_tag('cms_blogger/entry_pub_date.html')
+def publish_date_box(entry):
+    if not hasattr(entry, 'publication_date'):
+        return {}
+    as_utc = _publication_utc(entry)
     return {
         'date_var': (
             "entry_pub_%s%s" % (time.time(), entry.id)).replace('.' , ''),
         'utc_millis': calendar.timegm(as_utc.timetuple()) * 1000,
-        'show_year': is_older}
+        'show_year': _is_older(as_utc)}
+
+
+def _render_summary(template, context, entry):
+    context.push()
+    try:
+        context['entry'] = entry
+        return template.render(context)
+    finally:
+        context.pop()
+
+
+def _summary_key(context, entry, versions):
+    # everything the summary depends on besides the entry's fields, which
+    #   change its modified_at
+    parts = (
+        entry.blog_id, entry.slug, entry.modified_at.isoformat(),
+        bool(context.get('hide_entry_image')),
+        bool(context.get('hide_entry_description')),
+        context.get('poster_image_sizes'), context.get('PROXY_REWRITE_RULE'),
+        _is_older(_publication_utc(entry)), versions[entry.blog_id])
+    return 'cms_blogger_entry_summary_%s_%s' % (
+        entry.pk, hashlib.md5(smart_str(repr(parts))).hexdigest())
+
+
+@register.assignment_tag(takes_context=True)
+def entries_summaries(context, entries):
+    """
+    Renders cms_blogger/entry_summary.html for each entry. The summaries are
+        cached for ENTRY_SUMMARY_CACHE_TIMEOUT seconds and the ones of all
+        the entries are fetched with one cache round trip.
+    """
+    entries = list(entries or [])
+    template = get_template('cms_blogger/entry_summary.html')
+    if not ENTRY_SUMMARY_CACHE_TIMEOUT:
+        return [_render_summary(template, context, entry)
+                for entry in entries]
+    versions = dict(
+        (blog_id, get_version('summaries', blog_id))
+        for blog_id in set(entry.blog_id for entry in entries))
+    keys = [_summary_key(context, entry, versions) for entry in entries]
+    summaries = cache.get_many(keys)
+    rendered = {}
+    for key, entry in zip(keys, entries):
+        if key not in summaries:
+            rendered[key] = _render_summary(template, context, entry)
+    if rendered:
+        cache.set_many(rendered, ENTRY_SUMMARY_CACHE_TIMEOUT)
+        summaries.update(rendered)
+    return [mark_safe(summaries[key]) for key in keys]
@@ -6,6 +6,8 @@ register = template.Library()
 def paginator(context, page, adjacent_pages=2):
     """
     Based on the logic provided here: https://djangosnippets.org/snippets/73/
+    Renders both django's paginator pages and the keyset paginator pages;
+        for the latter the previous/next/last links point to cursors.
     """
     page_no = page.number
     total_pages = page.paginator.num_pages
@@ -16,6 +18,7 @@ def paginator(context, page, adjacent_pages=2):
     is_after_first = page_numbers[0] - 1 == 1
     show_last = total_pages not in page_numbers
     is_before_last = page_numbers[len(page_numbers) - 1] + 1 == total_pages
+    last_page_number = getattr(page, 'last_page_number', None)
     return {
         'page': page,
         'page_numbers': page_numbers,
@@ -23,6 +26,9 @@ def paginator(context, page, adjacent_pages=2):
         'show_first_ellipsis': show_first and not is_after_first,
         'show_last': show_last,
         'show_last_ellipsis': show_last and not is_before_last,
+        'last_page_param': (
+            last_page_number() if show_last and last_page_number
+            else total_pages),
         'extra_params': context.get('extra_params'),
         'STATIC_URL': context.get('STATIC_URL'),
         'page_param_name': context.get('page_param_name')
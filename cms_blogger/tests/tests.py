@@ -7,6 +7,8 @@ from django.core.urlresolvers import reverse
 from django.template import Template
 from django.utils import timezone
 from django.test.client import RequestFactory
+from django.core.management import call_command
+from django.core.cache import cache
 from dateutil import tz, parser
 
 from cms_blogger.models import *
@@ -15,6 +17,7 @@ from cms.api import create_page, add_plugin
 from cms.tests.menu import BaseMenuTest
 
 from cms_blogger.admin import BlogEntryPageAdmin
+from cms_blogger.utils import KeysetPaginator
 
 from cms_layouts.models import Layout
 from cms_layouts.layout_response import LayoutResponse
@@ -23,6 +26,7 @@ from cms_layouts.slot_finder import get_fixed_section_slots
 import xml.etree.ElementTree
 import urlparse
 import urllib
+import datetime
 
 
 class TestMoveAction(TestCase):
@@ -332,6 +336,50 @@ class TestMoveAction(TestCase):
         self.assert_blog_has_no_category(blog1)
         self.assert_blog_has_no_category(blog2)
 
+    def test_chunked_move(self):
+        """
+              B1          B2   >   B1       B2
+             /  \        /  \  >          / | \
+        E1..E5 = C1   E6 = C1   >   E1..E6 = C1 C2
+                  = C2
+        """
+        from cms_blogger.move import move_entries
+        entries = [self.create_entry(self.blog1) for i in range(5)]
+        other = self.create_entry(self.blog2)
+        cat1 = self.create_category(self.blog1)
+        cat2 = self.create_category(self.blog1, 'cat2')
+        cat1.entries.add(*entries)
+        cat2.entries.add(entries[0])
+        self.create_category(self.blog2).entries.add(other)
+        entries.append(self.create_entry(self.blog1, save=False))
+
+        progress = []
+        moved = move_entries(
+            self.blog2, [e.id for e in entries], chunk_size=2,
+            progress=lambda *args: progress.append(args))
+        self.assertEquals(len(moved), 6)
+        self.assertEquals(progress, [(2, 6), (4, 6), (6, 6)])
+        self.assertEquals(self.blog1.blogentrypage_set.count(), 0)
+        self.assert_blog_has_no_category(self.blog1)
+        slugs = self.blog2.blogentrypage_set.filter(
+            draft_id=None).values_list('slug', flat=True)
+        self.assertItemsEqual(
+            slugs, ['e1', 'e1-1', 'e1-2', 'e1-3', 'e1-4', 'e1-5'])
+        self.assertEquals(BlogEntryPage.objects.get(id=other.id).slug, 'e1')
+        self.assertEquals(
+            self.blog2.categories.get(name='cat1').entries.count(), 6)
+        self.assertEquals(
+            list(self.blog2.categories.get(name='cat2').entries.all()),
+            [entries[0]])
+        self.assertEquals(Blog.objects.get(
+            id=self.blog2.id).published_entries_count, 0)
+
+        call_command('blogger_move_entries', str(self.blog1.id),
+                     from_blog=self.blog2.id, verbosity=0)
+        self.assertEquals(self.blog1.blogentrypage_set.count(), 7)
+        self.assertEquals(self.blog1.categories.count(), 2)
+        self.assert_blog_has_no_category(self.blog2)
+
     def test_move_to_same(self):
         """
           B1       >      B1
@@ -799,6 +847,25 @@ class TestBlogEntryModel(TestCase):
         self.assertEquals(CMSPlugin.objects.count(), 0)
         self.assertTrue(Blog.objects.filter(pk=self.blog.pk).exists())
 
+    def test_content_body_lazy_loading(self):
+        for i in range(3):
+            entry = BlogEntryPage.objects.create(**{
+                'title': '%s' % i, 'blog': self.blog,
+                'short_description': 'desc'})
+            entry.content_body = 'body %s' % i
+            entry.save()
+        # instantiating entries should not touch the placeholders
+        with self.assertNumQueries(1):
+            entries = list(BlogEntryPage.objects.order_by('title'))
+        self.assertEquals(entries[0].content_body, 'body 0')
+
+        entries = list(BlogEntryPage.objects.order_by('title'))
+        with self.assertNumQueries(2):
+            BlogEntryPage.prefetch_content_body(entries)
+        with self.assertNumQueries(0):
+            bodies = [entry.content_body for entry in entries]
+        self.assertEquals(bodies, ['body 0', 'body 1', 'body 2'])
+
     def test_next_prev_post_even(self):
         for i in range(4):
             BlogEntryPage.objects.create(**{
@@ -835,6 +902,255 @@ class TestBlogEntryModel(TestCase):
         self.assertEquals(entries["4"].previous_post().pk, entries["3"].pk)
         self.assertEquals(entries["4"].next_post(), None)
 
+    def test_next_prev_post_queries(self):
+        from cms_blogger import models as blogger_models
+        for i in range(3):
+            BlogEntryPage.objects.create(**{
+                'title': '%s' % i, 'blog': self.blog,
+                'short_description': 'desc', 'is_published': True})
+        entry = BlogEntryPage.objects.select_related('blog').get(title='1')
+        with self.assertNumQueries(1):
+            self.assertEquals(entry.previous_post().title, '0')
+            self.assertEquals(entry.next_post().title, '2')
+            entry.previous_post().get_absolute_url()
+            entry.next_post().get_absolute_url()
+
+        blogger_models.NEIGHBOURS_CACHE_TIMEOUT = 60
+        try:
+            BlogEntryPage.objects.get(title='1').next_post()
+            entry = BlogEntryPage.objects.select_related('blog').get(
+                title='1')
+            with self.assertNumQueries(1):
+                self.assertEquals(entry.next_post().title, '2')
+            # publishing changes invalidate the cached neighbours
+            BlogEntryPage.objects.filter(title='2').update(
+                is_published=False)
+            BlogEntryPage.objects.update_live_state()
+            self.assertEquals(
+                BlogEntryPage.objects.get(title='1').next_post(), None)
+        finally:
+            blogger_models.NEIGHBOURS_CACHE_TIMEOUT = 0
+
+    def test_keyset_pagination(self):
+        for i in range(5):
+            BlogEntryPage.objects.create(**{
+                'title': '%s' % i, 'blog': self.blog,
+                'short_description': 'desc', 'is_published': True})
+        # same publication date for all, slug and pk decide the order
+        BlogEntryPage.objects.update(publication_date=timezone.now())
+        expected = [e.pk for e in self.blog.get_entries()]
+
+        paginator = KeysetPaginator(self.blog.get_entries(), 2)
+        page, pages = paginator.page(None), []
+        while True:
+            pages.append([e.pk for e in page])
+            if not page.has_next():
+                break
+            with self.assertNumQueries(1):
+                page = paginator.page(page.next_page_number())
+        self.assertEquals(pages, [expected[:2], expected[2:4], expected[4:]])
+        self.assertEquals((page.number, paginator.num_pages), (3, 3))
+        self.assertFalse(page.has_next())
+
+        page = paginator.page(page.previous_page_number())
+        self.assertEquals([e.pk for e in page], expected[2:4])
+        self.assertEquals(page.number, 2)
+        page = paginator.page(page.previous_page_number())
+        self.assertEquals([e.pk for e in page], expected[:2])
+        self.assertFalse(page.has_previous())
+        # numbered pages and broken cursors
+        self.assertEquals([e.pk for e in paginator.page(3)], expected[4:])
+        self.assertEquals([e.pk for e in paginator.page(9)], expected[4:])
+        # the last page link leads to the same partial page
+        page = paginator.page(paginator.page(1).last_page_number())
+        self.assertEquals([e.pk for e in page], expected[4:])
+        self.assertEquals(page.number, 3)
+        self.assertTrue(page.has_previous())
+        page = paginator.page(page.previous_page_number())
+        self.assertEquals([e.pk for e in page], expected[2:4])
+        self.assertEquals([e.pk for e in paginator.page('x')], expected[:2])
+
+    def test_published_entries_counters(self):
+        def counts():
+            return (Blog.objects.get(pk=self.blog.pk).published_entries_count,
+                    HomeBlog.objects.get().published_entries_count,
+                    BlogCategory.objects.get().published_entries_count)
+
+        HomeBlog().save()
+        category = BlogCategory.objects.create(name='cat', blog=self.blog)
+        entries = [BlogEntryPage.objects.create(**{
+            'title': '%s' % i, 'blog': self.blog,
+            'short_description': 'desc', 'is_published': True})
+            for i in range(3)]
+        self.assertEquals(counts(), (3, 3, 0))
+        category.entries.add(*entries[:2])
+        self.assertEquals(counts(), (3, 3, 2))
+        entries[0].delete()
+        self.assertEquals(counts(), (2, 2, 1))
+        admin.BlogEntryPageAdmin(BlogEntryPage, AdminSite()).make_unpublished(
+            None, BlogEntryPage.objects.filter(pk=entries[1].pk))
+        self.assertEquals(counts(), (1, 1, 0))
+
+        # single entry changes don't recount
+        from django.db import connection
+        other = Blog.objects.create(title='other', slug='other')
+        entry = BlogEntryPage.objects.get(pk=entries[2].pk)
+        connection.use_debug_cursor = True
+        try:
+            start = len(connection.queries)
+            category.entries.add(entry)
+            self.assertEquals(counts(), (1, 1, 1))
+            # already linked and not linked entries
+            category.entries.add(entry)
+            category.entries.remove(entries[1])
+            self.assertEquals(counts(), (1, 1, 1))
+            entry.categories.remove(category)
+            self.assertEquals(counts(), (1, 1, 0))
+            entry.categories.add(category)
+            entry.is_published = False
+            entry.save()
+            self.assertEquals(counts(), (0, 0, 0))
+            entry.is_published = True
+            entry.save()
+            self.assertEquals(counts(), (1, 1, 1))
+            entry.blog = other
+            entry.save()
+            self.assertEquals(counts(), (0, 1, 0))
+            self.assertEquals(
+                Blog.objects.get(pk=other.pk).published_entries_count, 1)
+            entry.blog = self.blog
+            entry.save()
+            self.assertEquals(counts(), (1, 1, 1))
+            entry.categories.clear()
+            self.assertEquals(counts(), (1, 1, 0))
+            category.entries.add(entry)
+            category.entries.clear()
+            self.assertEquals(counts(), (1, 1, 0))
+            category.entries.add(entry)
+            self.assertEquals(counts(), (1, 1, 1))
+            recounts = [
+                query['sql'] for query in connection.queries[start:]
+                if 'COUNT(' in query['sql']]
+        finally:
+            connection.use_debug_cursor = False
+        self.assertEquals(recounts, [])
+        entry.delete()
+        self.assertEquals(counts(), (0, 0, 0))
+
+        Blog.objects.update(published_entries_count=3)
+        call_command('blogger_rebuild_counts', verbosity=0)
+        self.assertEquals(counts(), (0, 0, 0))
+
+    def test_batched_blog_touches(self):
+        from cms_blogger.batch import batch_updates
+        from django.db import connection
+        past = timezone.now() - datetime.timedelta(days=1)
+        Blog.objects.update(modified_at=past)
+        connection.use_debug_cursor = True
+        try:
+            start = len(connection.queries)
+            with batch_updates():
+                for i in range(3):
+                    BlogEntryPage.objects.create(**{
+                        'title': 'entry %s' % i, 'blog': self.blog,
+                        'short_description': 'desc'})
+                category = BlogCategory.objects.create(
+                    name='category', blog=self.blog)
+                category.entries.add(*BlogEntryPage.objects.all())
+                category.delete()
+                # nothing touched until the block exits
+                self.assertEquals(
+                    Blog.objects.get(pk=self.blog.pk).modified_at, past)
+            blog_touches = [
+                query['sql'] for query in connection.queries[start:]
+                if query['sql'].startswith('UPDATE "cms_blogger_blog" ') and
+                'modified_at' in query['sql']]
+        finally:
+            connection.use_debug_cursor = False
+        # no blog saves, only one modified_at update
+        self.assertEquals(len(blog_touches), 1)
+        self.assertIn('SET "modified_at"', blog_touches[0])
+        self.assertNotEqual(
+            Blog.objects.get(pk=self.blog.pk).modified_at, past)
+
+    def test_failed_batched_calls(self):
+        from cms_blogger.batch import batch_updates, batched
+        calls = []
+
+        def fail(items):
+            raise ValueError(items)
+
+        def record(items):
+            calls.append(items)
+
+        with self.assertRaises(ValueError):
+            with batch_updates():
+                batched(fail, [1])
+                batched(record, [2])
+        # the calls left pending are dropped, not made by the next block
+        with batch_updates():
+            batched(record, [3])
+        batched(record, [4])
+        self.assertEquals(calls, [set([3]), [4]])
+
+    def test_unique_slugs(self):
+        from cms_blogger.slug import get_unique_slug, save_with_unique_slug
+        from django.db import IntegrityError
+
+        def make(title):
+            entry = BlogEntryPage.objects.create(**{
+                'title': title, 'blog': self.blog,
+                'short_description': 'desc'})
+            # not a draft anymore
+            entry.save()
+            return entry
+        for i in range(4):
+            make('Weekly roundup')
+        make('Weekly roundup extra')
+        entry = BlogEntryPage(blog=self.blog, title='Weekly roundup')
+        unique_qs = BlogEntryPage.objects.filter(
+            blog=self.blog, draft_id=None)
+        with self.assertNumQueries(1):
+            self.assertEquals(
+                get_unique_slug(entry, entry.title, unique_qs),
+                'weekly-roundup-4')
+        # slugs with suffixes get truncated to the slug max length
+        categories = [BlogCategory.objects.create(
+            name='b' * 30, blog=self.blog) for i in range(2)]
+        self.assertEquals([category.slug for category in categories],
+                          ['b' * 30, 'b' * 28 + '-1'])
+
+        # a slug taken by a concurrent save is generated again
+        BlogEntryPage.objects.filter(slug='weekly-roundup-4').delete()
+        saves = []
+
+        def save():
+            saves.append(entry.slug)
+            if len(saves) == 1:
+                make('Weekly roundup')
+                raise IntegrityError()
+            BlogEntryPage.save(entry)
+        save_with_unique_slug(
+            entry, save, lambda: get_unique_slug(entry, entry.title, unique_qs))
+        self.assertEquals(saves, ['weekly-roundup-4', 'weekly-roundup-5'])
+
+        # the rows the slugs are unique for get locked before the slug is
+        #   generated
+        calls = []
+
+        class Lock(object):
+            def select_for_update(self):
+                calls.append('lock')
+                return Blog.objects.filter(pk=self.pk)
+        lock = Lock()
+        lock.pk = self.blog.pk
+        entry = BlogEntryPage(blog=self.blog, title='Weekly roundup')
+        save_with_unique_slug(
+            entry, lambda: calls.append('save'),
+            lambda: calls.append('slug') or 'slug', lock=lock)
+        self.assertEquals(calls, ['lock', 'slug', 'save'])
+        self.assertEquals(entry.slug, 'slug')
+
     def test_draft(self):
         draft_entry = BlogEntryPage.objects.create(blog=self.blog)
         self.assertTrue(draft_entry.is_draft)
@@ -917,9 +1233,411 @@ class TestBlogEntryModel(TestCase):
             'post': 'yes', })
         self.assertEquals(self.blog.get_entries().count(), 0)
 
+    def test_scheduled_publication(self):
+        now = timezone.now()
+        entry = BlogEntryPage.objects.create(**{
+            'title': 'entry', 'blog': self.blog, 'short_description': 'desc',
+            'is_published': True,
+            'start_publication': now + datetime.timedelta(hours=1),
+            'end_publication': now + datetime.timedelta(hours=3)})
+        self.assertFalse(entry.is_live)
+        self.assertEquals(self.blog.get_entries().count(), 0)
+        self.assertEquals(BlogEntryPage.objects.update_live_state(now), [])
+
+        in_two_hours = now + datetime.timedelta(hours=2)
+        self.assertEquals(
+            BlogEntryPage.objects.update_live_state(in_two_hours), [entry.pk])
+        self.assertEquals(self.blog.get_entries().count(), 1)
+        # the worker unpublishes it since the end date is in the past
+        BlogEntryPage.objects.filter(pk=entry.pk).update(
+            end_publication=now - datetime.timedelta(hours=1))
+        call_command('blogger_publish_scheduled', verbosity=0)
+        self.assertEquals(self.blog.get_entries().count(), 0)
+
     def test_poster_image_deletion(self):
         pass
 
+    def test_poster_image_jobs(self):
+        from cms_blogger import jobs
+        from cms_blogger.jobs import claim_job, process_poster_image_job
+        from django.core.files.storage import FileSystemStorage
+        from PIL import Image
+        import json
+        import os
+        import shutil
+        import StringIO
+        import tempfile
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        fields = (PosterImageJob._meta.get_field('upload'),
+                  BlogEntryPage._meta.get_field('poster_image'))
+        old_storages = [field.storage for field in fields]
+        for field in fields:
+            field.storage = storage
+        image = StringIO.StringIO()
+        Image.new('RGB', (1280, 720), 'red').save(image, 'JPEG')
+        entry = BlogEntryPage.objects.create(**{
+            'title': 'entry', 'blog': self.blog, 'short_description': 'x'})
+        upload_url = reverse('admin:cms_blogger-upload-thumbnail', kwargs={
+            'blog_entry_id': entry.pk})
+
+        def upload():
+            response = self.client.post(
+                '%s?qqfile=poster.jpg' % upload_url, image.getvalue(),
+                content_type='application/octet-stream',
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            return json.loads(response.content)
+        try:
+            data = upload()
+            poster_image = BlogEntryPage.objects.get(pk=entry.pk).poster_image
+            self.assertEquals(data['status'], PosterImageJob.DONE)
+            self.assertEquals(data['url'], poster_image.url)
+            self.assertEquals(poster_image.width, 640)
+            # the upload is processed right away, without being stored
+            self.assertFalse(PosterImageJob.objects.exists())
+            self.assertFalse(storage.exists('blog/uploads'))
+
+            admin.ASYNC_POSTER_IMAGES = True
+            data = upload()
+            self.assertEquals(data['status'], PosterImageJob.PENDING)
+            status = json.loads(self.client.get(data['status_url']).content)
+            self.assertEquals(status['status'], PosterImageJob.PENDING)
+            call_command('blogger_process_images', verbosity=0)
+            status = json.loads(self.client.get(data['status_url']).content)
+            self.assertEquals(status['status'], PosterImageJob.DONE)
+            new_poster_image = BlogEntryPage.objects.get(
+                pk=entry.pk).poster_image
+            self.assertEquals(status['url'], new_poster_image.url)
+            # the replaced image got deleted
+            self.assertNotEquals(poster_image.name, new_poster_image.name)
+            self.assertFalse(storage.exists(poster_image.name))
+
+            # the entry changes made while the image is resized are kept
+            upload()
+            job = PosterImageJob.objects.select_related('entry').get(
+                status=PosterImageJob.PENDING)
+            BlogEntryPage.objects.filter(pk=entry.pk).update(title='edited')
+            self.assertTrue(claim_job(job))
+            self.assertEquals(
+                process_poster_image_job(job).status, PosterImageJob.DONE)
+            entry = BlogEntryPage.objects.get(pk=entry.pk)
+            self.assertEquals(entry.title, 'edited')
+            self.assertEquals(entry.poster_image.name, job.entry.poster_image)
+            self.assertEquals(len(entry.get_poster_image_renditions()), len(
+                job.entry.get_poster_image_renditions()))
+            self.assertFalse(storage.exists(new_poster_image.name))
+
+            # the saved files are deleted if the entry can't be updated
+            def stored_files():
+                return set(os.path.join(path, name) for path, _, names in
+                           os.walk(storage.location) for name in names)
+            before = stored_files()
+
+            class Timezone(object):
+                @staticmethod
+                def now():
+                    raise Exception('entry is gone')
+            jobs.timezone = Timezone
+            try:
+                job = process_poster_image_job(
+                    PosterImageJob(entry=entry), StringIO.StringIO(
+                        image.getvalue()))
+            finally:
+                jobs.timezone = timezone
+            self.assertEquals(job.status, PosterImageJob.FAILED)
+            self.assertEquals(stored_files(), before)
+            self.assertFalse(OrphanFile.objects.exists())
+
+            # the uploads of the jobs deleted with their entry are deleted
+            upload()
+            job = PosterImageJob.objects.get(status=PosterImageJob.PENDING)
+            self.assertTrue(storage.exists(job.upload.name))
+            entry.delete()
+            self.assertFalse(storage.exists(job.upload.name))
+        finally:
+            admin.ASYNC_POSTER_IMAGES = False
+            for field, old_storage in zip(fields, old_storages):
+                field.storage = old_storage
+            shutil.rmtree(storage.location)
+
+    def test_poster_image_renditions(self):
+        from cms_blogger.batch import batch_updates
+        from django.core.files.storage import FileSystemStorage
+        from django.template.loader import render_to_string
+        from cms_blogger.utils import make_renditions, resize_image
+        from PIL import Image
+        import shutil
+        import StringIO
+        import tempfile
+        field = BlogEntryPage._meta.get_field('poster_image')
+        old_storage, field.storage = field.storage, FileSystemStorage(
+            location=tempfile.mkdtemp(), base_url='/media/')
+        try:
+            entry = BlogEntryPage.objects.create(**{
+                'title': 'entry', 'blog': self.blog,
+                'short_description': 'x'})
+            image = StringIO.StringIO()
+            Image.new('RGB', (800, 600), 'red').save(image, 'JPEG')
+            image.name = 'photo.jpg'
+            renditions = make_renditions(image)
+            # fitted in the 16:9 boxes of each width, like the poster image,
+            #   without upscaling
+            self.assertEquals(
+                [rendition[:3] for rendition in renditions],
+                [(320, 180, 'webp'), (640, 360, 'webp'), (1280, 720, 'webp'),
+                 (320, 180, 'jpeg'), (640, 360, 'jpeg'),
+                 (1280, 720, 'jpeg')])
+            for width, height, _, content in renditions:
+                self.assertEquals(Image.open(content).size, (width, height))
+                content.seek(0)
+            portrait = StringIO.StringIO()
+            Image.new('RGB', (600, 1200), 'red').save(portrait, 'JPEG')
+            portrait.name = 'portrait.jpg'
+            rendition = make_renditions(portrait)[0][3]
+            rendition_img = Image.open(rendition)
+            self.assertEquals(rendition_img.size, (320, 180))
+            # the 90x180 image is centered on a transparent background
+            self.assertEquals(rendition_img.convert('RGBA').getpixel(
+                (0, 0))[3], 0)
+            self.assertEquals(rendition_img.convert('RGBA').getpixel(
+                (160, 90))[3], 255)
+            entry.set_poster_image(resize_image(image), renditions)
+            entry.save()
+            entry = BlogEntryPage.objects.get(pk=entry.pk)
+            files = entry.get_poster_image_files()
+            self.assertEquals(len(files), 7)
+            self.assertTrue(all(field.storage.exists(f) for f in files))
+            html = render_to_string(
+                'cms_blogger/poster_image.html', {'entry': entry})
+            self.assertIn('<source type="image/webp" srcset="/media/', html)
+            self.assertIn('_1280w.jpg 1280w"', html)
+            self.assertIn('sizes="%s"' % entry.poster_image_sizes, html)
+
+            transparent = StringIO.StringIO()
+            Image.new('RGBA', (100, 100)).save(transparent, 'PNG')
+            transparent.name = 'logo.png'
+            renditions = make_renditions(transparent)
+            self.assertEquals([rendition[:3] for rendition in renditions],
+                              [(320, 180, 'webp'), (320, 180, 'png')])
+            entry.set_poster_image(resize_image(transparent), renditions)
+            with batch_updates():
+                entry.save()
+            self.assertFalse(any(field.storage.exists(f) for f in files))
+            files = entry.get_poster_image_files()
+            with batch_updates():
+                entry.delete_poster_image()
+            self.assertEquals(entry.get_poster_image_files(), [])
+            self.assertFalse(any(field.storage.exists(f) for f in files))
+        finally:
+            shutil.rmtree(field.storage.location)
+            field.storage = old_storage
+
+    def test_image_decoding_bounds(self):
+        from cms_blogger import utils
+        from PIL import Image
+        import StringIO
+        photo = StringIO.StringIO()
+        Image.new('RGB', (4000, 3000), 'red').save(photo, 'JPEG')
+        photo.name = 'photo.jpg'
+        # decoded at 1/4 scale, the smallest one larger than 640x360
+        pil_img = utils.open_image(photo, (640, 360))
+        self.assertEquals(pil_img.size, (1000, 750))
+        self.assertEquals(utils.image_memory_usage(pil_img, (640, 360)),
+                          4 * (1000 * 750 + 640 * 360))
+        # the images with other modes than RGB(A) get converted at full size
+        for mode, pixel_bytes in (('P', 1 + 4), ('LA', 4 + 4), ('RGBA', 4)):
+            self.assertEquals(
+                utils.image_memory_usage(Image.new(mode, (100, 100)), (8, 8)),
+                pixel_bytes * 100 * 100 + 4 * 8 * 8)
+        screenshot = StringIO.StringIO()
+        Image.new('RGB', (2000, 2000)).save(screenshot, 'PNG')
+        screenshot.name = 'screenshot.png'
+        old_budget = utils.POSTER_IMAGE_MEMORY_BUDGET
+        utils.POSTER_IMAGE_MEMORY_BUDGET = 16 * 1024 * 1024
+        try:
+            # pngs are decoded at full size
+            with self.assertRaises(Exception):
+                utils.check_image(screenshot)
+            utils.check_image(photo)
+        finally:
+            utils.POSTER_IMAGE_MEMORY_BUDGET = old_budget
+        old_max_pixels = utils.POSTER_IMAGE_MAX_PIXELS
+        utils.POSTER_IMAGE_MAX_PIXELS = 4000 * 3000 - 1
+        try:
+            with self.assertRaises(Exception):
+                utils.check_image(photo)
+        finally:
+            utils.POSTER_IMAGE_MAX_PIXELS = old_max_pixels
+
+        poster_image = utils.resize_image(photo)
+        self.assertEquals(poster_image.size, len(poster_image.read()))
+        poster_image.seek(0)
+        self.assertEquals(Image.open(poster_image).size, (640, 360))
+
+        # pngs from cameras and screens pass the check and get processed
+        #   with the default budget
+        screenshot = StringIO.StringIO()
+        Image.new('RGB', (4000, 3000), 'blue').save(screenshot, 'PNG')
+        screenshot.name = 'screenshot.png'
+        utils.check_image(screenshot)
+        self.assertTrue(utils.make_renditions(screenshot))
+        poster_image = utils.resize_image(screenshot)
+        self.assertEquals(Image.open(poster_image).size, (640, 360))
+
+    def test_files_deletion(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+        from cms_blogger.batch import batch_updates
+        import shutil
+        import tempfile
+        field = BlogEntryPage._meta.get_field('poster_image')
+        old_storage, field.storage = field.storage, FileSystemStorage(
+            location=tempfile.mkdtemp())
+        try:
+            files = []
+            for i in range(5):
+                name = field.storage.save('%s.jpg' % i, ContentFile('x'))
+                BlogEntryPage.objects.create(**{
+                    'title': 'entry %s' % i, 'blog': self.blog,
+                    'short_description': 'x', 'poster_image': name})
+                files.append(name)
+            with batch_updates():
+                BlogEntryPage.objects.filter(blog=self.blog).delete()
+                # files get deleted once the block exits
+                self.assertTrue(all(field.storage.exists(f) for f in files))
+            self.assertFalse(any(field.storage.exists(f) for f in files))
+            self.assertEquals(OrphanFile.objects.count(), 0)
+
+            name = field.storage.save('orphan.jpg', ContentFile('x'))
+            entry = BlogEntryPage.objects.create(**{
+                'title': 'entry', 'blog': self.blog,
+                'short_description': 'x', 'poster_image': name})
+
+            # a failed block(its transaction gets rolled back, along with
+            #   the recorded files) doesn't delete the files
+            with self.assertRaises(ValueError):
+                with batch_updates():
+                    entry.delete()
+                    raise ValueError()
+            self.assertTrue(field.storage.exists(name))
+            OrphanFile.objects.all().delete()
+            entry.save()
+
+            def delete(name):
+                raise IOError('Service unavailable')
+            field.storage.delete = delete
+            with batch_updates():
+                entry.delete()
+            del field.storage.delete
+            self.assertTrue(field.storage.exists(name))
+            orphan = OrphanFile.objects.get()
+            self.assertEquals((orphan.name, orphan.attempts), (name, 1))
+            call_command('blogger_sweep_files', verbosity=0)
+            self.assertFalse(field.storage.exists(name))
+            self.assertEquals(OrphanFile.objects.count(), 0)
+
+            # outside batch_updates blocks the files are left for the sweep
+            name = field.storage.save('orphan.jpg', ContentFile('x'))
+            BlogEntryPage.objects.create(**{
+                'title': 'entry', 'blog': self.blog,
+                'short_description': 'x', 'poster_image': name}).delete()
+            self.assertTrue(field.storage.exists(name))
+            call_command('blogger_sweep_files', verbosity=0)
+            self.assertFalse(field.storage.exists(name))
+            self.assertEquals(OrphanFile.objects.count(), 0)
+        finally:
+            shutil.rmtree(field.storage.location)
+            field.storage = old_storage
+
+    def test_files_deletion_requests(self):
+        from cms_blogger.files import delete_many
+
+        class Storage(object):
+            def __init__(self):
+                self.deleted = []
+
+            def delete(self, name):
+                if name == 'missing.jpg':
+                    raise IOError('not found')
+                self.deleted.append(name)
+
+        class BulkStorage(Storage):
+            def delete_many(self, names):
+                self.deleted.append(names)
+                return {}
+
+        storage = Storage()
+        self.assertEquals(
+            delete_many(storage, ['1.jpg', 'missing.jpg', '2.jpg']),
+            {'missing.jpg': 'not found'})
+        self.assertEquals(storage.deleted, ['1.jpg', '2.jpg'])
+        storage = BulkStorage()
+        self.assertEquals(delete_many(storage, ['1.jpg', '2.jpg']), {})
+        self.assertEquals(storage.deleted, [['1.jpg', '2.jpg']])
+
+    def test_rendered_content_cache(self):
+        from cms_blogger import models as blogger_models
+        from django.contrib.auth.models import AnonymousUser
+        from django.template.context import RequestContext
+        from django.utils import translation
+        # the language of the text plugins and of the request
+        translation.activate('en')
+        entry = BlogEntryPage.objects.create(**{
+            'title': 'entry', 'blog': self.blog, 'short_description': 'x'})
+        entry.content_body = '<p>body</p>'
+        entry.save()
+        parent = entry.get_content_plugin()
+        nested = add_plugin(entry.content, 'TextPlugin', 'en',
+                            target=parent, body='nested')
+        parent.body = '<p>body</p><img id="plugin_obj_%s" alt="" />' % (
+            nested.pk)
+        parent.save()
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        def load():
+            loaded = BlogEntryPage.objects.get(pk=entry.pk)
+            loaded.load_rendered_content(request, RequestContext(request))
+            return loaded.content._en_plugins_cache[0].body
+
+        blogger_models.RENDERED_CONTENT_CACHE_TIMEOUT = 60
+        try:
+            self.assertIn('nested', load())
+            self.assertNotIn('plugin_obj', load())
+            # the stored body keeps its plugin tags
+            self.assertIn('plugin_obj', entry.get_content_plugin().body)
+            nested.body = 'edited'
+            nested.save()
+            self.assertIn('nested', load())
+            blogger_models.invalidate_rendered_content([entry.content_id])
+            self.assertIn('edited', load())
+            entry.content_body = '<p>changed</p>'
+            entry.save()
+            self.assertEquals(load(), '<p>changed</p>')
+        finally:
+            blogger_models.RENDERED_CONTENT_CACHE_TIMEOUT = 0
+            translation.deactivate()
+
+        # the admin plugin views that change the content drop it
+        from cms_blogger.caching import get_version
+        Layout.objects.create(**{
+            'from_page': create_page('master', 'page_template.html', 'en'),
+            'content_object': self.blog, 'layout_type': Blog.ALL})
+        admin_url = reverse('admin:cms_blogger_blogentrypage_changelist')
+        plugin_id = entry.get_content_plugin().pk
+        version = get_version('content', entry.content_id)
+        self.assertEquals(self.client.get('%sedit-plugin/%s/' % (
+            admin_url, plugin_id)).status_code, 200)
+        self.assertEquals(get_version('content', entry.content_id), version)
+        self.client.post('%smove-plugin/' % admin_url, {'ids': plugin_id})
+        self.assertNotEquals(
+            get_version('content', entry.content_id), version)
+        version = get_version('content', entry.content_id)
+        self.client.post('%scopy-plugins/' % admin_url, {
+            'placeholder': entry.content_id, 'copy_from': 'de',
+            'language': 'en'})
+        self.assertNotEquals(
+            get_version('content', entry.content_id), version)
+
     def test_title_rendering(self):
         page_for_layouts = create_page(
             'master', 'page_template.html', language='en', published=True)
@@ -952,6 +1670,7 @@ class TestNavigationMenu(BaseMenuTest):
 
     def setUp(self):
         super(TestNavigationMenu, self).setUp()
+        cache.clear()
         self.blog1 = Blog.objects.create(**{
             'in_navigation': True, 'title': '1', 'slug': '1'})
         self.blog2 = Blog.objects.create(**{
@@ -1027,6 +1746,47 @@ class TestNavigationMenu(BaseMenuTest):
         self.assertEquals(len(nodes_texts), 1)
         self.assertEquals(len(self._menu_nodes()[0].children), 0)
 
+    def test_blog_nodes_cache(self):
+        from django.db import connection
+        node = BlogNavigationNode.objects.create(position=0, text='1')
+        self.blog1.navigation_node = node
+        self.blog1.save()
+        self.assertEquals(self._menu_nodes()[0].title, '1')
+        connection.use_debug_cursor = True
+        try:
+            start = len(connection.queries)
+            self.assertEquals(self._menu_nodes()[0].title, '1')
+            self.assertFalse([
+                query for query in connection.queries[start:]
+                if 'cms_blogger_' in query['sql']])
+        finally:
+            connection.use_debug_cursor = False
+        node.text = 'changed'
+        node.save()
+        self.assertEquals(self._menu_nodes()[0].title, 'changed')
+        node.delete()
+        self.assertEquals(len(self._menu_nodes()), 0)
+
+    def test_prefetch_blogs(self):
+        home_blog = HomeBlog.objects.create(site=Site.objects.get_current())
+        for blog in (self.blog1, self.blog2, home_blog):
+            blog.navigation_node = BlogNavigationNode.objects.create(
+                position=0, text=blog.title[:15])
+            blog.save()
+        orphan = BlogNavigationNode.objects.create(position=0, text='x')
+        nodes = BlogNavigationNode.objects.order_by('id')
+        with self.assertNumQueries(3):
+            nodes = BlogNavigationNode.prefetch_blogs(nodes)
+        with self.assertNumQueries(0):
+            self.assertEquals(
+                [node.blog for node in nodes],
+                [self.blog1, self.blog2, home_blog, None])
+            self.assertEquals(
+                [node.menu_id for node in nodes[:3]],
+                [self.blog1.navigation_node_id * -1,
+                 self.blog2.navigation_node_id * -1, 0])
+            self.assertEquals(orphan.id, nodes[3].id)
+
 
 class TestAuthorModel(TestCase):
 
@@ -1116,7 +1876,439 @@ class TestAuthorModel(TestCase):
 
 
 class TestBlogPageViews(TestCase):
-    pass
+
+    def setUp(self):
+        cache.clear()
+        self.blog = Blog.objects.create(**{
+            'title': 'one title', 'slug': 'one-title'})
+        page_for_layouts = create_page(
+            'master', 'page_template.html', language='en', published=True)
+        Layout.objects.create(**{
+            'from_page': page_for_layouts,
+            'content_object': self.blog,
+            'layout_type': Blog.ALL})
+        self.entry = BlogEntryPage.objects.create(**{
+            'title': 'first', 'blog': self.blog, 'is_published': True,
+            'short_description': 'desc'})
+
+    def test_instrumentation(self):
+        from cms_blogger import instrumentation
+        from cms_blogger.signals import instrumented
+        from django.test.utils import override_settings
+        import StringIO
+        calls = []
+
+        def receiver(name, stats, **kwargs):
+            calls.append((name, stats))
+        instrumented.connect(receiver)
+        url = self.blog.get_absolute_url()
+        try:
+            self.client.get(url)
+            self.assertEquals(calls, [])
+            instrumentation.INSTRUMENTATION = True
+            with override_settings(DEBUG=True):
+                response = self.client.get(url)
+            self.client.get(url)
+            self.client.get(reverse('blogger-sitemap-index'))
+        finally:
+            instrumentation.INSTRUMENTATION = False
+            instrumented.disconnect(receiver)
+        self.assertEquals([name for name, _ in calls],
+                          ['views.landing_page'] * 2 + ['sitemaps.index'])
+        # template responses are rendered while they're measured
+        self.assertTrue(calls[-1][1]['render_time'] > 0)
+        stats = calls[0][1]
+        self.assertTrue(stats['queries'] > 0)
+        self.assertTrue(stats['cache_hits'] + stats['cache_misses'] > 0)
+        self.assertEquals(
+            response['X-Blogger-Queries'], str(stats['queries']))
+        out = StringIO.StringIO()
+        self.assertEquals(
+            dict(instrumentation.get_stats())['views.landing_page']['calls'],
+            2)
+        call_command('blogger_stats', reset=True, stdout=out)
+        self.assertIn('views.landing_page', out.getvalue())
+        self.assertEquals(instrumentation.get_stats(), [])
+
+    def test_benchmark(self):
+        from cms_blogger.benchmark import generate_dataset
+        import json
+        import StringIO
+        out = StringIO.StringIO()
+        call_command('blogger_generate_dataset', blogs=2, entries=5,
+                     categories=2, authors=2, navigation_nodes=1, layouts=2,
+                     moved_entries=3, stdout=out)
+        self.assertIn('15 entries', out.getvalue())
+        self.assertEquals(Blog.objects.filter(in_navigation=True).count(), 1)
+        blog = Blog.objects.get(slug='benchmark-seed-0-0')
+        self.assertEquals(blog.published_entries_count, 5)
+        # the same seed generates the same data
+        with self.assertRaises(ValueError):
+            generate_dataset(seed=0)
+        generate_dataset(blogs=2, entries=5, categories=2, authors=2,
+                         navigation_nodes=1, layouts=2, moved_entries=3,
+                         prefix='copy')
+        self.assertEquals(
+            list(blog.blogentrypage_set.order_by('id').values_list(
+                'title', 'slug', 'publication_date')),
+            list(Blog.objects.get(
+                slug='benchmark-copy-0').blogentrypage_set.order_by(
+                'id').values_list('title', 'slug', 'publication_date')))
+        source = Blog.objects.get(slug='benchmark-copy-move-source')
+        moved_before = list(source.blogentrypage_set.order_by(
+            'id').values_list('id', 'slug', 'categories'))
+        categories_before = list(BlogCategory.objects.order_by(
+            'id').values_list('id', flat=True))
+
+        out = StringIO.StringIO()
+        call_command('blogger_benchmark', iterations=1, warmup=0,
+                     move_size=2, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEquals(set(report['results']), set([
+            'landing_page', 'deep_pagination', 'search', 'category_page',
+            'entry_page', 'feed', 'sitemap', 'sitemap_section',
+            'river_plugin', 'menu', 'move_entries']))
+        for name in ('landing_page', 'category_page', 'entry_page', 'feed'):
+            self.assertEquals(report['results'][name]['statuses'],
+                              {'200': 1})
+        # the moved entries are back in their blog, with the same slugs and
+        #   categories
+        self.assertEquals(list(source.blogentrypage_set.order_by(
+            'id').values_list('id', 'slug', 'categories')), moved_before)
+        self.assertEquals(list(BlogCategory.objects.order_by(
+            'id').values_list('id', flat=True)), categories_before)
+
+    def test_page_cache(self):
+        from cms_blogger import caching
+        caching.PAGE_CACHE_TIMEOUT = 60
+        try:
+            url = self.blog.get_absolute_url()
+            self.assertContains(self.client.get(url), 'first')
+            # updates that don't trigger any signals are not visible
+            BlogEntryPage.objects.update(title='second')
+            self.assertContains(self.client.get(url), 'first')
+            self.entry.title = 'third'
+            self.entry.save()
+            self.assertContains(self.client.get(url), 'third')
+
+            BlogEntryPage.objects.update(title='fourth')
+            User.objects.create_superuser(
+                'admin', 'admin@cms_blogger.com', 'secret')
+            self.client.login(username='admin', password='secret')
+            self.assertContains(self.client.get(url), 'fourth')
+        finally:
+            caching.PAGE_CACHE_TIMEOUT = 0
+
+    def test_page_cache_menu_and_cold_misses(self):
+        from cms_blogger import caching
+        from django.test.client import RequestFactory
+        caching.PAGE_CACHE_TIMEOUT = 60
+        try:
+            url = self.blog.get_absolute_url()
+            self.assertContains(self.client.get(url), 'first')
+            BlogEntryPage.objects.update(title='second')
+            # other blogs changes are displayed by the menu
+            node = BlogNavigationNode.objects.create(position=0, text='nav')
+            Blog.objects.create(
+                title='other', slug='other', navigation_node=node)
+            self.assertContains(self.client.get(url), 'second')
+
+            # requests wait for the page that is rendered by the request
+            #   that holds the lock
+            cache.clear()
+            key = caching._page_cache_key(RequestFactory().get(url))
+            cache.add('%s_lock' % key, 1)
+
+            class Time(object):
+                time = staticmethod(caching.time.time)
+
+                @staticmethod
+                def sleep(seconds):
+                    cache.set(key, {
+                        'version': [], 'expires': 0, 'status': 200,
+                        'content': 'rendered elsewhere', 'headers': []})
+            real_time, caching.time = caching.time, Time
+            try:
+                self.assertEquals(
+                    self.client.get(url).content, 'rendered elsewhere')
+            finally:
+                caching.time = real_time
+        finally:
+            caching.PAGE_CACHE_TIMEOUT = 0
+
+    def test_page_cache_logged_in_users(self):
+        from cms_blogger import caching
+        caching.PAGE_CACHE_TIMEOUT = 60
+        try:
+            url = self.blog.get_absolute_url()
+            User.objects.create_user('reader', 'reader@blogger.com', 'a')
+            self.client.login(username='reader', password='a')
+            self.assertContains(self.client.get(url), 'first')
+            BlogEntryPage.objects.update(title='second')
+            # the logged in user's page was neither served from nor stored
+            #   in the cache
+            self.assertContains(self.client.get(url), 'second')
+            self.client.logout()
+            self.assertContains(self.client.get(url), 'second')
+        finally:
+            caching.PAGE_CACHE_TIMEOUT = 0
+
+    def _feed_queries(self):
+        from django.db import connection
+        connection.use_debug_cursor = True
+        try:
+            # queries get reset when the request starts; the cms middlewares
+            #   queries are not counted
+            response = self.client.get(self.blog.get_feed_url())
+            self.assertEquals(response.status_code, 200)
+            queries = [query for query in connection.queries
+                       if 'cms_blogger_' in query['sql']]
+            return len(queries), response
+        finally:
+            connection.use_debug_cursor = False
+
+    def test_feed_queries(self):
+        from cms_blogger import feeds
+        user = User.objects.create_user('author', 'author@blogger.com', 'a')
+        author = Author.objects.create(user=user)
+        category = BlogCategory.objects.create(name='cat', blog=self.blog)
+        self.entry.authors.add(author)
+        category.entries.add(self.entry)
+        queries, response = self._feed_queries()
+        self.assertIn('author@blogger.com', response.content)
+        self.assertIn('<category>cat</category>', response.content)
+        for i in range(3):
+            entry = BlogEntryPage.objects.create(**{
+                'title': 'entry %s' % i, 'blog': self.blog,
+                'is_published': True, 'short_description': 'desc'})
+            entry.authors.add(author)
+            category.entries.add(entry)
+        cache.clear()
+        self.assertEquals(self._feed_queries()[0], queries)
+
+        feeds.FEED_CACHE_TIMEOUT = 60
+        try:
+            self._feed_queries()
+            self.assertEquals(self._feed_queries()[0], 0)
+            self.entry.title = 'changed title'
+            self.entry.save()
+            self.assertIn('changed title', self._feed_queries()[1].content)
+        finally:
+            feeds.FEED_CACHE_TIMEOUT = 0
+
+    def test_layouts_cache(self):
+        layout = self.blog.get_layout_for(Blog.ENTRY_PAGE)
+        self.assertEquals(layout.layout_type, Blog.ALL)
+        blog = Blog.objects.get(pk=self.blog.pk)
+        with self.assertNumQueries(0):
+            cached = blog.get_layout_for(Blog.ENTRY_PAGE)
+            self.assertEquals(cached.pk, layout.pk)
+            self.assertEquals(cached.from_page.pk, layout.from_page.pk)
+            self.assertIsNot(cached, blog.get_layout_for(Blog.ENTRY_PAGE))
+        entry_layout = Layout.objects.create(**{
+            'from_page': layout.from_page, 'content_object': self.blog,
+            'layout_type': Blog.ENTRY_PAGE})
+        self.assertEquals(
+            blog.get_layout_for(Blog.ENTRY_PAGE).pk, entry_layout.pk)
+        self.assertEquals(
+            blog.get_layout_for(Blog.LANDING_PAGE).pk, layout.pk)
+        entry_layout.delete()
+        self.assertEquals(
+            blog.get_layout_for(Blog.ENTRY_PAGE).pk, layout.pk)
+
+    def test_entries_summaries_cache(self):
+        from cms_blogger.templatetags import blogger
+        blogger.ENTRY_SUMMARY_CACHE_TIMEOUT = 60
+        try:
+            url = self.blog.get_absolute_url()
+            self.assertContains(self.client.get(url), 'first')
+            # updates that don't change modified_at are not visible
+            BlogEntryPage.objects.update(title='second')
+            response = self.client.get(url)
+            self.assertContains(response, 'first')
+            self.assertContains(response, 'Posted by <span class="author">')
+            self.entry.title = 'third'
+            self.entry.save()
+            self.assertContains(self.client.get(url), 'third')
+
+            self.entry.authors.add(Author.objects.create(name='Ann'))
+            self.assertContains(
+                self.client.get(url), '<span class="author">Ann</span>')
+            self.blog.enable_twitter = not self.blog.enable_twitter
+            self.blog.save()
+            self.assertEquals(
+                'twitter social' in self.client.get(url).content,
+                self.blog.enable_twitter)
+        finally:
+            blogger.ENTRY_SUMMARY_CACHE_TIMEOUT = 0
+
+    def test_entries_authors(self):
+        from cms_blogger import models as blogger_models, managers
+        user = User.objects.create_user('jdoe', 'jdoe@blogger.com', 'a')
+        authors = [Author.objects.create(user=user),
+                   Author.objects.create(name='Ann')]
+        entries = [self.entry]
+        for i in range(3):
+            entries.append(BlogEntryPage.objects.create(**{
+                'title': 'entry %s' % i, 'blog': self.blog,
+                'is_published': True, 'short_description': 'desc'}))
+        for entry in entries:
+            entry.authors.add(*authors)
+        entries_qs = BlogEntryPage.objects.filter(
+            id__in=[entry.pk for entry in entries])
+        # entries, authors and users
+        with self.assertNumQueries(3):
+            names = [entry.authors_display_name
+                     for entry in entries_qs.with_authors()]
+        self.assertEquals(len(set(names)), 1)
+        self.assertIn(
+            names[0], ('jdoe@blogger.com, Ann', 'Ann, jdoe@blogger.com'))
+        self.assertEquals(
+            set(entries_qs.values_list('authors_display', flat=True)),
+            set(names))
+
+        user.first_name, user.last_name = 'John', 'Doe'
+        user.save()
+        # users names changes are not tracked while the column is not used
+        self.assertEquals(
+            set(entries_qs.values_list('authors_display', flat=True)),
+            set(names))
+        blogger_models.DENORMALIZED_AUTHORS_DISPLAY = True
+        try:
+            call_command('blogger_rebuild_authors_display', verbosity=0)
+            self.assertTrue(all(
+                'John Doe' in display for display in entries_qs.values_list(
+                    'authors_display', flat=True)))
+            # the entries are not updated when the users names don't change
+            #   (e.g. on login); the user is fetched and saved
+            user.last_login = timezone.now()
+            with self.assertNumQueries(3):
+                user.save()
+            user.last_name = 'Dough'
+            user.save()
+            self.assertIn('John Dough', BlogEntryPage.objects.get(
+                pk=self.entry.pk).authors_display)
+            user.last_name = 'Doe'
+            user.save()
+        finally:
+            blogger_models.DENORMALIZED_AUTHORS_DISPLAY = False
+        authors[1].name = 'Anne'
+        authors[1].save()
+        self.entry.authors.remove(authors[0])
+        displays = dict(entries_qs.values_list('id', 'authors_display'))
+        self.assertEquals(displays.pop(self.entry.pk), 'Anne')
+        self.assertEquals(len(set(displays.values())), 1)
+        self.assertIn(
+            displays.values()[0], ('John Doe, Anne', 'Anne, John Doe'))
+        authors[1].blog_entries.clear()
+        self.assertEquals(
+            set(entries_qs.values_list('authors_display', flat=True)),
+            set(['', 'John Doe']))
+
+        blogger_models.DENORMALIZED_AUTHORS_DISPLAY = True
+        managers.DENORMALIZED_AUTHORS_DISPLAY = True
+        try:
+            with self.assertNumQueries(1):
+                names = [entry.authors_display_name
+                         for entry in entries_qs.with_authors()]
+            self.assertEquals(sorted(names), ['', 'John Doe', 'John Doe',
+                                              'John Doe'])
+        finally:
+            blogger_models.DENORMALIZED_AUTHORS_DISPLAY = False
+            managers.DENORMALIZED_AUTHORS_DISPLAY = False
+
+    def test_search(self):
+        from cms_blogger import search
+        from cms_blogger.models import SearchTerm
+        # the default backend matches substrings
+        self.assertIsInstance(
+            search.get_search_backend(), search.ContainsSearchBackend)
+        search.SEARCH_BACKEND = 'cms_blogger.search.IndexSearchBackend'
+        try:
+            entries = {}
+            for title, description in (('Rust and Python', 'python tips'),
+                                       ('Cooking', 'python recipes'),
+                                       ('Python', 'unpublished python')):
+                entries[title] = BlogEntryPage.objects.create(**{
+                    'title': title, 'blog': self.blog, 'is_published': True,
+                    'short_description': description})
+            BlogEntryPage.objects.filter(
+                pk=entries['Python'].pk).update(is_published=False)
+            BlogEntryPage.objects.update_live_state()
+            self.assertFalse(
+                SearchTerm.objects.filter(entry=entries['Python']).exists())
+            self.assertEquals(dict(SearchTerm.objects.filter(
+                entry=entries['Rust and Python']).values_list(
+                'term', 'weight')),
+                {'rust': 3, 'and': 3, 'python': 4, 'tips': 1})
+
+            backend = search.get_search_backend()
+            blog_entries = self.blog.get_entries()
+            # ranked by the terms weights
+            self.assertEquals(backend.search(blog_entries, 'PYTHON'), [
+                entries['Rust and Python'].pk, entries['Cooking'].pk])
+            self.assertEquals(
+                backend.search(blog_entries, 'python "recipes"'),
+                [entries['Cooking'].pk])
+            self.assertEquals(backend.search(blog_entries, 'pyth'), [])
+            self.assertEquals(backend.search(blog_entries.exclude(
+                pk=entries['Cooking'].pk), 'recipes'), [])
+            response = self.client.get(
+                self.blog.get_absolute_url(), {'q': 'python'})
+            self.assertContains(response, 'Rust and Python')
+            self.assertContains(response, 'Cooking')
+            self.assertNotContains(response, 'first')
+
+            entries['Cooking'].title = 'Cooking Python'
+            entries['Cooking'].save()
+            self.assertEquals(backend.search(blog_entries, 'python')[0],
+                              entries['Cooking'].pk)
+        finally:
+            search.SEARCH_BACKEND = 'cms_blogger.search.ContainsSearchBackend'
+
+        self.assertEquals(
+            set(search.get_search_backend().search(blog_entries, 'pyth')),
+            set([entries['Rust and Python'].pk, entries['Cooking'].pk]))
+        self.assertContains(self.client.get(
+            self.blog.get_absolute_url(), {'q': 'pyth'}), 'Rust and Python')
+
+    def test_conditional_get(self):
+        for url in (self.blog.get_absolute_url(), self.blog.get_feed_url()):
+            response = self.client.get(url)
+            self.assertEquals(response.status_code, 200)
+            etag = response['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEquals(response.status_code, 304)
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEquals(response.status_code, 304)
+
+        etag = self.client.get(self.blog.get_absolute_url())['ETag']
+        BlogEntryPage.objects.update(is_published=False)
+        BlogEntryPage.objects.update_live_state()
+        response = self.client.get(
+            self.blog.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+
+    def test_conditional_get_layouts_and_menus(self):
+        url = self.blog.get_absolute_url()
+
+        def is_modified(change):
+            etag = self.client.get(url)['ETag']
+            self.assertEquals(self.client.get(
+                url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            change()
+            return self.client.get(
+                url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+        layout = self.blog.get_layout_for(Blog.LANDING_PAGE)
+        self.assertTrue(is_modified(lambda: layout.from_page.save()))
+        node = BlogNavigationNode.objects.create(position=0, text='nav')
+        other = Blog.objects.create(
+            title='other', slug='other', navigation_node=node)
+        self.assertTrue(is_modified(lambda: other.save()))
+        node.text = 'renamed'
+        self.assertTrue(is_modified(lambda: node.save()))
 
 
 class TestSitemap(TestCase):
@@ -1297,3 +2489,41 @@ class TestSitemap(TestCase):
         self.assertEqual(len(locations), len(lastmods))
         for lastmod in lastmods:
             self.assertIsNot(lastmod, None)
+
+    def test_sitemap_index(self):
+        cache.clear()
+        blog = Blog.objects.create(title='test_blog', slug='test_blog')
+        Blog.objects.create(title='empty_blog', slug='empty_blog')
+        entry = self.make_entry(blog, suffix='one')
+        self.make_entry(blog, suffix='draft', is_published=False)
+        category = self.make_category(blog, 'category', entry)
+        response = self.client.get(reverse('blogger-sitemap-index'))
+        self.assertEqual(response.status_code, 200)
+        sections = map(self.url_path, self.sitemap_locations(
+            response.content))
+        self.assertEqual(sections, [
+            reverse('blogger-sitemap-section', args=[section])
+            for section in ('blogs', 'entries-%s' % blog.pk,
+                            'categories-%s' % blog.pk)])
+        self.assertEqual(len(self.sitemap_lastmods(response.content)), 3)
+
+        response = self.client.get(sections[1])
+        locations = self.sitemap_locations(response.content)
+        self.assertEqual(len(locations), 1)
+        self.assert_blogentry_location(entry, locations[0])
+        response = self.client.get(sections[2])
+        locations = self.sitemap_locations(response.content)
+        self.assertEqual(len(locations), 1)
+        self.assert_blogcategory_location(category, locations[0])
+        response = self.client.get(sections[0])
+        self.assertEqual(len(self.sitemap_locations(response.content)), 2)
+        self.assertEqual(self.client.get(reverse(
+            'blogger-sitemap-section', args=['entries-0'])).status_code, 404)
+
+        # new content shows up in the cached index
+        other = Blog.objects.create(title='other_blog', slug='other_blog')
+        self.make_entry(other, suffix='other')
+        response = self.client.get(reverse('blogger-sitemap-index'))
+        self.assertIn(
+            reverse('blogger-sitemap-section', args=['entries-%s' % other.pk]),
+            map(self.url_path, self.sitemap_locations(response.content)))
@@ -1,6 +1,7 @@
 from django.conf.urls import patterns, include, url
 from django.contrib.sitemaps.views import sitemap
 from cms_blogger.sitemaps import BloggerSitemap
+from cms_blogger.sitemaps import views as sitemaps_views
 
 from django.contrib import admin
 admin.autodiscover()
@@ -17,4 +18,8 @@ urlpatterns = patterns('',
     url(r'^', include('cms_blogger.urls')),
     url(r'^', include('cms.urls')),
     url(r'^sitemap.xml$', sitemap, sitemap_params, name='blogger-sitemap'),
+    url(r'^blogger-sitemap.xml$', sitemaps_views.index,
+        name='blogger-sitemap-index'),
+    url(r'^blogger-sitemap-(?P<section>[\w-]+)\.xml$',
+        sitemaps_views.sitemap, name='blogger-sitemap-section'),
 )
@@ -1,15 +1,26 @@
 from PIL import Image as PILImage
 from functools import wraps
-import StringIO
+import base64
+import hashlib
+import json
+import math
 import os
-from django.utils.encoding import smart_unicode
+import tempfile
+from django.utils.encoding import smart_unicode, smart_str
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.core.files.base import ContentFile
+from django.core.files.base import File
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.contrib.sites.models import Site
 from django.conf import settings as global_settings
+from django.db.models import Q
+from django.db.models.sql.datastructures import EmptyResultSet
 from filer.utils.loader import load_object
 from .settings import (
-    POSTER_IMAGE_WIDTH, POSTER_IMAGE_ASPECT_RATIO, ALLOWED_SITES_FOR_USER)
+    POSTER_IMAGE_WIDTH, POSTER_IMAGE_ASPECT_RATIO, ALLOWED_SITES_FOR_USER,
+    KEYSET_PAGINATION, PAGINATION_COUNT_CACHE_TIMEOUT,
+    POSTER_IMAGE_RENDITION_WIDTHS, POSTER_IMAGE_RENDITION_FORMATS,
+    POSTER_IMAGE_MAX_PIXELS, POSTER_IMAGE_MEMORY_BUDGET)
 
 
 def get_allowed_sites(request, model=None):
@@ -64,8 +75,216 @@ def user_display_name(user):
         return smart_unicode(user)
 
 
-def paginate_queryset(queryset, page, max_per_page):
+class KeysetPage(object):
+    """
+    Page of a KeysetPaginator. Exposes the same interface as django's Page
+        so templates can render any of them; the previous/next page
+        "numbers" are cursors that point to the neighbour pages.
+    """
+
+    def __init__(self, object_list, number, paginator, has_previous,
+                 has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return '<Page %s>' % self.number
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self):
+        return self.paginator.encode_cursor(
+            self.number + 1, True, self.object_list[-1])
+
+    def previous_page_number(self):
+        return self.paginator.encode_cursor(
+            self.number - 1, False, self.object_list[0])
+
+    def last_page_number(self):
+        return self.paginator.encode_cursor(self.paginator.num_pages, False)
+
+
+class KeysetPaginator(object):
+    """
+    Seek based paginator. Instead of counting all the rows and skipping
+        the previous pages with OFFSET it filters the rows that come
+        after(or before) the boundary row of the current page, so every
+        page costs the same no matter how deep it is.
+    Pages are addressed by opaque cursors that hold the page number and
+        the ordering values of the boundary row. Plain page numbers are
+        still accepted(OFFSET based) for the numbered page links which are
+        computed from a cached approximate count.
+    """
+    ordering = ('-publication_date', 'slug', 'pk')
+
+    def __init__(self, queryset, per_page, ordering=None, count=None):
+        self.ordering = ordering or self.ordering
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = int(per_page)
+        self._count = count
+        self._num_pages = None
+
+    def _field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _model_field(self, name):
+        opts = self.queryset.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def encode_cursor(self, number, forward, obj=None):
+        values = None
+        if obj is not None:
+            values = []
+            for name in self._field_names():
+                value = getattr(obj, name)
+                if hasattr(value, 'isoformat'):
+                    value = value.isoformat()
+                values.append(value)
+        data = json.dumps([number, int(forward), values])
+        return base64.urlsafe_b64encode(data).rstrip('=')
+
+    def decode_cursor(self, cursor):
+        cursor = smart_str(cursor)
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        number, forward, values = json.loads(data)
+        if values is not None:
+            values = [self._model_field(name).to_python(value)
+                      for name, value in zip(self._field_names(), values)]
+        return int(number), bool(forward), values
+
+    def _seek_query(self, values, forward):
+        # (a, b) after (x, y) <=> a after x OR (a = x AND b after y)
+        query, equal_to = Q(), {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') == forward else 'gt'
+            lookup_kwargs = {'%s__%s' % (name, lookup): value}
+            lookup_kwargs.update(equal_to)
+            query |= Q(**lookup_kwargs)
+            equal_to[name] = value
+        return query
+
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else '-%s' % field
+                for field in self.ordering]
+
+    @property
+    def count(self):
+        """
+        Approximate number of rows, unless the caller knows it already.
+            It is cached for a few minutes under a key computed from the
+            query so it can be shared between requests.
+        """
+        if self._count is not None:
+            return self._count
+        try:
+            sql, params = self.queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = 'cms_blogger_count_%s' % hashlib.md5(
+            smart_str(sql % tuple(params))).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count, PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def _get_num_pages(self):
+        if self._num_pages is None:
+            self._num_pages = max(
+                1, int(math.ceil(self.count / float(self.per_page))))
+        return self._num_pages
+
+    def _set_num_pages(self, value):
+        self._num_pages = value
+
+    num_pages = property(_get_num_pages, _set_num_pages)
+
+    def _offset_page(self, number):
+        offset = (number - 1) * self.per_page
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            # out of range, deliver last page of results
+            return self._seek_page(self.num_pages, False, None)
+        has_next = len(rows) > self.per_page
+        return rows[:self.per_page], number, number > 1, has_next
+
+    def _seek_page(self, number, forward, values):
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek_query(values, forward))
+        limit = self.per_page
+        if not forward:
+            queryset = queryset.order_by(*self._reversed_ordering())
+            if values is None:
+                # the last page holds the rows left after the full pages,
+                #   like the numbered pages
+                limit = self.count % self.per_page or self.per_page
+        rows = list(queryset[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if forward:
+            return rows, number, True, has_more
+        rows.reverse()
+        return rows, number, has_more, values is not None
+
+    def page(self, value):
+        try:
+            number = int(value or 1)
+        except (TypeError, ValueError):
+            number = None
+        if number is not None:
+            page_data = self._offset_page(max(number, 1))
+        else:
+            try:
+                page_data = self._seek_page(*self.decode_cursor(value))
+            except (TypeError, ValueError, ValidationError):
+                # missing or broken cursor, deliver first page.
+                page_data = self._offset_page(1)
+        rows, number, has_previous, has_next = page_data
+        if not rows and number > 1:
+            # the boundary rows are gone, start over.
+            rows, number, has_previous, has_next = self._offset_page(1)
+        if not has_previous:
+            number = 1
+        # keep page numbers consistent with the approximate count
+        if not has_next:
+            self.num_pages = number
+        elif self.num_pages <= number:
+            self.num_pages = number + 1
+        return KeysetPage(rows, number, self, has_previous, has_next)
+
+
+def paginate_queryset(queryset, page, max_per_page, count=None):
+    """
+    count can be passed when the number of items is known beforehand(e.g.
+        the blogs entries counters) in order to skip the COUNT query.
+    """
+    if KEYSET_PAGINATION:
+        return KeysetPaginator(queryset, max_per_page, count=count).page(page)
     paginator = Paginator(queryset, max_per_page)
+    if count is not None:
+        paginator._count = count
+    return _get_page(paginator, page)
+
+
+def _get_page(paginator, page):
     try:
         paginated_items = paginator.page(page)
     except PageNotAnInteger:
@@ -77,8 +296,90 @@ def paginate_queryset(queryset, page, max_per_page):
     return paginated_items
 
 
+def paginate_ids(ids, queryset, page, max_per_page):
+    """
+    Paginates a list of ids(e.g. ranked search results) without counting
+        anything; only the objects of the requested page are fetched from
+        the queryset and they keep the order of the ids.
+    """
+    paginated_items = _get_page(Paginator(ids, max_per_page), page)
+    page_ids = paginated_items.object_list
+    objects = dict((obj.pk, obj) for obj in queryset.filter(pk__in=page_ids))
+    paginated_items.object_list = [
+        objects[pk] for pk in page_ids if pk in objects]
+    return paginated_items
+
+
 POSTER_IMAGE_HEIGHT = int(round(
     POSTER_IMAGE_WIDTH / POSTER_IMAGE_ASPECT_RATIO))
+# the largest size uploads get scaled down to: the poster image or the
+#   largest rendition. Uploads are checked against it so the ones that
+#   pass the check can be processed.
+PROCESSING_WIDTH = max(
+    [POSTER_IMAGE_WIDTH] + list(POSTER_IMAGE_RENDITION_WIDTHS))
+PROCESSING_SIZE = (PROCESSING_WIDTH, int(round(
+    PROCESSING_WIDTH / POSTER_IMAGE_ASPECT_RATIO)))
+
+
+# encoded images larger than this are spooled to a temporary file instead
+#   of being kept in memory until the storage reads them
+SPOOLED_IMAGE_MAX_SIZE = 1024 * 1024
+
+
+def image_memory_usage(pil_image, target_size):
+    """
+    Estimated peak number of bytes needed to scale an opened(not yet
+        decoded) image down to target_size: the decoded image, at the draft
+        scale for jpegs, its RGB(A) copy if it has another mode(see
+        make_renditions) and the target size image. PIL keeps 1 byte per
+        pixel for the single band modes and 4 bytes for the others.
+    """
+    width, height = pil_image.size
+    pixels = width * height
+    usage = pixels * (1 if pil_image.mode in ('1', 'L', 'P') else 4)
+    if pil_image.mode not in ('RGB', 'RGBA'):
+        usage += 4 * pixels
+    return usage + 4 * target_size[0] * target_size[1]
+
+
+def open_image(file_like_object, target_size):
+    """
+    Opens an image that is going to be scaled down to target_size without
+        decoding more pixels than needed: jpegs get decoded at the smallest
+        scale(1/2, 1/4 or 1/8) that is still larger than target_size.
+    Images with more than POSTER_IMAGE_MAX_PIXELS pixels or that need more
+        than POSTER_IMAGE_MEMORY_BUDGET bytes to be processed are refused
+        before being decoded; only their header is read.
+    """
+    file_like_object.seek(0)
+    pil_img = PILImage.open(file_like_object)
+    img_width, img_height = pil_img.size
+    if img_width * img_height > POSTER_IMAGE_MAX_PIXELS:
+        raise Exception('Image is too large: %sx%s pixels' % (
+            img_width, img_height))
+    pil_img.draft(pil_img.mode, target_size)
+    if image_memory_usage(pil_img, target_size) > POSTER_IMAGE_MEMORY_BUDGET:
+        raise Exception('Image is too large: %sx%s pixels' % (
+            img_width, img_height))
+    return pil_img
+
+
+def check_image(file_like_object, target_size=None):
+    # raises an exception if the image can't be processed
+    open_image(file_like_object, target_size or PROCESSING_SIZE)
+    file_like_object.seek(0)
+
+
+def _to_django_file(pil_image, filename, **options):
+    # the encoded image is written once; django reads it from the spooled
+    #   file when it gets saved to the storage
+    image_file = tempfile.SpooledTemporaryFile(max_size=SPOOLED_IMAGE_MAX_SIZE)
+    image_format = os.path.splitext(filename)[1][1:].replace('jpg', 'jpeg')
+    pil_image.save(image_file, image_format.upper(), **options)
+    dj_file = File(image_file, name=filename)
+    dj_file.size = image_file.tell()
+    image_file.seek(0)
+    return dj_file
 
 
 def resize_image(file_like_object):
@@ -87,34 +388,18 @@ def resize_image(file_like_object):
     Returns a django like image that can be passed to a
         django file/image field.
     """
-
-    def _to_django_file(pil_image, filename):
-        # convert PIL Image to a django content file
-        thumb_io = StringIO.StringIO()
-        setattr(thumb_io, 'name', filename)
-        pil_image.save(thumb_io)
-        dj_file = ContentFile(thumb_io.getvalue(), name=filename)
-        if not file_like_object.closed:
-            file_like_object.close()
-        return dj_file
-
     full_file_name = file_like_object.name
     filename, _ = os.path.splitext(os.path.basename(full_file_name))
-    file_like_object.seek(0)
+    fixed_width, fixed_height = POSTER_IMAGE_WIDTH, POSTER_IMAGE_HEIGHT
+    fixed_size = (fixed_width, fixed_height)
     try:
-        pil_img = PILImage.open(file_like_object)
+        pil_img = open_image(file_like_object, fixed_size)
     except Exception as e:
         raise Exception('Cannot open image %s. Error occured: %s' % (
             full_file_name, e))
 
-    pil_img.load()  # make sure PIL has read the data
-
-    # prepare sizes
-    img_width, img_height = pil_img.size
-    fixed_width, fixed_height = POSTER_IMAGE_WIDTH, POSTER_IMAGE_HEIGHT
-    fixed_size = (fixed_width, fixed_height)
-
     # make it smaller if too large, preserving its aspect ratio
+    img_width, img_height = pil_img.size
     if (img_width > fixed_width or img_height > fixed_height):
         pil_img.thumbnail(fixed_size, PILImage.ANTIALIAS)
 
@@ -128,6 +413,88 @@ def resize_image(file_like_object):
     start_at_x = (fixed_width - img_width) / 2
     start_at_y = (fixed_height - img_height) / 2
     background_img.paste(pil_img, (start_at_x, start_at_y))
+    del pil_img
 
-    return _to_django_file(
+    dj_file = _to_django_file(
         background_img, ''.join((filename, os.path.extsep, 'png')))
+    if not file_like_object.closed:
+        file_like_object.close()
+    return dj_file
+
+
+def _has_alpha(pil_image):
+    return (pil_image.mode in ('RGBA', 'LA') or
+            (pil_image.mode == 'P' and 'transparency' in pil_image.info))
+
+
+def _rendition_formats(with_alpha):
+    PILImage.init()
+    formats = []
+    for image_format in POSTER_IMAGE_RENDITION_FORMATS:
+        if image_format == 'jpeg' and with_alpha:
+            image_format = 'png'
+        if image_format.upper() in PILImage.SAVE and \
+                image_format not in formats:
+            formats.append(image_format)
+    return formats
+
+
+def _boxed(pil_image, image_size, box_size, background):
+    # the image scaled to image_size, in the center of a box_size image
+    boxed_img = PILImage.new('RGBA', box_size, background)
+    boxed_img.paste(pil_image.resize(image_size, PILImage.ANTIALIAS), (
+        (box_size[0] - image_size[0]) / 2, (box_size[1] - image_size[1]) / 2))
+    return boxed_img
+
+
+def make_renditions(file_like_object):
+    """
+    Scales the image down to fit in the poster image aspect ratio box of each
+        of the rendition widths, keeping its aspect ratio, for each of the
+        rendition formats. Like the poster image(see resize_image), images
+        are never upscaled and are centered in their boxes, on a transparent
+        background or, for the formats without transparency, a white one.
+    Returns (width, height, format, django file) tuples, grouped by format.
+    """
+    filename, _ = os.path.splitext(os.path.basename(file_like_object.name))
+    widths = sorted(set(POSTER_IMAGE_RENDITION_WIDTHS))
+    pil_img = open_image(file_like_object, PROCESSING_SIZE)
+    with_alpha = _has_alpha(pil_img)
+    mode = 'RGBA' if with_alpha else 'RGB'
+    if pil_img.mode != mode:
+        pil_img = pil_img.convert(mode)
+
+    img_width, img_height = pil_img.size
+    sizes = []
+    for width in widths:
+        box_size = (width, int(round(width / POSTER_IMAGE_ASPECT_RATIO)))
+        scale = min(float(box_size[0]) / img_width,
+                    float(box_size[1]) / img_height)
+        # the image is smaller than the box; it's centered at its own size
+        scale = min(scale, 1)
+        sizes.append((box_size, (max(1, int(round(img_width * scale))),
+                                 max(1, int(round(img_height * scale))))))
+        if scale == 1:
+            break
+
+    renditions = []
+    for image_format in _rendition_formats(with_alpha):
+        transparent = image_format != 'jpeg'
+        for box_size, image_size in sizes:
+            boxed_img = _boxed(pil_img, image_size, box_size, (
+                255, 255, 255, 0 if transparent else 255))
+            if not transparent:
+                boxed_img = boxed_img.convert('RGB')
+            name = '%s_%sw.%s' % (filename, box_size[0], image_format.replace(
+                'jpeg', 'jpg'))
+            renditions.append(box_size + (image_format, _to_django_file(
+                boxed_img, name, quality=85)))
+            del boxed_img
+    return renditions
+
+
+def poster_image_files(poster_image, renditions):
+    # storage names of a poster image and of its renditions(the json list
+    #   kept on the entry)
+    files = [rendition['name'] for rendition in json.loads(renditions or '[]')]
+    return filter(None, [poster_image] + files)
@@ -2,12 +2,17 @@ from django.http import Http404, HttpResponseNotFound
 from django.template.context import RequestContext
 from django.shortcuts import get_object_or_404
 from django.contrib.sites.models import Site
-from django.db.models import Q
+from django.core.cache import cache
+from django.views.decorators.http import condition
 from cms_layouts.layout_response import LayoutResponse
 from .models import BlogEntryPage, Blog, HomeBlog, BlogCategory
 from .settings import POSTS_ON_LANDING_PAGE
-from .utils import paginate_queryset
-import re
+from .search import get_search_backend
+from .utils import paginate_queryset, paginate_ids
+from .caching import (
+    versioned_cache_page, blog_id_cache_key, get_version, VERSION_TIMEOUT)
+from .instrumentation import instrument
+import hashlib
 
 
 def get_blog_or_404(slug):
@@ -17,6 +22,77 @@ def get_blog_or_404(slug):
     return get_object_or_404(Blog, slug=slug, site=site)
 
 
+def blog_page_version(request, blog_slug=None, **kwargs):
+    # all blog pages get invalidated when their blog changes; the super
+    #   landing page when any blog from its site changes
+    site = Site.objects.get_current()
+    if not blog_slug:
+        return ('site', site.pk)
+    # blogs ids are cached in order to not query the blog on each request
+    key = blog_id_cache_key(site.pk, blog_slug)
+    blog_id = cache.get(key)
+    if blog_id is None:
+        blog_id = Blog.objects.filter(
+            site=site, slug=blog_slug).values_list('id', flat=True)
+        blog_id = blog_id[0] if blog_id else 0
+        cache.set(key, blog_id, VERSION_TIMEOUT)
+    return ('blog', blog_id) if blog_id else None
+
+
+def blog_page_versions(request, blog_slug=None, **kwargs):
+    # the blog pages also display the site menu
+    version_key = blog_page_version(request, blog_slug)
+    if version_key is None:
+        return None
+    return [version_key, ('menu', Site.objects.get_current().pk)]
+
+
+def blog_last_modified(request, blog_slug=None, **kwargs):
+    """
+    Returns the last time anything displayed by the blog pages changed.
+        Blog.modified_at gets updated whenever its entries, categories or
+        layouts change and the super landing page modified_at whenever any
+        blog from its site changes. Menu changes touch all the blogs from
+        the site.
+    The result is memoized on the request since it is needed for both the
+        Last-Modified and the ETag headers and it is cached until the blog
+        pages or the site menu version changes.
+    """
+    if not hasattr(request, '_blog_last_modified'):
+        last_modified = None
+        user = getattr(request, 'user', None)
+        version_key = blog_page_version(request, blog_slug)
+        # staff users may see previews or draft content
+        if version_key and not (user and user.is_staff):
+            site_id = Site.objects.get_current().pk
+            key = 'cms_blogger_last_modified_%s_%s_%s_%s' % (
+                version_key + (get_version(*version_key),
+                               get_version('menu', site_id)))
+            last_modified = cache.get(key)
+            if last_modified is None:
+                model = Blog if blog_slug else HomeBlog
+                lookup = {'slug': blog_slug} if blog_slug else {}
+                dates = model.objects.filter(
+                    site=site_id, **lookup
+                ).values_list('modified_at', flat=True)[:1]
+                last_modified = dates[0] if dates else None
+                if last_modified is not None:
+                    cache.set(key, last_modified, VERSION_TIMEOUT)
+        request._blog_last_modified = last_modified
+    return request._blog_last_modified
+
+
+def blog_etag(request, *args, **kwargs):
+    last_modified = blog_last_modified(request, *args, **kwargs)
+    if last_modified is None:
+        return None
+    return hashlib.md5(last_modified.isoformat()).hexdigest()
+
+
+blog_condition = condition(
+    etag_func=blog_etag, last_modified_func=blog_last_modified)
+
+
 def get_entries_queryset(request):
     preview = 'preview' in request.GET and request.user.is_staff
     entry_qs = BlogEntryPage.objects.on_site()
@@ -25,6 +101,9 @@ def get_entries_queryset(request):
     return entry_qs
 
 
+@instrument('views.entry_page')
+@blog_condition
+@versioned_cache_page(blog_page_versions)
 def entry_page(request, blog_slug, year, month, day, entry_slug):
     entry_qs = get_entries_queryset(request)
     try:
@@ -39,39 +118,28 @@ def entry_page(request, blog_slug, year, month, day, entry_slug):
     return entry.render_to_response(request)
 
 
-def get_terms(query_string):
-    query_string = query_string.strip()
-    # remove quotes
-    query_string = re.sub('\'|\"', '', query_string)
-    # strip multiple spaces
-    query_string = re.sub('\s{2,}', ' ', query_string)
-    return query_string.split()
-
-
-def get_query(query_string, search_fields):
-    terms = get_terms(query_string)
-    query = Q()
-    for term in terms:
-        term_query = Q()
-        for field_name in search_fields:
-            term_query |= Q(**{"%s__icontains" % field_name: term})
-        query &= term_query
-    return query
-
-
-def _paginate_entries_on_blog(request, entries, blog):
+def _paginate_entries_on_blog(request, entries, blog, count=None):
     search_q = request.GET.get('q')
     extra_params = ''
     if search_q and search_q.strip():
         extra_params = "&q=%s" % search_q.strip()
-        search_fields = ('title', 'short_description')
-        entries = entries.filter(get_query(search_q, search_fields))
+        # the search backend returns the ranked ids of all the matches;
+        #   only the entries of the requested page are fetched
+        entries_ids = get_search_backend().search(entries, search_q)
+        entries = paginate_ids(
+            entries_ids, entries.with_authors(), request.GET.get('page'),
+            POSTS_ON_LANDING_PAGE)
+        return extra_params, entries
 
     entries = paginate_queryset(
-        entries, request.GET.get('page'), POSTS_ON_LANDING_PAGE)
+        entries.with_authors(), request.GET.get('page'),
+        POSTS_ON_LANDING_PAGE, count)
     return extra_params, entries
 
 
+@instrument('views.landing_page')
+@blog_condition
+@versioned_cache_page(blog_page_versions)
 def landing_page(request, blog_slug):
     blog = get_blog_or_404(blog_slug)
 
@@ -82,7 +150,7 @@ def landing_page(request, blog_slug):
             "layout to render.</h1>")
 
     extra_params, entries = _paginate_entries_on_blog(
-        request, blog.get_entries(), blog)
+        request, blog.get_entries(), blog, blog.published_entries_count)
     context = RequestContext(request)
     context['blog'] = blog
     context['entries'] = entries
@@ -91,6 +159,9 @@ def landing_page(request, blog_slug):
         blog, layout, request, context=context).make_response()
 
 
+@instrument('views.category_page')
+@blog_condition
+@versioned_cache_page(blog_page_versions)
 def category_page(request, blog_slug, slug):
     category = get_object_or_404(
         BlogCategory, blog__slug=blog_slug, slug=slug,
@@ -102,7 +173,8 @@ def category_page(request, blog_slug, slug):
             "<h1>This Blog Category Page does not have a "
             "layout to render.</h1>")
     extra_params, entries = _paginate_entries_on_blog(
-        request, category.get_entries(), category.blog)
+        request, category.get_entries(), category.blog,
+        category.published_entries_count)
     context = RequestContext(request)
     context['blog'] = category.blog
     context['entries'] = entries
@@ -111,6 +183,9 @@ def category_page(request, blog_slug, slug):
         category, layout, request, context=context).make_response()
 
 
+@instrument('views.entry_or_bio_page')
+@blog_condition
+@versioned_cache_page(blog_page_versions)
 def entry_or_bio_page(request, blog_slug, slug):
     entry_qs = get_entries_queryset(request)
     try: